@@ -0,0 +1,98 @@
+"""Doğrudan URL ile arama yolunun çözümleme gecikmesi karşılaştırması
+
+Kayıtlı extractor cevaplarını (benchmarks/fixtures/extractor_responses.json)
+sahte bir yt-dlp üzerinden oynatır ve resolve_track'in aynı videoyu arama
+terimi, tam URL ve çıplak id ile çözümlemesini ölçer. Ağ bağlantısı gerekmez.
+
+Kullanım: python benchmarks/direct_url.py [--scale 0.1]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'extractor_responses.json')
+
+
+class FixtureExtractor:
+    """extract_info çağrılarını kayıtlı cevaplarla karşılar"""
+
+    def __init__(self, videos, scale):
+        self.scale = scale
+        self.by_query = {v['query']: v for v in videos}
+        self.by_id = {v['id']: v for v in videos}
+        self.calls = {'search': 0, 'direct': 0}
+
+    @staticmethod
+    def _info(video_id, title, duration):
+        return {
+            'id': video_id,
+            'title': title,
+            'duration': duration,
+            'url': f'https://rr1---sn-fixture.googlevideo.com/videoplayback?id={video_id}',
+            'webpage_url': f'https://www.youtube.com/watch?v={video_id}',
+        }
+
+    def extract_info(self, query, download=False, **kwargs):
+        if query.startswith('ytsearch:'):
+            self.calls['search'] += 1
+            video = self.by_query[query[len('ytsearch:'):]]
+            time.sleep(video['search_latency_ms'] / 1000 * self.scale)
+            return {'entries': [self._info(video['search_result_id'], video['title'], video['duration'])]}
+
+        self.calls['direct'] += 1
+        video = self.by_id[query.rsplit('v=', 1)[-1]]
+        time.sleep(video['direct_latency_ms'] / 1000 * self.scale)
+        return self._info(video['id'], video['title'], video['duration'])
+
+
+async def run(videos, extractor):
+    results = {'arama': [], 'url': [], 'id': []}
+    wrong = 0
+    for video in videos:
+        inputs = {
+            'arama': video['query'],
+            'url': f"https://youtu.be/{video['id']}?si=share",
+            'id': video['id'],
+        }
+        for path, query in inputs.items():
+            # Her ölçüm soğuk önbellekle yapılır
+            main.resolve_cache = main.ResolveCache()
+            start = time.perf_counter()
+            data = await main.resolve_track(query)
+            results[path].append(time.perf_counter() - start)
+            if path == 'arama' and data['id'] != video['id']:
+                wrong += 1
+    return results, wrong
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=0.1,
+                        help='kayıtlı gecikmelerin çarpanı (1.0 = gerçek süre)')
+    args = parser.parse_args()
+
+    with open(FIXTURES, encoding='utf-8') as f:
+        videos = json.load(f)['videos']
+
+    main.logger.setLevel('WARNING')
+    extractor = FixtureExtractor(videos, args.scale)
+    main.extractor_pool = main.ExtractorPool(ydl_factory=lambda: extractor)
+    results, wrong = asyncio.run(run(videos, extractor))
+
+    for path, timings in results.items():
+        print(f'{path:>6}: ortalama {statistics.mean(timings) * 1000 / args.scale:8.1f} ms '
+              f'(ölçek düzeltilmiş, {len(timings)} video)')
+    print(f'extractor çağrıları: {extractor.calls}')
+    print(f'aramada yanlış video: {wrong}/{len(videos)}')
+
+
+if __name__ == '__main__':
+    main_cli()
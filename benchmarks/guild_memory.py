@@ -0,0 +1,95 @@
+"""Çok sayıda guild'e dokunulduktan sonra bellekte kalan guild durumu
+
+Her guild bir kez !q ve !history çalıştırır; her --active'inci guild ayrıca
+birkaç şarkı çalar, sonra !leave ile temizlenir ya da sessizce ayrılır. Eski
+sütun önceki beş ayrı sözlük düzenini (okuma da girdi oluşturur, temizlik boş
+sırayı bırakır) taklit eder; yeni sütun GuildMusicState ve boşta atma turunu
+kullanır. Bellek tracemalloc ile ölçülür.
+
+Kullanım: python benchmarks/guild_memory.py [--guilds 1000,10000,50000] [--active 10]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('STATE_BACKEND', 'none')
+
+import main  # noqa: E402
+
+TRACKS_PER_ACTIVE = 5
+
+
+def old_layout(guilds, active):
+    music_queues, current_songs, repeat_modes, music_history, sound_effects = {}, {}, {}, {}, {}
+
+    def get_queue(guild_id):
+        if guild_id not in music_queues:
+            music_queues[guild_id] = main.TrackQueue()
+        return music_queues[guild_id]
+
+    def get_history(guild_id):
+        if guild_id not in music_history:
+            music_history[guild_id] = deque(maxlen=20)
+        return music_history[guild_id]
+
+    for guild_id in range(guilds):
+        len(get_queue(guild_id))
+        len(get_history(guild_id))
+        if guild_id % active == 0:
+            get_queue(guild_id).extend(main.Track(f'şarkı {guild_id}-{i}') for i in range(TRACKS_PER_ACTIVE))
+            get_history(guild_id).append(main.Track(f'şarkı {guild_id}'))
+            repeat_modes[guild_id] = 0
+            if guild_id % (active * 2) == 0:
+                # Eski cleanup_guild_data: sıra temizlenir ama boş nesne sözlükte kalır
+                music_queues[guild_id].clear()
+                music_history.pop(guild_id, None)
+                repeat_modes.pop(guild_id, None)
+    return music_queues, current_songs, repeat_modes, music_history, sound_effects
+
+
+async def new_layout(guilds, active):
+    for guild_id in range(guilds):
+        len(main.get_queue(guild_id, create=False))
+        len(main.get_history(guild_id, create=False))
+        if guild_id % active == 0:
+            main.get_queue(guild_id).extend(main.Track(f'şarkı {guild_id}-{i}') for i in range(TRACKS_PER_ACTIVE))
+            main.get_history(guild_id).append(main.Track(f'şarkı {guild_id}'))
+            if guild_id % (active * 2) == 0:
+                await main.cleanup_guild_data(guild_id)
+    before = len(main.guild_states)
+    # Boşta atma turu; STATE_BACKEND=none olduğundan şarkı taşıyan durumlar korunur
+    await main.evict_idle_guilds(time.monotonic() + main.GUILD_STATE_IDLE_TTL + 1)
+    return before
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    result = func(*args)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--guilds', default='1000,10000,50000')
+    parser.add_argument('--active', type=int, default=10, help='her kaçıncı guild\'in müzik çaldığı')
+    args = parser.parse_args()
+
+    main.logger.setLevel('WARNING')
+    for guilds in (int(g) for g in args.guilds.split(',')):
+        main.guild_states.clear()
+        old, old_bytes = measure(old_layout, guilds, args.active)
+        before, new_bytes = measure(lambda: asyncio.run(new_layout(guilds, args.active)))
+        print(f'{guilds:>7} guild: eski {sum(map(len, old)):7d} girdi {old_bytes / 1024:9.1f} KiB | '
+              f'yeni {before:6d} durum -> atma sonrası {len(main.guild_states):4d}, {new_bytes / 1024:9.1f} KiB')
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,83 @@
+"""HTTP sunucusu başlangıç süresi: Flask thread'i (eski) ve bot loop'unda aiohttp (yeni)
+
+Her ölçümde yeni bir Python süreci main.py'yi içe aktarır ve HTTP sunucusunu
+başlatır; süreç başlatılmasından /health ilk kez 200 dönene kadar geçen süre
+ölçülür. Flask değişkeni eski run_flask akışını taklit eder ve Flask kuruluysa
+çalışır.
+
+Kullanım: python benchmarks/http_startup.py [--runs 5] [--port 18090]
+"""
+import argparse
+import importlib.util
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FLASK_SERVER = '''
+import sys, threading, time
+sys.path.insert(0, {root!r})
+import main
+from flask import Flask
+app = Flask('main')
+app.add_url_rule('/health', 'health', lambda: {{"status": "healthy", "bot": "not ready"}})
+threading.Thread(target=lambda: app.run(host='127.0.0.1', port={port}, debug=False), daemon=True).start()
+time.sleep(60)
+'''
+
+AIOHTTP_SERVER = '''
+import asyncio, sys
+sys.path.insert(0, {root!r})
+import main
+async def serve():
+    await main.start_http_server(port={port})
+    await asyncio.sleep(60)
+asyncio.run(serve())
+'''
+
+
+def time_to_ready(code, port, timeout=30):
+    env = dict(os.environ, HTTP_HOST='127.0.0.1')
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', code], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.005)
+        raise RuntimeError('sunucu zamanında açılmadı')
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--port', type=int, default=18090)
+    args = parser.parse_args()
+
+    variants = [('aiohttp (bot loop)', AIOHTTP_SERVER)]
+    if importlib.util.find_spec('flask'):
+        variants.insert(0, ('flask (thread)', FLASK_SERVER))
+    else:
+        print('flask kurulu değil, eski akış atlandı')
+
+    for label, template in variants:
+        times = [time_to_ready(template.format(root=ROOT, port=args.port + run), args.port + run)
+                 for run in range(args.runs)]
+        print(f'{label:>20}: /health hazır medyan {statistics.median(times) * 1000:7.1f} ms, '
+              f'en iyi {min(times) * 1000:7.1f} ms ({args.runs} çalıştırma)')
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,79 @@
+"""Çalma modlarının yayınlanan dakika başına CPU maliyeti
+
+Yerel bir Opus dosyası üretir (ffmpeg gerekir) ve YTDLSource'u 'pcm' ile
+'opus' modlarında, ses bağlantısının yaptığı gibi kare kare okur. PCM modunda
+kareler discord.py'nin Opus kodlayıcısından geçirilir (VoiceClient'ın yaptığı iş).
+Bot süreci ve FFmpeg alt süreçlerinin CPU süreleri ayrı ayrı raporlanır.
+
+Kullanım: python benchmarks/playback_cpu.py [--seconds 120] [--volume 0.5]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord  # noqa: E402
+
+import main  # noqa: E402
+
+
+def make_fixture(path, seconds):
+    subprocess.run(
+        ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+         '-ac', '2', '-ar', '48000', '-c:a', 'libopus', '-b:a', '128k', path],
+        check=True,
+    )
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def stream(path, mode, volume):
+    data = {'url': path, 'acodec': 'opus', 'title': os.path.basename(path)}
+    encoder = None if mode == 'opus' else discord.opus.Encoder()
+
+    cpu_before, child_before = time.process_time(), children_cpu()
+    source = main.YTDLSource(data=data, volume=volume, mode=mode)
+    frames = 0
+    while True:
+        frame = source.read()
+        if not frame:
+            break
+        if encoder is not None:
+            encoder.encode(frame, encoder.SAMPLES_PER_FRAME)
+        frames += 1
+    source.cleanup()  # süreç beklenir, alt süreç CPU'su ancak bundan sonra sayılır
+    return frames, time.process_time() - cpu_before, children_cpu() - child_before
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=int, default=120, help='test dosyasının süresi')
+    parser.add_argument('--volume', type=float, default=0.5, help='pcm ve kısılmış opus ölçümlerinin ses seviyesi')
+    args = parser.parse_args()
+
+    if not discord.opus.is_loaded():
+        discord.opus._load_default()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'fixture.webm')
+        make_fixture(path, args.seconds)
+
+        volumes = [('pcm', args.volume), ('opus', args.volume), ('opus', 1.0)]
+        for mode, volume in volumes:
+            frames, bot_cpu, ffmpeg_cpu = stream(path, mode, volume)
+            minutes = frames * discord.opus.Encoder.FRAME_LENGTH / 1000 / 60
+            label = f'{mode} (ses {volume:.2f}{", passthrough" if mode == "opus" and volume == 1.0 else ""})'
+            print(f'{label:>28}: bot {bot_cpu / minutes:6.3f} sn/dk, ffmpeg {ffmpeg_cpu / minutes:6.3f} sn/dk, '
+                  f'toplam {(bot_cpu + ffmpeg_cpu) / minutes:6.3f} sn/dk')
+
+
+if __name__ == '__main__':
+    main_cli()
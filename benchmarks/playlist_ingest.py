@@ -0,0 +1,106 @@
+"""YouTube playlist alımı: ilk şarkıya kadar geçen süre ve bellek kullanımı
+
+Sahte bir yt-dlp, playlist'i YouTube gibi 100'lük sayfalar halinde üretir
+(sayfa başına --page-ms gecikme) ve tek bir videonun tam çözümlemesi
+--resolve-ms sürer. Yeni yol iter_playlist ile ilk parçayı sıraya ekleyip ilk
+şarkıyı çözümler; sıranın geri kalanı ardından okunur. Eski yol (tam
+extract_info ile entries[0]) her girdiyi çözümlediği için hesapla tahmin
+edilir. Bellek, tracemalloc ile alım sırasındaki en yüksek ek kullanım ve
+sıradaki şarkı başına bayt olarak raporlanır.
+
+Kullanım: python benchmarks/playlist_ingest.py [--sizes 100,1000,5000] [--page-ms 300] [--resolve-ms 800]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+PAGE_SIZE = 100  # YouTube'un playlist sayfa boyutu
+
+
+class FixtureExtractor:
+    """Düz playlist okumasını ve tek video çözümlemesini gecikmeli taklit eder"""
+
+    def __init__(self, size, page_latency, resolve_latency):
+        self.size = size
+        self.page_latency = page_latency
+        self.resolve_latency = resolve_latency
+        self.pages = 0
+
+    def _entries(self):
+        for index in range(self.size):
+            if index % PAGE_SIZE == 0:
+                self.pages += 1
+                time.sleep(self.page_latency)
+            # Gerçek düz girdiler küçük resim listesi gibi ek alanlar da taşır
+            yield {'_type': 'url', 'ie_key': 'Youtube', 'id': f'vid{index:08d}',
+                   'url': f'https://www.youtube.com/watch?v=vid{index:08d}', 'title': f'Şarkı {index}',
+                   'duration': 180 + index % 120, 'channel': 'fixture',
+                   'thumbnails': [{'url': f'https://i.ytimg.com/vi/vid{index:08d}/{q}.jpg', 'height': h}
+                                  for q, h in (('default', 90), ('mqdefault', 180), ('hqdefault', 360))]}
+
+    def extract_info(self, url, download=False, process=True, **kwargs):
+        if 'list=' in url:
+            return {'_type': 'playlist', 'id': 'PLfixture', 'entries': self._entries()}
+        time.sleep(self.resolve_latency)
+        video_id = url.rsplit('v=', 1)[-1]
+        return {'id': video_id, 'title': video_id, 'duration': 200,
+                'url': f'https://rr1---sn-fixture.googlevideo.com/videoplayback?id={video_id}',
+                'webpage_url': f'https://www.youtube.com/watch?v={video_id}'}
+
+
+async def ingest(extractor):
+    """p komutunun playlist yolu: parçaları sıraya ekle, ilk parçada ilk şarkıyı çözümle"""
+    queue = main.TrackQueue()
+    started = time.perf_counter()
+    first_play = None
+    async for entries in main.extractor_pool.iter_playlist('https://www.youtube.com/playlist?list=PLfixture',
+                                                           limit=main.PLAYLIST_MAX_TRACKS):
+        queue.extend(track for track in map(main.playlist_track, entries) if track)
+        if first_play is None:
+            await main.resolve_entry(queue.popleft())
+            first_play = time.perf_counter() - started
+    return queue, first_play, time.perf_counter() - started
+
+
+def run(size, page_latency, resolve_latency):
+    extractor = FixtureExtractor(size, page_latency, resolve_latency)
+    main.extractor_pool = main.ExtractorPool(ydl_factory=lambda: extractor)
+    main.resolve_cache = main.ResolveCache()
+    tracemalloc.start()
+    queue, first_play, total = asyncio.run(ingest(extractor))
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first_play, total, len(queue), current, peak
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100,1000,5000')
+    parser.add_argument('--page-ms', type=float, default=300, help='playlist sayfası başına gecikme')
+    parser.add_argument('--resolve-ms', type=float, default=800, help='tek video çözümleme gecikmesi')
+    parser.add_argument('--scale', type=float, default=0.1, help='gecikmelerin çarpanı (1.0 = gerçek süre)')
+    args = parser.parse_args()
+
+    main.logger.setLevel('ERROR')
+    page_latency = args.page_ms / 1000 * args.scale
+    resolve_latency = args.resolve_ms / 1000 * args.scale
+    print(f'tek şarkı çözümleme: {args.resolve_ms:.0f} ms, sayfa: {args.page_ms:.0f} ms (ölçek düzeltilmiş)')
+    for size in (int(s) for s in args.sizes.split(',')):
+        first_play, total, queued, current, peak = run(size, page_latency, resolve_latency)
+        pages = -(-size // PAGE_SIZE)
+        # Eski yol: tüm sayfalar okunur ve her video sırayla tam çözümlenir, sonra ilki çalınır
+        old = (pages * args.page_ms + size * args.resolve_ms) / 1000
+        print(f'{size:>6} girdi: ilk şarkı {first_play * 1000 / args.scale:7.0f} ms '
+              f'(eski ~{old:8.1f} sn), tamamı {total / args.scale:6.1f} sn, sırada {queued}, '
+              f'şarkı başına {current / max(queued, 1):5.0f} B, alım tepe fazlası {(peak - current) / 1024:6.1f} KiB')
+
+
+if __name__ == '__main__':
+    main_cli()
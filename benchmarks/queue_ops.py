@@ -0,0 +1,118 @@
+"""Sıra işlemleri mikro ölçümü: eski deque kullanımı ve TrackQueue
+
+Komutların sıra üzerinde yaptığı işlemleri (sayfa gösterme, ortadan indeksle
+erişim, karıştırma, aralık silme/taşıma, tekilleştirme, çalma döngüsü) 10, 1k
+ve 100k şarkılık sıralarda ölçer. Eski sütun komutların önceki deque kodunu
+taklit eder.
+
+Kullanım: python benchmarks/queue_ops.py [--sizes 10,1000,100000]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+def make_tracks(size):
+    # Her 10 şarkıdan biri tekrar, tekilleştirmenin iş yapması için
+    return [main.Track(f'şarkı {i if i % 10 else i // 2}') for i in range(size)]
+
+
+def old_ops(size):
+    queue = deque(make_tracks(size))
+    middle = size // 2
+
+    def page():
+        return list(queue)[middle:middle + 10]
+
+    def index():
+        return list(queue)[middle]
+
+    def shuffle():
+        items = list(queue)
+        random.shuffle(items)
+        queue.clear()
+        queue.extend(items)
+
+    def remove_move():
+        items = list(queue)
+        block = items[middle:middle + 5]
+        del items[middle:middle + 5]
+        items[1:1] = block
+        queue.clear()
+        queue.extend(items)
+
+    def dedupe():
+        seen = set()
+        items = []
+        for track in queue:
+            key = main.track_key(track)
+            if key not in seen:
+                seen.add(key)
+                items.append(track)
+        queue.clear()
+        queue.extend(items)
+
+    def cycle():
+        queue.append(queue.popleft())
+
+    return {'page': page, 'index': index, 'shuffle': shuffle, 'remove/move': remove_move,
+            'dedupe': dedupe, 'popleft+append': cycle}
+
+
+def new_ops(size):
+    queue = main.TrackQueue(make_tracks(size))
+    middle = size // 2
+
+    def page():
+        return queue[middle:middle + 10]
+
+    def index():
+        return queue[middle]
+
+    def remove_move():
+        queue.move(middle, middle + 5, 1)
+
+    def dedupe():
+        queue.dedupe(main.track_key)
+
+    def cycle():
+        queue.append(queue.popleft())
+
+    return {'page': page, 'index': index, 'shuffle': queue.shuffle, 'remove/move': remove_move,
+            'dedupe': dedupe, 'popleft+append': cycle}
+
+
+def per_call(func):
+    number, total = timeit.Timer(func).autorange()
+    return total / number
+
+
+def format_time(seconds):
+    if seconds < 1e-3:
+        return f'{seconds * 1e6:9.2f} µs'
+    return f'{seconds * 1e3:9.2f} ms'
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,1000,100000')
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(',')):
+        print(f'--- {size} şarkı ---')
+        old, new = old_ops(size), new_ops(size)
+        for name in old:
+            before, after = per_call(old[name]), per_call(new[name])
+            print(f'{name:>16}: deque {format_time(before)}  TrackQueue {format_time(after)}  '
+                  f'(x{before / after:8.1f})')
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,119 @@
+"""!search (düz arama + seçim) ile !p arama yolunun gecikme karşılaştırması
+
+Kayıtlı extractor cevaplarını (benchmarks/fixtures/extractor_responses.json)
+sahte bir yt-dlp üzerinden oynatır. !p yolu için arama teriminin tam
+çözümlenmesi (resolve_track) ölçülür; !search yolu için sonuçların listelenme
+süresi (flat_search) ve seçilen videonun doğrudan URL ile çözümlenmesi ayrı
+ayrı ölçülür. Kullanıcının seçim için harcadığı süre dahil değildir.
+
+Kullanım: python benchmarks/search_picker.py [--scale 0.1]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'extractor_responses.json')
+
+
+class FixtureExtractor:
+    """Tam, düz ve doğrudan extract_info çağrılarını kayıtlı cevaplarla karşılar"""
+
+    def __init__(self, videos, scale):
+        self.scale = scale
+        self.by_query = {v['query']: v for v in videos}
+        self.by_id = {v['id']: v for v in videos}
+        self.calls = {'search': 0, 'flat': 0, 'direct': 0}
+
+    @staticmethod
+    def _info(video_id, title, duration):
+        return {
+            'id': video_id,
+            'title': title,
+            'duration': duration,
+            'url': f'https://rr1---sn-fixture.googlevideo.com/videoplayback?id={video_id}',
+            'webpage_url': f'https://www.youtube.com/watch?v={video_id}',
+        }
+
+    def _sleep(self, ms):
+        time.sleep(ms / 1000 * self.scale)
+
+    def extract_info(self, query, download=False, process=True, **kwargs):
+        if query.startswith('ytsearch'):
+            count, term = query[len('ytsearch'):].split(':', 1)
+            video = self.by_query[term]
+            if not process:
+                self.calls['flat'] += 1
+                self._sleep(video['flat_search_latency_ms'])
+                # Düz sonuçlarda format listesi yoktur; aday olarak kayıtlı diğer videolar eklenir
+                others = [v for v in self.by_id.values() if v is not video]
+                entries = [{'id': v['id'], 'title': v['title'], 'duration': v['duration'], 'channel': 'fixture'}
+                           for v in [video] + others][:int(count or 1)]
+                return {'_type': 'playlist', 'entries': iter(entries)}
+            self.calls['search'] += 1
+            self._sleep(video['search_latency_ms'])
+            return {'entries': [self._info(video['search_result_id'], video['title'], video['duration'])]}
+
+        self.calls['direct'] += 1
+        video = self.by_id[query.rsplit('v=', 1)[-1]]
+        self._sleep(video['direct_latency_ms'])
+        return self._info(video['id'], video['title'], video['duration'])
+
+
+async def run(videos):
+    results = {'p (arama)': [], 'search: liste': [], 'search: seçim': []}
+    wrong = {'p (arama)': 0, 'search: seçim': 0}
+    for video in videos:
+        main.resolve_cache = main.ResolveCache()
+        start = time.perf_counter()
+        data = await main.resolve_track(video['query'])
+        results['p (arama)'].append(time.perf_counter() - start)
+        wrong['p (arama)'] += data['id'] != video['id']
+
+        main.resolve_cache = main.ResolveCache()
+        start = time.perf_counter()
+        entries, _ = await main.flat_search(video['query'])
+        results['search: liste'].append(time.perf_counter() - start)
+
+        # Kullanıcı doğru videoyu seçer; !p doğrudan URL yolundan geçer
+        picked = next(e for e in entries if e['id'] == video['id'])
+        start = time.perf_counter()
+        data = await main.resolve_track(f"https://www.youtube.com/watch?v={picked['id']}")
+        results['search: seçim'].append(time.perf_counter() - start)
+        wrong['search: seçim'] += data['id'] != video['id']
+    return results, wrong
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=0.1,
+                        help='kayıtlı gecikmelerin çarpanı (1.0 = gerçek süre)')
+    args = parser.parse_args()
+
+    with open(FIXTURES, encoding='utf-8') as f:
+        videos = json.load(f)['videos']
+
+    main.logger.setLevel('ERROR')
+    extractor = FixtureExtractor(videos, args.scale)
+    main.extractor_pool = main.ExtractorPool(ydl_factory=lambda: extractor)
+    results, wrong = asyncio.run(run(videos))
+
+    for path, timings in results.items():
+        mean = statistics.mean(timings) * 1000 / args.scale
+        note = f', yanlış video {wrong[path]}/{len(videos)}' if path in wrong else ''
+        print(f'{path:>14}: ortalama {mean:8.1f} ms (ölçek düzeltilmiş{note})')
+    listing = statistics.mean(results['search: liste']) / args.scale
+    print(f'sonuç listesi hedefi {main.SEARCH_LATENCY_TARGET * 1000:.0f} ms: '
+          f'{"karşılandı" if listing <= main.SEARCH_LATENCY_TARGET else "aşıldı"}')
+    print(f'extractor çağrıları: {extractor.calls}')
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,278 @@
+"""Shard süreç sayısına göre guild kapasitesi ölçümü
+
+Bu betiği başlatıcının shard planı (main.plan_shards) ve işçi ortamıyla
+(main.shard_worker_env) işçi süreçler olarak çalıştırır; her işçi main'i kendi
+SHARD_IDS değeriyle yükler ve gateway'in shard formülüne
+((guild_id >> 22) % shard_count) göre kendine düşen guild'leri alır. Her guild
+gerçek !p komut yolundan (p -> play_next -> YTDLSource, varsayılan opus modu)
+çalmaya başlar. Ölçüm süresince işçi, discord.py ses oynatıcısının kare başına
+işini (source.read + VoiceClient.send_audio_packet: RTP başlığı, şifreleme,
+pcm modunda Opus kodlama) tüm guild'ler için sırayla yapar ve arada gelen !p
+komutlarını aynı yoldan işler. Saniyedeki kare sayısı, guild başına saniyede 50
+kare ile gerçek zamanlı guild kapasitesine çevrilir.
+
+Sınırlar: Discord'a bağlanılmaz; extractor ve FFmpeg sahtedir (FFmpeg'in ayrı
+süreçteki paket kopyalama işi ölçülmez), UDP paketleri atılır ve discord.py'nin
+guild başına oynatıcı thread'i yerine tek döngü kullanılır.
+
+Kullanım: python benchmarks/shard_load.py [--guilds 2000] [--seconds 5] [--max-processes 8] [--mode opus]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('STATE_BACKEND', 'none')
+
+import discord  # noqa: E402
+
+import main  # noqa: E402
+
+FRAMES_PER_SECOND = 50  # 20 ms'lik kareler
+OPUS_PACKET = os.urandom(320)  # ~128 kbps Opus kaynağından 20 ms'lik paket
+PCM_FRAME = os.urandom(discord.opus.Encoder.FRAME_SIZE)
+
+
+def shard_for(guild_id, shard_count):
+    return (guild_id >> 22) % shard_count
+
+
+def gateway_guilds(count):
+    """Tüm işçilerde aynı sahte guild listesi (id'nin üst bitleri shard'ı belirler)"""
+    rng = random.Random(0)
+    return [(i << 22) | rng.getrandbits(22) for i in range(count)]
+
+
+class BenchExtractor:
+    """Aramayı gecikmesiz, YouTube'un Opus formatıyla (acodec=opus) cevaplar"""
+
+    def __init__(self, track_seconds):
+        self.track_seconds = track_seconds
+
+    def extract_info(self, query, download=False, **kwargs):
+        name = query.split(':', 1)[-1]
+        return {'entries': [{
+            'id': name,
+            'title': name,
+            'url': f'https://stub.invalid/{name}',
+            'webpage_url': f'https://stub.invalid/watch/{name}',
+            'duration': self.track_seconds,
+            'acodec': 'opus',
+        }]}
+
+
+class PacketSource(discord.AudioSource):
+    """FFmpegOpusAudio yerine: şarkı boyunca hazır Opus paketleri, sonra bitiş"""
+
+    frames = 0
+
+    def __init__(self, *args, **kwargs):
+        self.remaining = self.frames
+
+    def read(self):
+        if self.remaining <= 0:
+            return b''
+        self.remaining -= 1
+        return OPUS_PACKET
+
+    def is_opus(self):
+        return True
+
+
+class PCMSource(PacketSource):
+    """FFmpegPCMAudio yerine (pcm modu): 20 ms'lik PCM kareleri"""
+
+    def read(self):
+        return PCM_FRAME if super().read() else b''
+
+    def is_opus(self):
+        return False
+
+
+class NullSocket:
+    def sendto(self, data, address):
+        pass
+
+
+class BenchVoiceClient(discord.VoiceClient):
+    """Bağlantısız ses istemcisi: çalma kontrolleri sahte, paket yolu discord.py'nin kendisi"""
+
+    def __init__(self, encoder):
+        self.sequence = self.timestamp = self._lite_nonce = 0
+        self.ssrc = random.getrandbits(32)
+        self.secret_key = list(os.urandom(32))
+        self.mode = 'xsalsa20_poly1305_lite'
+        self.socket = NullSocket()
+        self.endpoint_ip, self.voice_port = '127.0.0.1', 0
+        self.encoder = encoder
+        self.playing = None
+        self.after = None
+
+    def is_playing(self):
+        return self.playing is not None
+
+    def is_paused(self):
+        return False
+
+    def play(self, source, *, after=None):
+        if self.playing is not None:
+            raise discord.ClientException('Already playing audio.')
+        self.playing, self.after = source, after
+
+    def stop(self):
+        self.finish()
+
+    def finish(self):
+        source, after = self.playing, self.after
+        self.playing = self.after = None
+        if source is not None:
+            source.cleanup()
+            after(None)
+
+    def send_frame(self):
+        """AudioPlayer._do_run'ın bir turu, bekleme olmadan"""
+        data = self.playing.read()
+        if not data:
+            self.finish()
+            return False
+        self.send_audio_packet(data, encode=not self.playing.is_opus())
+        return True
+
+
+class BenchContext:
+    def __init__(self, guild_id, voice_client):
+        self.guild = types.SimpleNamespace(id=guild_id, name=f'bench-{guild_id}')
+        self.voice_client = voice_client
+        self.author = None
+
+    async def send(self, *args, **kwargs):
+        pass
+
+    def typing(self):
+        return contextlib.nullcontext()
+
+
+async def run_worker(args):
+    """Tek bir shard işçisi: guild'lerini !p ile başlatır, sonra kare ve komut yükünü işler"""
+    main.bot.loop = asyncio.get_running_loop()
+    discord.FFmpegOpusAudio, discord.FFmpegPCMAudio = PacketSource, PCMSource
+    main.extractor_pool = main.ExtractorPool(ydl_factory=lambda: BenchExtractor(args.track_seconds))
+    PacketSource.frames = int(args.track_seconds * FRAMES_PER_SECOND)
+    encoder = discord.opus.Encoder() if main.PLAYBACK_MODE == 'pcm' else None
+
+    guild_ids = gateway_guilds(args.guilds)
+    contexts = {guild_id: BenchContext(guild_id, BenchVoiceClient(encoder)) for guild_id in guild_ids
+                if shard_for(guild_id, main.SHARD_COUNT) in main.SHARD_IDS}
+    began = time.perf_counter()
+    for ctx in contexts.values():
+        await main.p.callback(ctx, search=f'şarkı {ctx.guild.id}')
+    join_seconds = time.perf_counter() - began
+
+    print('ready', flush=True)
+    await asyncio.get_running_loop().run_in_executor(None, sys.stdin.readline)
+
+    # Komut akışı tüm işçilerde aynıdır; her işçi yalnızca kendi shard'larının komutlarını işler
+    rng = random.Random(1)
+    frames = handled = sent = 0
+    voice_clients = [ctx.voice_client for ctx in contexts.values()]
+    began = time.perf_counter()
+    while (elapsed := time.perf_counter() - began) < args.seconds:
+        while sent < elapsed * args.commands:
+            guild_id = rng.choice(guild_ids)
+            sent += 1
+            if guild_id in contexts:
+                await main.p.callback(contexts[guild_id], search=f'şarkı {guild_id}-{sent}')
+                handled += 1
+        for voice_client in voice_clients:
+            if voice_client.is_playing():
+                frames += voice_client.send_frame()
+        # play_next ve çözümleme görevleri ilerlesin
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - began
+
+    print(json.dumps({
+        'shards': main.SHARD_IDS,
+        'guilds': len(contexts),
+        'playing': sum(voice_client.is_playing() for voice_client in voice_clients),
+        'join_seconds': join_seconds,
+        'frames': frames,
+        'elapsed': elapsed,
+        'handled': handled,
+        'sent': sent,
+    }), flush=True)
+
+
+def run(processes, args):
+    """Başlatıcı gibi shard'ları süreçlere dağıtıp işçileri aynı anda ölçüme başlatır"""
+    shard_count = max(args.shards or processes, processes)
+    plans = main.plan_shards(shard_count, processes)
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--guilds', str(args.guilds),
+               '--seconds', str(args.seconds), '--commands', str(args.commands),
+               '--track-seconds', str(args.track_seconds)]
+    workers = []
+    for index in range(len(plans)):
+        env = dict(main.shard_worker_env(plans, index, shard_count), SHARD_HTTP='0', PLAYBACK_MODE=args.mode)
+        workers.append(subprocess.Popen(command, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True))
+
+    for process in workers:
+        if process.stdout.readline().strip() != 'ready':
+            raise RuntimeError(f'işçi başlatılamadı (kod {process.wait()})')
+    for process in workers:
+        process.stdin.write('go\n')
+        process.stdin.flush()
+    stats = [json.loads(process.stdout.readline()) for process in workers]
+    for process in workers:
+        process.wait()
+    return shard_count, stats
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--guilds', type=int, default=2000, help='sahte gateway\'deki ses bağlantılı guild sayısı')
+    parser.add_argument('--seconds', type=float, default=5.0, help='her ölçümün süresi')
+    parser.add_argument('--commands', type=float, default=200.0, help='saniyedeki !p komutu')
+    parser.add_argument('--track-seconds', type=float, default=600.0, help='sahte şarkı süresi')
+    parser.add_argument('--shards', type=int, default=0, help='shard sayısı (0: süreç başına bir shard)')
+    parser.add_argument('--max-processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--mode', choices=('opus', 'pcm'), default=main.PLAYBACK_MODE)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    main.logger.setLevel('WARNING')
+    if args.worker:
+        asyncio.run(run_worker(args))
+        return
+
+    if args.mode == 'pcm':
+        if not discord.opus.is_loaded():
+            discord.opus._load_default()
+        if not discord.opus.is_loaded():
+            parser.error('pcm modu libopus gerektirir')
+    print(f'{os.cpu_count()} çekirdek, {args.mode} modu, {args.guilds} guild, saniyede {args.commands:.0f} !p')
+
+    counts = sorted({1, 2, 4, 8, 16, args.max_processes} & set(range(1, args.max_processes + 1)))
+    baseline = None
+    for processes in counts:
+        shard_count, stats = run(processes, args)
+        frame_rate = sum(s['frames'] / s['elapsed'] for s in stats)
+        capacity = frame_rate / FRAMES_PER_SECOND
+        baseline = baseline or capacity
+        handled = sum(s['handled'] for s in stats)
+        sent = max(s['sent'] for s in stats)
+        playing = sum(s['playing'] for s in stats)
+        join = max(s['join_seconds'] for s in stats)
+        print(f'{processes:>3} süreç / {shard_count:>3} shard: {frame_rate:12,.0f} kare/sn, '
+              f'kapasite {capacity:10,.0f} guild (x{capacity / baseline:4.2f}), '
+              f'!p {handled}/{sent}, çalan {playing}/{args.guilds}, ilk !p turu {join:5.2f} sn')
+
+
+if __name__ == '__main__':
+    main_cli()
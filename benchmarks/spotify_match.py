@@ -0,0 +1,103 @@
+"""Spotify -> YouTube eşleştirici için çevrimdışı doğruluk ve hız ölçümü
+
+Kayıtlı arama sonuçlarını (benchmarks/fixtures/spotify_matches.json) sahte bir
+yt-dlp üzerinden oynatır. Eşleştiricinin doğruluğunu eski davranışla (metin
+aramasının ilk sonucu) karşılaştırır, ardından aynı listeyi farklı eşzamanlılık
+değerleriyle ve eşleşme tablosu doluyken yeniden eşleştirerek süreyi ölçer.
+
+Kullanım: python benchmarks/spotify_match.py [--tracks 200] [--scale 0.05]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'spotify_matches.json')
+
+
+class FixtureExtractor:
+    """Düz arama çağrılarını kayıtlı sonuçlarla karşılar"""
+
+    def __init__(self, cases, latency):
+        self.latency = latency
+        self.by_isrc = {c['spotify']['isrc']: c['isrc_results'] for c in cases if c['spotify']['isrc']}
+        self.by_term = {f"{c['spotify']['artists'][0]} {c['spotify']['name']}": c['text_results'] for c in cases}
+        self.calls = 0
+
+    def extract_info(self, query, download=False, process=True, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        term = query.split(':', 1)[1]
+        if term.startswith('"'):
+            entries = self.by_isrc.get(term.strip('"'), [])
+        else:
+            entries = self.by_term[term]
+        return {'_type': 'playlist', 'entries': iter([dict(e) for e in entries])}
+
+
+def spotify_tracks(cases, count):
+    tracks = []
+    for i in range(count):
+        case = cases[i % len(cases)]
+        info = dict(case['spotify'], id=f"{case['spotify']['id']}#{i}")
+        tracks.append((main.Track(main.spotify_search_term({'name': info['name'], 'artists': [
+            {'name': a} for a in info['artists']]}), spotify=info), case['expected']))
+    return tracks
+
+
+async def match_all(matcher, tracks):
+    await matcher.apply([track for track, _ in tracks])
+    await asyncio.gather(*(matcher.match(track) for track, _ in tracks))
+
+
+def run(cases, extractor, tracks, concurrency, path):
+    main.extractor_pool = main.ExtractorPool(size=max(concurrency, 1), max_pending=len(tracks) * 2,
+                                             max_pending_per_guild=len(tracks) * 2, ydl_factory=lambda: extractor)
+    matcher = main.SpotifyMatcher(path, concurrency=concurrency)
+    extractor.calls = 0
+    started = time.perf_counter()
+    asyncio.run(match_all(matcher, tracks))
+    elapsed = time.perf_counter() - started
+    matcher.close()
+    correct = sum(1 for track, expected in tracks if track.id == expected)
+    return elapsed, extractor.calls, correct
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tracks', type=int, default=200, help='eşleştirilecek şarkı sayısı (vakalar tekrarlanır)')
+    parser.add_argument('--scale', type=float, default=0.05, help='kayıtlı gecikmelerin çarpanı')
+    args = parser.parse_args()
+
+    main.logger.setLevel('WARNING')
+    with open(FIXTURES, encoding='utf-8') as f:
+        fixtures = json.load(f)
+    cases = fixtures['cases']
+    extractor = FixtureExtractor(cases, fixtures['latency_ms'] / 1000 * args.scale)
+
+    baseline = sum(1 for c in cases if (c['text_results'][0]['id'] if c['text_results'] else None) == c['expected'])
+    print(f'doğruluk: ilk arama sonucu {baseline}/{len(cases)}, eşleştirici ', end='')
+    _, _, correct = run(cases, extractor, spotify_tracks(cases, len(cases)), 1, None)
+    print(f'{correct}/{len(cases)}')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'matches.sqlite3')
+        for label, concurrency, db in (('eşzamanlılık 1', 1, None),
+                                       (f'eşzamanlılık {main.SPOTIFY_MATCH_CONCURRENCY}',
+                                        main.SPOTIFY_MATCH_CONCURRENCY, None),
+                                       ('eşzamanlılık 8', 8, path),
+                                       ('kayıtlı tablo', 8, path)):
+            elapsed, calls, correct = run(cases, extractor, spotify_tracks(cases, args.tracks), concurrency, db)
+            print(f'{label:>16}: {args.tracks / elapsed:8.1f} şarkı/sn, {calls:4d} arama, '
+                  f'doğru {correct}/{args.tracks}')
+
+
+if __name__ == '__main__':
+    main_cli()
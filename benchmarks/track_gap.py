@@ -0,0 +1,133 @@
+"""Şarkılar arası sessizlik (gap) ölçümü
+
+Yerel bir sahte extractor ve sahte ses bağlantısı ile play_next akışını
+çalıştırır; bir şarkının bitişiyle sıradakinin başlaması arasındaki süreyi
+ön çözümleme (prefetch) kapalı ve açıkken karşılaştırır.
+
+Kullanım: python benchmarks/track_gap.py [--latency 0.8] [--tracks 6]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord  # noqa: E402
+
+import main  # noqa: E402
+
+
+class StubExtractor:
+    """YoutubeDL.extract_info yerine sabit gecikmeyle sonuç döndürür"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def extract_info(self, query, download=False, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        name = query.split(':', 1)[-1]
+        return {'entries': [{
+            'id': name,
+            'title': name,
+            'url': f'https://stub.invalid/{name}',
+            'webpage_url': f'https://stub.invalid/watch/{name}',
+            'duration': 1,
+        }]}
+
+
+class StubAudio(discord.AudioSource):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def read(self):
+        return b''
+
+
+class FakeVoiceClient:
+    def __init__(self, track_length):
+        self.track_length = track_length
+        self.started = []
+        self.finished = []
+        self._playing = False
+
+    def is_playing(self):
+        return self._playing
+
+    def is_paused(self):
+        return False
+
+    def play(self, source, *, after=None):
+        self.started.append(time.perf_counter())
+        self._playing = True
+
+        def finish():
+            self._playing = False
+            self.finished.append(time.perf_counter())
+            after(None)
+
+        asyncio.get_running_loop().call_later(self.track_length, finish)
+
+    def stop(self):
+        self._playing = False
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.name = f'bench-{guild_id}'
+
+
+class FakeContext:
+    def __init__(self, guild_id, voice_client):
+        self.guild = FakeGuild(guild_id)
+        self.voice_client = voice_client
+
+    async def send(self, *args, **kwargs):
+        pass
+
+
+async def measure(depth, tracks, latency, track_length, guild_id):
+    main.bot.loop = asyncio.get_running_loop()
+    stub = StubExtractor(latency)
+    main.extractor_pool = main.ExtractorPool(ydl_factory=lambda: stub)
+    # Önbellek isabetleri ölçümü bozmasın
+    main.resolve_cache = main.ResolveCache()
+    state = main.get_guild_state(guild_id)
+    state._prefetcher = main.TrackPrefetcher(guild_id, depth=depth)
+
+    queue = state.queue
+    queue.extend(main.Track(f'track-{i}') for i in range(tracks))
+    voice = FakeVoiceClient(track_length)
+    await main.play_next(FakeContext(guild_id, voice))
+
+    while len(voice.started) < tracks:
+        await asyncio.sleep(0.01)
+    await main.cleanup_guild_data(guild_id)
+    # İlk şarkının başlangıcı soğuk başlangıçtır, yalnızca geçişleri say
+    return [start - end for end, start in zip(voice.finished, voice.started[1:])]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.8, help='sahte extractor gecikmesi (sn)')
+    parser.add_argument('--tracks', type=int, default=6)
+    parser.add_argument('--track-length', type=float, default=1.5, help='sahte şarkı süresi (sn)')
+    parser.add_argument('--depth', type=int, default=2, help='prefetch derinliği')
+    args = parser.parse_args()
+
+    discord.FFmpegPCMAudio = discord.FFmpegOpusAudio = StubAudio
+    main.logger.setLevel('WARNING')
+
+    for label, depth, guild_id in (('prefetch kapalı', 0, 1), (f'prefetch={args.depth}', args.depth, 2)):
+        gaps = asyncio.run(measure(depth, args.tracks, args.latency, args.track_length, guild_id))
+        print(f'{label:>16}: ortalama gap {statistics.mean(gaps) * 1000:8.1f} ms, '
+              f'en kötü {max(gaps) * 1000:8.1f} ms ({len(gaps)} geçiş)')
+
+
+if __name__ == '__main__':
+    main_cli()
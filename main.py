@@ -21,37 +21,131 @@ import discord
 from discord.ext import commands
 # ... diğer import'lar
 
-# Render.com için HTTP server eklentisi
-from flask import Flask
+# Render.com için HTTP sunucusu: bot'un event loop'unda çalışır, guild durumunu
+# thread geçişi olmadan okur. Guild uçları yalnızca HTTP_API_TOKEN verilirse açılır ve
+# Bearer token ister; token yoksa 404 döner.
+from aiohttp import web
 import threading
 import os
 
-# Flask app (Render.com için gerekli)
-app = Flask(__name__)
+HTTP_HOST = os.getenv('HTTP_HOST', '0.0.0.0')
+HTTP_API_TOKEN = os.getenv('HTTP_API_TOKEN')
+HTTP_QUEUE_LIMIT = 100  # tek istekte döndürülecek en fazla şarkı
 
-@app.route('/')
-def home():
-    return "Discord Music Bot is running! 🎵"
+http_routes = web.RouteTableDef()
 
-@app.route('/health')
-def health():
-    return {"status": "healthy", "bot": str(bot.user) if bot.user else "not ready"}
+@http_routes.get('/')
+async def home(request):
+    return web.Response(text="Discord Music Bot is running! 🎵")
 
-def run_flask():
-    port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=False)
+@http_routes.get('/health')
+async def health(request):
+    return web.json_response({
+        "status": "healthy",
+        "bot": str(bot.user) if bot.user else "not ready",
+        "guilds": len(bot.guilds),
+        "voice_clients": len(bot.voice_clients),
+        "latency": None if bot.latency != bot.latency else round(bot.latency, 3),  # NaN: bağlı değil
+        "shards": sorted(bot.shards) if SHARDED else None,
+    })
+
+@http_routes.get('/metrics')
+async def metrics(request):
+    return web.Response(text=render_metrics(), content_type='text/plain', charset='utf-8',
+                        headers={'X-Prometheus-Format': '0.0.4'})
+
+async def api_guild(request):
+    """Yetkiyi denetle ve isteğin guild'ini (durumu yüklenmiş olarak) döndür"""
+    if not HTTP_API_TOKEN:
+        # Token yapılandırılmadıysa guild uçları kapalı; kimliksiz okuma yok
+        raise web.HTTPNotFound(text='guild API kapalı (HTTP_API_TOKEN ayarlanmamış)')
+    if request.headers.get('Authorization') != f'Bearer {HTTP_API_TOKEN}':
+        raise web.HTTPUnauthorized()
+    try:
+        guild = bot.get_guild(int(request.match_info['guild_id']))
+    except ValueError:
+        guild = None
+    if guild is None:
+        raise web.HTTPNotFound(text='guild bulunamadı')
+    await state_store.ensure_loaded(guild.id)
+    return guild
+
+def track_json(track):
+    return {'title': track.display_name, 'url': track.source, 'duration': track.duration}
+
+@http_routes.get('/guilds/{guild_id}/queue')
+async def queue_api(request):
+    guild = await api_guild(request)
+    try:
+        offset = max(0, int(request.query.get('offset', 0)))
+        limit = min(HTTP_QUEUE_LIMIT, max(0, int(request.query.get('limit', HTTP_QUEUE_LIMIT))))
+    except ValueError:
+        raise web.HTTPBadRequest(text='offset/limit sayı olmalı')
+    queue = get_queue(guild.id, create=False)
+    return web.json_response({
+        'guild_id': guild.id,
+        'length': len(queue),
+        'repeat_mode': get_repeat_mode(guild.id),
+        'offset': offset,
+        'tracks': [track_json(track) for track in queue[offset:offset + limit]],
+    })
+
+@http_routes.get('/guilds/{guild_id}/now-playing')
+async def now_playing_api(request):
+    guild = await api_guild(request)
+    voice_client = guild.voice_client
+    player = get_current_song(guild.id)
+    if not voice_client or not player or not (voice_client.is_playing() or voice_client.is_paused()):
+        return web.json_response({'guild_id': guild.id, 'playing': False})
+    return web.json_response({
+        'guild_id': guild.id,
+        'playing': True,
+        'paused': voice_client.is_paused(),
+        'title': player.title,
+        'url': player.webpage_url,
+        'duration': player.duration,
+        'position': round(player.position, 1),
+        'effect': player.effect,
+        'volume': round(player.volume, 2),
+    })
+
+async def start_http_server(port=None):
+    """HTTP sunucusunu çalışan event loop'ta başlat, AppRunner'ı döndür"""
+    app = web.Application()
+    app.add_routes(http_routes)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    port = port if port is not None else int(os.environ.get('PORT', 5000))
+    await web.TCPSite(runner, HTTP_HOST, port).start()
+    logger.info(f"HTTP sunucusu {HTTP_HOST}:{port} adresinde")
+    return runner
 
 # Orijinal bot kodunuz burada (import'lar dahil)
 import discord
 from discord.ext import commands
 import asyncio
+import bisect
 import yt_dlp as youtube_dl
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
 import re
-from collections import deque
+from collections import deque, OrderedDict, Counter
+from urllib.parse import urlparse, parse_qs
+import concurrent.futures
+import functools
+import heapq
+import json
+import sqlite3
+import itertools
 import random
 import logging
+import logging.handlers
+import signal
+import subprocess
+import time
+import traceback
+import unicodedata
+import urllib.request
 
 # Logging ayarları
 logging.basicConfig(level=logging.INFO)
@@ -65,7 +159,51 @@ SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
 # Bot ayarları
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix='!', intents=intents)
+# Sharding ayarları: SHARD_COUNT verilirse AutoShardedBot kullanılır, SHARD_PROCESSES > 1
+# ise başlatıcı shard'ları bu kadar işçi sürece dağıtır. SHARD_IDS işçi süreçlere
+# başlatıcı tarafından verilir ('0,2,4' gibi).
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0')) or None
+SHARD_PROCESSES = max(1, int(os.getenv('SHARD_PROCESSES', '1')))
+SHARD_IDS = [int(i) for i in os.getenv('SHARD_IDS', '').split(',') if i.strip()] or None
+SHARD_WORKER = os.getenv('SHARD_WORKER') == '1'
+SHARD_RESTART_DELAY = 5
+SHARDED = SHARD_COUNT is not None or SHARD_PROCESSES > 1
+
+
+class MusicBot(commands.AutoShardedBot if SHARDED else commands.Bot):
+    http_runner = None
+
+    async def setup_hook(self):
+        check_state_persistence()
+        self.loop.create_task(monitor_loop_lag())
+        self.loop.create_task(sweep_guild_states())
+        if LOOP_PROFILER_ENABLED:
+            setup_profiler_log()
+            loop_profiler.start(self.loop)
+        # Shard işçilerinden yalnızca biri HTTP portunu açar
+        if os.getenv('SHARD_HTTP', '1') == '1':
+            self.http_runner = await start_http_server()
+        # Yeniden dağıtım (Railway) ve başlatıcı işçileri SIGTERM ile durdurur; durum yazımı için düzgün kapan
+        try:
+            self.loop.add_signal_handler(signal.SIGTERM, lambda: self.loop.create_task(self.close()))
+        except NotImplementedError:
+            logger.warning('⚠️ SIGTERM işleyicisi bu platformda kurulamadı')
+
+    async def close(self):
+        # Kapanırken bekleyen durum yazımlarını diske aktar
+        await state_store.close()
+        loop_profiler.stop()
+        await asyncio.get_running_loop().run_in_executor(None, spotify_matcher.close)
+        await asyncio.get_running_loop().run_in_executor(None, spotify_listings.close)
+        if self.http_runner is not None:
+            await self.http_runner.cleanup()
+        await super().close()
+
+bot_options = {}
+if SHARDED and SHARD_COUNT:
+    bot_options.update(shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+
+bot = MusicBot(command_prefix='!', intents=intents, **bot_options)
 
 # Spotify ayarları
 try:
@@ -99,101 +237,1528 @@ ytdl_format_options = {
     'socket_timeout': 30
 }
 
+# Ses efektleri: FFmpeg -af filtre zinciri ve çalma hızına etkisi (konum takibi için)
+# Hız/perde değiştirenler önce 48 kHz'e örnekler, böylece kaynağın örnekleme hızından bağımsızdır
+AUDIO_EFFECTS = {
+    'normal': {
+        'label': 'Normal (efekt yok)',
+        'filters': None,
+        'tempo': 1.0,
+    },
+    'bassboost': {
+        'label': 'Bass Boost',
+        'filters': 'bass=g=8:f=110:w=0.6,alimiter=limit=0.95',
+        'tempo': 1.0,
+    },
+    'nightcore': {
+        'label': 'Nightcore (hızlı + yüksek ses)',
+        'filters': 'aresample=48000,asetrate=60000,aresample=48000',
+        'tempo': 1.25,
+    },
+    'slowed': {
+        'label': 'Slowed (yavaş)',
+        'filters': 'aresample=48000,asetrate=38400,aresample=48000',
+        'tempo': 0.8,
+    },
+    'vaporwave': {
+        'label': 'Vaporwave',
+        'filters': 'aresample=48000,asetrate=38400,aresample=48000,lowpass=f=3500,aecho=0.8:0.85:40|80:0.3|0.2',
+        'tempo': 0.8,
+    },
+    '8d': {
+        'label': '8D Audio',
+        'filters': 'apulsator=hz=0.125',
+        'tempo': 1.0,
+    },
+    'echo': {
+        'label': 'Echo/Reverb',
+        'filters': 'aecho=0.8:0.88:500:0.35',
+        'tempo': 1.0,
+    },
+    'treble': {
+        'label': 'Treble Boost',
+        'filters': 'treble=g=6:f=3000',
+        'tempo': 1.0,
+    },
+}
+
+FFMPEG_BEFORE_OPTIONS = '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5'
+
+@functools.lru_cache(maxsize=512)
+def build_audio_filter(effect='normal', volume=None):
+    """Efekt ve ses seviyesi için -af filtre zincirini oluştur (yoksa None)"""
+    filters = []
+    spec = AUDIO_EFFECTS.get(effect or 'normal', AUDIO_EFFECTS['normal'])
+    if spec['filters']:
+        filters.append(spec['filters'])
+    if volume is not None and volume != 1.0:
+        filters.append(f"volume={volume:.2f}")
+    return ','.join(filters) or None
+
 # Ses efektleri için FFmpeg ayarları
-def get_ffmpeg_options(effect=None):
-    """Ses efektine göre FFmpeg ayarları döndür"""
-    base_options = '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5 -vn'
-    
-    if effect and effect != 'normal':
+@functools.lru_cache(maxsize=512)
+def get_ffmpeg_options(effect=None, volume=None):
+    """Ses efektine (ve FFmpeg'de uygulanacaksa ses seviyesine) göre FFmpeg ayarları döndür"""
+    audio_filter = build_audio_filter(effect or 'normal', volume)
+    options = '-vn'
+    if audio_filter:
+        options += f' -af "{audio_filter}"'
+    return {
+        'before_options': FFMPEG_BEFORE_OPTIONS,
+        'options': options
+    }
+
+# yt-dlp çözümleme havuzu ayarları
+EXTRACTOR_WORKERS = int(os.getenv('EXTRACTOR_WORKERS', '4'))
+EXTRACTOR_MAX_PENDING = int(os.getenv('EXTRACTOR_MAX_PENDING', '64'))
+EXTRACTOR_MAX_PENDING_PER_GUILD = int(os.getenv('EXTRACTOR_MAX_PENDING_PER_GUILD', '8'))
+PLAYLIST_CHUNK_SIZE = 50  # playlist girdileri sıraya bu kadarlık parçalarla eklenir
+PLAYLIST_MAX_TRACKS = int(os.getenv('PLAYLIST_MAX_TRACKS', '5000'))
+PLAYLIST_READERS = int(os.getenv('PLAYLIST_READERS', '2'))  # aynı anda playlist sayfası okuyan thread
+
+class ExtractionCancelled(Exception):
+    """Guild !stop/!leave ile çözümlemeyi iptal etti"""
+
+class ExtractorPool:
+    """Her işçinin kendi YoutubeDL örneğine sahip olduğu, guild bazında adil çözümleme havuzu
+
+    YoutubeDL örnekleri thread-safe değildir; her işçi thread'i kendi örneğini
+    oluşturur. Bekleyen işler guild'ler arasında sırayla (round-robin) dağıtılır,
+    kuyruk dolduğunda yeni istekler yer açılana kadar bekletilir.
+    """
+
+    def __init__(self, size=EXTRACTOR_WORKERS, *, max_pending=EXTRACTOR_MAX_PENDING,
+                 max_pending_per_guild=EXTRACTOR_MAX_PENDING_PER_GUILD, ydl_factory=None, playlist_factory=None):
+        self.size = size
+        self.max_pending = max_pending
+        self.max_pending_per_guild = max_pending_per_guild
+        self.ydl_factory = ydl_factory or (lambda: youtube_dl.YoutubeDL(ytdl_format_options))
+        # Playlist okuyucuları kendi örneğini kullanır; noplaylist kapalıdır ki mix/list bağlantıları açılsın
+        self.playlist_factory = playlist_factory or ydl_factory or (
+            lambda: youtube_dl.YoutubeDL(dict(ytdl_format_options, noplaylist=False)))
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=size, thread_name_prefix='ytdl')
+        # Playlist sayfaları ayrı ve sınırlı bir havuzda okunur: şarkı çözümlemelerini bekletmez,
+        # varsayılan executor'ı (Spotify, durum yazımı vb.) da doldurmaz
+        self.playlist_executor = concurrent.futures.ThreadPoolExecutor(max_workers=PLAYLIST_READERS,
+                                                                       thread_name_prefix='ytdl-playlist')
+        self.local = threading.local()
+        self.pending = OrderedDict()  # guild_id -> deque[(sorgu, process, future)]
+        self.inflight = {}  # guild_id -> çalışan işlerin future'ları
+        self.total_pending = 0
+        self.running = 0
+        self.waiters = deque()  # kuyrukta yer bekleyenler
+        self.epochs = Counter()  # guild_id -> iptal sayacı; değişince playlist okuması durur
+
+    def _extract(self, query, process=True):
+        ydl = getattr(self.local, 'ydl', None)
+        if ydl is None:
+            ydl = self.local.ydl = self.ydl_factory()
+        if process:
+            return ydl.extract_info(query, download=False)
+        # Düz sonuç: arama sayfasındaki bilgiler, videolar tek tek çözümlenmez
+        info = ydl.extract_info(query, download=False, process=False)
+        if info and info.get('entries') is not None:
+            info['entries'] = list(info['entries'])
+        return info
+
+    def _is_full(self, guild_id):
+        return (self.total_pending >= self.max_pending
+                or len(self.pending.get(guild_id, ())) >= self.max_pending_per_guild)
+
+    def _wake_waiters(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def extract(self, query, *, guild_id=None, loop=None, process=True):
+        """Sorguyu havuzdaki bir işçide çözümle (process=False: düz arama sonuçları)"""
+        loop = loop or asyncio.get_running_loop()
+        started = time.perf_counter()
+        # Geri basınç: kuyruk doluysa yer açılana kadar bekle
+        while self._is_full(guild_id):
+            waiter = loop.create_future()
+            self.waiters.append(waiter)
+            await waiter
+
+        future = loop.create_future()
+        jobs = self.pending.setdefault(guild_id, deque())
+        job = (query, process, future)
+        jobs.append(job)
+        self.total_pending += 1
+        self._dispatch(loop)
+        try:
+            result = await future
+            extraction_seconds.observe(time.perf_counter() - started)
+            return result
+        except asyncio.CancelledError:
+            # Bekleyen iş hiç başlamadıysa kuyruktan çıkar
+            if guild_id in self.pending and job in self.pending[guild_id]:
+                self.pending[guild_id].remove(job)
+                self.total_pending -= 1
+                if not self.pending[guild_id]:
+                    del self.pending[guild_id]
+                self._wake_waiters()
+            raise
+
+    def _dispatch(self, loop):
+        while self.running < self.size and self.pending:
+            guild_id, jobs = next(iter(self.pending.items()))
+            query, process, future = jobs.popleft()
+            self.total_pending -= 1
+            # Sırası gelen guild sona geçer, böylece büyük kuyruklar diğerlerini aç bırakmaz
+            if jobs:
+                self.pending.move_to_end(guild_id)
+            else:
+                del self.pending[guild_id]
+            self._wake_waiters()
+            if future.done():
+                continue
+
+            self.running += 1
+            self.inflight.setdefault(guild_id, set()).add(future)
+            work = loop.run_in_executor(self.executor, self._extract, query, process)
+            work.add_done_callback(functools.partial(self._finished, loop, guild_id, future))
+
+    def _finished(self, loop, guild_id, future, work):
+        self.running -= 1
+        inflight = self.inflight.get(guild_id)
+        if inflight is not None:
+            inflight.discard(future)
+            if not inflight:
+                del self.inflight[guild_id]
+        if not future.done():
+            if work.exception() is not None:
+                future.set_exception(work.exception())
+            else:
+                future.set_result(work.result())
+        self._dispatch(loop)
+
+    async def iter_playlist(self, url, *, guild_id=None, chunk_size=PLAYLIST_CHUNK_SIZE, limit=None, loop=None):
+        """Playlist girdilerini düz (process=False) olarak parça parça üret
+
+        yt-dlp listeyi sayfa sayfa çektikçe girdiler üretilir; liste hiçbir
+        zaman bütünüyle bellekte tutulmaz. Okuma kendi YoutubeDL örneğiyle
+        PLAYLIST_READERS thread'lik ayrı havuzda yapılır, böylece şarkı
+        çözümlemelerini bekletmez; çok sayıda alım sırayla bu havuzu paylaşır.
+        Guild için cancel_guild çağrılırsa okuma bir sonraki parçada durur.
+        """
+        loop = loop or asyncio.get_running_loop()
+        epoch = self.epochs[guild_id]
+        ydl = self.playlist_factory()
+        extract = functools.partial(ydl.extract_info, download=False, process=False)
+        info = await loop.run_in_executor(self.playlist_executor, extract, url)
+        # watch?v=...&list=... bağlantıları playlist sayfasına yönlendirme olarak döner
+        for _ in range(3):
+            if not info or info.get('_type') not in ('url', 'url_transparent'):
+                break
+            info = await loop.run_in_executor(self.playlist_executor, extract, info['url'])
+        entries = (info or {}).get('entries')
+        if entries is None:
+            return
+        entries = iter(entries)
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            chunk = await loop.run_in_executor(self.playlist_executor, lambda: list(itertools.islice(entries, size)))
+            if not chunk or self.epochs[guild_id] != epoch:
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+            if len(chunk) < size or self.epochs[guild_id] != epoch:
+                return
+
+    def cancel_guild(self, guild_id):
+        """Guild'in bekleyen ve süren çözümlemelerini iptal et"""
+        self.epochs[guild_id] += 1
+        jobs = self.pending.pop(guild_id, ())
+        self.total_pending -= len(jobs)
+        # Çalışan işler thread'de biter ama sonuçları atılır
+        futures = [future for _, _, future in jobs] + list(self.inflight.pop(guild_id, ()))
+        for future in futures:
+            if not future.done():
+                future.set_exception(ExtractionCancelled("Çözümleme iptal edildi"))
+                # Bekleyen kimse kalmadıysa "exception never retrieved" uyarısını sustur
+                future.exception()
+        self._wake_waiters()
+        return len(futures)
+
+    def stats(self):
+        """Havuz doluluk bilgisi"""
+        return {'workers': self.size, 'running': self.running, 'pending': self.total_pending}
+
+extractor_pool = ExtractorPool()
+
+# Stream URL yenileme ayarları
+STREAM_REFRESH_MARGIN = 600  # URL dolmadan bu kadar saniye önce arka planda yenile
+STREAM_END_TOLERANCE = 3  # şarkı sonuna bu kadar saniye kala kopma normal bitiş sayılır
+STREAM_MAX_RECOVERIES = 3  # şarkı başına en fazla yeniden başlatma
+STREAM_RECOVERY_TIMEOUT = 20  # saniye
+PAUSE_RESPAWN_AFTER = 60  # bu kadar saniyeden uzun duraklatmada FFmpeg'i yeniden başlat
+
+# Yerel ses önbelleği: AUDIO_CACHE_DIR verilmezse kapalı
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR')
+AUDIO_CACHE_MAX_BYTES = int(os.getenv('AUDIO_CACHE_MAX_MB', '2048')) * 1024 * 1024
+AUDIO_CACHE_MIN_PLAYS = int(os.getenv('AUDIO_CACHE_MIN_PLAYS', '3'))  # kaç çalmadan sonra indirilsin
+AUDIO_CACHE_TRACKED_PLAYS = 10000  # çalma sayacının tuttuğu en fazla video
+if AUDIO_CACHE_DIR and SHARD_WORKER and SHARD_IDS:
+    # Her işçi kendi alt dizinini ve boyut payını yönetir, birbirinin dosyasını silmez
+    AUDIO_CACHE_DIR = os.path.join(AUDIO_CACHE_DIR, f'shard-{SHARD_IDS[0]}')
+    AUDIO_CACHE_MAX_BYTES //= SHARD_PROCESSES
+
+class AudioCache:
+    """Sık çalınan şarkıları Opus dosyası olarak diskte tutan, toplam boyuta göre LRU önbellek
+
+    İndirme arka planda ve ayrı bir thread'de yapılır; önbellekte olmayan
+    şarkılar her zamanki gibi doğrudan stream edilir.
+    """
+
+    def __init__(self, directory, *, max_bytes=AUDIO_CACHE_MAX_BYTES, min_plays=AUDIO_CACHE_MIN_PLAYS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_plays = min_plays
+        self.files = OrderedDict()  # video_id -> (yol, boyut); en eski kullanılan başta
+        self.total_bytes = 0
+        self.play_counts = Counter()
+        self.downloading = set()
+        self.hits = 0
+        self.misses = 0
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='audio-cache')
+        self.download_options = dict(
+            ytdl_format_options,
+            format='bestaudio[acodec=opus]/bestaudio',
+            outtmpl=os.path.join(directory, '%(id)s.%(ext)s'),
+            postprocessors=[{'key': 'FFmpegExtractAudio', 'preferredcodec': 'opus'}],
+        )
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Yeniden başlatmada diskteki dosyaları son erişim sırasıyla yükle"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.opus'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, name[:-len('.opus')], stat.st_size))
+        for _, video_id, size in sorted(entries):
+            self.files[video_id] = (os.path.join(self.directory, f"{video_id}.opus"), size)
+            self.total_bytes += size
+        self._evict()
+
+    def lookup(self, video_id):
+        """Önbellekteki dosya yolunu döndür, yoksa None"""
+        entry = self.files.get(video_id) if video_id else None
+        if entry is None or not os.path.exists(entry[0]):
+            if entry is not None:
+                self._remove(video_id)
+            self.misses += 1
+            return None
+        self.files.move_to_end(video_id)
+        os.utime(entry[0])  # LRU sırası yeniden başlatmadan sonra da korunsun
+        self.hits += 1
+        return entry[0]
+
+    def record_play(self, data):
+        """Çalmayı say; yeterince çalınan şarkıyı arka planda indir"""
+        video_id = data.get('id')
+        if not video_id or video_id in self.files or video_id in self.downloading:
+            return
+        self.play_counts[video_id] += 1
+        if len(self.play_counts) > AUDIO_CACHE_TRACKED_PLAYS:
+            self.play_counts = Counter(dict(self.play_counts.most_common(AUDIO_CACHE_TRACKED_PLAYS // 2)))
+        if self.play_counts[video_id] >= self.min_plays and data.get('webpage_url'):
+            self.downloading.add(video_id)
+            asyncio.get_event_loop().create_task(self._download(video_id, data['webpage_url']))
+
+    def _download_blocking(self, url):
+        with youtube_dl.YoutubeDL(self.download_options) as ydl:
+            ydl.download([url])
+
+    async def _download(self, video_id, url):
+        path = os.path.join(self.directory, f"{video_id}.opus")
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self._download_blocking, url)
+            if not os.path.exists(path):
+                raise Exception("Opus dosyası oluşmadı")
+            size = os.path.getsize(path)
+            self.files[video_id] = (path, size)
+            self.total_bytes += size
+            self.play_counts.pop(video_id, None)
+            self._evict()
+            logger.info(f"Ses önbelleğine eklendi: {video_id} ({size // 1024} KB)")
+        except Exception as e:
+            logger.warning(f"Ses önbelleği indirmesi başarısız ({video_id}): {e}")
+        finally:
+            self.downloading.discard(video_id)
+
+    def _remove(self, video_id):
+        path, size = self.files.pop(video_id)
+        self.total_bytes -= size
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.files:
+            self._remove(next(iter(self.files)))
+
+    def stats(self):
+        """İsabet oranı ve doluluk bilgisi"""
+        total = self.hits + self.misses
         return {
-            'before_options': base_options,
-            'options': '-f wav'
+            'files': len(self.files),
+            'bytes': self.total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
         }
-    else:
+
+audio_cache = AudioCache(AUDIO_CACHE_DIR) if AUDIO_CACHE_DIR else None
+
+# Spotify içe aktarma ayarları
+SPOTIFY_PLAYLIST_PAGE_SIZE = 100  # API üst sınırı
+SPOTIFY_ALBUM_PAGE_SIZE = 50  # API üst sınırı
+SPOTIFY_PAGE_CONCURRENCY = int(os.getenv('SPOTIFY_PAGE_CONCURRENCY', '4'))
+# Yalnızca arama terimi için gereken alanları iste
+SPOTIFY_PLAYLIST_FIELDS = 'items(track(id,name,duration_ms,external_ids(isrc),artists(name))),total'
+
+# Çalma modu: 'opus' (FFmpeg Opus üretir, Python'da kare işleme yok) veya 'pcm' (eski yol)
+PLAYBACK_MODE = os.getenv('PLAYBACK_MODE', 'opus').lower()
+# Opus modunda 1.0 dışındaki ses seviyesi FFmpeg'de volume filtresi demektir ve Opus
+# kaynağın yeniden kodlanmadan kopyalanmasını (passthrough) kapatır. Varsayılan 0.5
+# korunur; passthrough şarkı !volume 100 ile açıldığında devreye girer. Her şarkıda
+# passthrough için DEFAULT_VOLUME=1.0 verilebilir (dikkat: iki kat yüksek ses, +6 dB).
+DEFAULT_VOLUME = float(os.getenv('DEFAULT_VOLUME', '0.5'))
+
+# Çalma hatası ayarları
+RESOLVE_MAX_RETRIES = int(os.getenv('RESOLVE_MAX_RETRIES', '3'))
+RESOLVE_RETRY_BASE_DELAY = 1.0  # saniye, her denemede ikiye katlanır
+MAX_CONSECUTIVE_FAILURES = 5  # arka arkaya bu kadar şarkı çalınamazsa dur
+DEAD_TRACKS_PER_GUILD = 256
+DEAD_TRACK_TTL = int(os.getenv('DEAD_TRACK_TTL', '1800'))  # saniye; geçici hatalar (429, kesinti) kalıcı olmasın
+
+# Kalıcı durum ayarları: 'sqlite' (varsayılan) veya 'none'. Veritabanı varsayılan olarak
+# çalışma dizinine yazılır; Railway'de bu dizin her dağıtımda sıfırlanır. Volume bağlıysa
+# (RAILWAY_VOLUME_MOUNT_PATH) dosya oraya yazılır, değilse açılışta hata log'lanır.
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'sqlite').lower()
+STATE_VOLUME_DIR = os.getenv('RAILWAY_VOLUME_MOUNT_PATH')
+STATE_DB_PATH = os.getenv('STATE_DB_PATH', os.path.join(STATE_VOLUME_DIR or '', 'bot_state.sqlite3'))
+STATE_FLUSH_INTERVAL = float(os.getenv('STATE_FLUSH_INTERVAL', '5'))  # saniye
+
+# Bot ses kanalında yalnız kaldıktan kaç saniye sonra çıksın
+IDLE_DISCONNECT_DELAY = 300
+
+# Çözümleme/çalma sayaçları
+playback_metrics = Counter()
+
+# Prometheus metrikleri. Histogramlar da /metrics isteği de yalnızca event loop
+# thread'inde çalışır, bu yüzden kilit yoktur.
+METRIC_PREFIX = 'musicbot'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+LOOP_LAG_INTERVAL = 1.0  # saniye
+
+def format_labels(names, values):
+    """Prometheus etiket bloğu: {a="1",b="2"}"""
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+class Histogram:
+    """Sabit kovalı, isteğe bağlı etiketli histogram"""
+
+    def __init__(self, name, description, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name = f'{METRIC_PREFIX}_{name}'
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        # etiket değerleri -> kova sayıları (+Inf dahil), ardından toplam ve adet
+        self.series = {}
+
+    def observe(self, value, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        bucket_labels = self.labelnames + ('le',)
+        for labels, series in list(self.series.items()):
+            series = list(series)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (None,), series):
+                cumulative += count
+                le = '+Inf' if bound is None else repr(bound)
+                lines.append(f'{self.name}_bucket{format_labels(bucket_labels, labels + (le,))} {cumulative}')
+            suffix = format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{suffix} {series[-2]}')
+            lines.append(f'{self.name}_count{suffix} {series[-1]}')
+        return lines
+
+extraction_seconds = Histogram('extraction_seconds', 'yt-dlp çözümleme süresi (havuz bekleme dahil)')
+source_load_seconds = Histogram('source_load_seconds', 'from_url ile şarkı yükleme süresi', labelnames=('status',))
+track_gap_seconds = Histogram('track_gap_seconds', 'Bir şarkının bitişiyle sıradakinin başlaması arası')
+spotify_page_seconds = Histogram('spotify_page_seconds', 'Spotify sayfa isteği süresi', labelnames=('type',))
+command_seconds = Histogram('command_seconds', 'Komut süresi', labelnames=('command', 'status'))
+search_seconds = Histogram('search_seconds', '!search düz arama süresi')
+loop_lag_seconds = Histogram('loop_lag_seconds', 'Event loop gecikmesi', buckets=LOOP_LAG_BUCKETS)
+metric_gauges = {'loop_lag_seconds_last': 0.0}
+
+async def monitor_loop_lag(interval=LOOP_LAG_INTERVAL):
+    """Uykudan geç uyanma süresini event loop gecikmesi olarak ölç"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        loop_lag_seconds.observe(lag)
+        metric_gauges['loop_lag_seconds_last'] = lag
+
+# Event loop gözcüsü: loop'u bloklayan çağrıların stack'ini yakalar, komut başına örnekler.
+# Varsayılan kapalı: ayrı thread'den her örnekte sys._current_frames() çağrısı GIL'i
+# alır ve ölçtüğü gecikmeye kendisi eklenir; yalnızca teşhis sırasında LOOP_PROFILER=1 ile aç.
+LOOP_PROFILER_ENABLED = os.getenv('LOOP_PROFILER', '0') == '1'
+SLOW_CALLBACK_THRESHOLD = float(os.getenv('SLOW_CALLBACK_THRESHOLD', '0.25'))  # saniye
+PROFILER_SAMPLE_INTERVAL = float(os.getenv('PROFILER_SAMPLE_INTERVAL', '0.01'))  # saniye
+PROFILER_HEARTBEAT_INTERVAL = 0.05  # saniye
+PROFILER_MAX_STALLS = 50  # bellekte tutulan en fazla takılma kaydı
+PROFILER_REPORT_INTERVAL = 300  # sıcak noktaların log'a yazılma aralığı (saniye)
+PROFILER_LOG_PATH = os.getenv('PROFILER_LOG_PATH', 'loop_profiler.log')
+PROFILER_LOG_MAX_BYTES = 1024 * 1024
+PROFILER_LOG_BACKUPS = 3
+
+profiler_logger = logging.getLogger(f'{__name__}.profiler')
+
+class LoopProfiler:
+    """Event loop thread'ini ayrı bir thread'den örnekleyen gözcü
+
+    Loop her PROFILER_HEARTBEAT_INTERVAL'da bir zaman damgası bırakır. Damga
+    SLOW_CALLBACK_THRESHOLD'dan eskiyse loop bloklanmıştır ve loop thread'inin o
+    anki stack'i kaydedilir. Loop boşta değilken alınan her örnek, stack'teki komut
+    callback'ine (yoksa main.py'deki en dış fonksiyona) yazılır.
+    """
+
+    def __init__(self, *, threshold=SLOW_CALLBACK_THRESHOLD, interval=PROFILER_SAMPLE_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.loop_thread_id = None
+        self.heartbeat = time.monotonic()
+        self.stall = None  # devam eden takılma kaydı
+        self.stalls = deque(maxlen=PROFILER_MAX_STALLS)
+        self.samples = Counter()  # komut/coroutine -> meşgul örnek sayısı
+        self.hot_frames = Counter()  # (komut/coroutine, 'dosya:satır fonksiyon') -> örnek sayısı
+        self.total_samples = 0
+        self.busy_samples = 0
+        self.command_codes = {}
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def start(self, loop):
+        """Loop thread'inden çağrılır"""
+        if self.thread is not None:
+            return
+        self.loop_thread_id = threading.get_ident()
+        self.command_codes = {command.callback.__code__: command.qualified_name for command in bot.walk_commands()}
+        loop.create_task(self._beat())
+        self.thread = threading.Thread(target=self._run, name='loop-profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    async def _beat(self):
+        while True:
+            self.heartbeat = time.monotonic()
+            await asyncio.sleep(PROFILER_HEARTBEAT_INTERVAL)
+
+    def reset(self):
+        self.stalls.clear()
+        self.samples.clear()
+        self.hot_frames.clear()
+        self.total_samples = self.busy_samples = 0
+
+    def _run(self):
+        next_report = time.monotonic() + PROFILER_REPORT_INTERVAL
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            self._check_stall(frame)
+            self.total_samples += 1
+            if not self._is_idle(frame):
+                self.busy_samples += 1
+                owner = self._owner(frame)
+                self.samples[owner] += 1
+                self.hot_frames[(owner, self._describe(frame))] += 1
+            del frame
+            if time.monotonic() >= next_report:
+                next_report = time.monotonic() + PROFILER_REPORT_INTERVAL
+                self._report()
+
+    def _check_stall(self, frame):
+        blocked = time.monotonic() - self.heartbeat - PROFILER_HEARTBEAT_INTERVAL
+        if blocked > self.threshold and self.stall is None:
+            self.stall = {
+                'started': time.time() - blocked,
+                'duration': blocked,
+                'owner': self._owner(frame),
+                'stack': ''.join(traceback.format_stack(frame)),
+            }
+            self.stalls.append(self.stall)
+            profiler_logger.warning(f"Event loop {blocked:.2f} sn bloklandı ({self.stall['owner']}):\n"
+                                    f"{self.stall['stack']}")
+        elif self.stall is not None:
+            if blocked > self.threshold:
+                self.stall['duration'] = blocked
+            else:
+                profiler_logger.warning(f"Event loop takılması bitti: {self.stall['duration']:.2f} sn "
+                                        f"({self.stall['owner']})")
+                self.stall = None
+
+    @staticmethod
+    def _is_idle(frame):
+        # Boştaki loop selector'da bekler
+        return frame.f_code.co_filename.endswith('selectors.py')
+
+    def _owner(self, frame):
+        """Stack'teki komut adını, yoksa main.py'deki en dış fonksiyonu döndür"""
+        outermost = None
+        while frame is not None:
+            command = self.command_codes.get(frame.f_code)
+            if command is not None:
+                return command
+            if frame.f_code.co_filename == __file__:
+                outermost = frame.f_code.co_name
+            frame = frame.f_back
+        return f'~{outermost}' if outermost else '-'
+
+    @staticmethod
+    def _describe(frame):
+        return f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} {frame.f_code.co_name}'
+
+    def hottest(self, count=5):
+        """En çok örneklenen komut/coroutine'ler ve her birinin en sıcak satırı"""
+        samples = dict(self.samples)
+        frames = dict(self.hot_frames)
+        result = []
+        for owner, hits in Counter(samples).most_common(count):
+            top = max(((where, n) for (who, where), n in frames.items() if who == owner),
+                      key=lambda item: item[1], default=(None, 0))
+            result.append((owner, hits, top[0]))
+        return result
+
+    def _report(self):
+        if not self.busy_samples:
+            return
+        lines = [f"{owner}: {hits / self.busy_samples * 100:.1f}% ({where})" for owner, hits, where in self.hottest(10)]
+        profiler_logger.info(f"Loop meşguliyeti {self.busy_samples / max(self.total_samples, 1) * 100:.1f}%, "
+                             f"sıcak noktalar:\n" + '\n'.join(lines))
+
+def setup_profiler_log(path=PROFILER_LOG_PATH):
+    """Gözcü kayıtlarını dönen bir log dosyasına da yaz"""
+    if not path or any(isinstance(h, logging.handlers.RotatingFileHandler) for h in profiler_logger.handlers):
+        return
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=PROFILER_LOG_MAX_BYTES,
+                                                   backupCount=PROFILER_LOG_BACKUPS, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    profiler_logger.addHandler(handler)
+
+loop_profiler = LoopProfiler()
+
+def collect_gauges():
+    """Anlık değerler: (ad, açıklama, tür, [(etiket adları, etiket değerleri, değer), ...])"""
+    states = list(guild_states.values())
+    queues = [len(state.queue) for state in states]
+    players = [state.current for state in states if isinstance(state.current, YTDLSource)]
+    ffmpeg = sum(1 for player in players if not player.closed and player._source is not None)
+    if audio_cache:
+        ffmpeg += len(audio_cache.downloading)  # opus dönüştürmesi FFmpeg ile yapılır
+    pool = extractor_pool.stats()
+    cache = resolve_cache.stats()
+    listings = spotify_listings.stats()
+    return [
+        ('voice_clients', 'Bağlı ses istemcisi', 'gauge', [((), (), len(bot.voice_clients))]),
+        ('guilds', 'Bulunulan sunucu', 'gauge', [((), (), len(bot.guilds))]),
+        ('guild_states', 'Bellekteki guild müzik durumu', 'gauge', [((), (), len(states))]),
+        ('resident_memory_bytes', 'Sürecin bellek kullanımı (RSS)', 'gauge', [((), (), process_memory() or 0)]),
+        ('queued_tracks', 'Tüm sıralardaki şarkı', 'gauge', [((), (), sum(queues))]),
+        ('queue_depth_max', 'En uzun sıra', 'gauge', [((), (), max(queues, default=0))]),
+        ('active_queues', 'Boş olmayan sıra', 'gauge', [((), (), sum(1 for depth in queues if depth))]),
+        ('ffmpeg_processes', 'Çalışan FFmpeg süreci', 'gauge', [((), (), ffmpeg)]),
+        ('extractor_running', 'Çalışan çözümleme', 'gauge', [((), (), pool['running'])]),
+        ('extractor_pending', 'Bekleyen çözümleme', 'gauge', [((), (), pool['pending'])]),
+        ('loop_lag_seconds_last', 'Son ölçülen event loop gecikmesi', 'gauge',
+         [((), (), metric_gauges['loop_lag_seconds_last'])]),
+        ('resolve_cache_entries', 'Çözümleme önbelleğindeki kayıt', 'gauge', [((), (), cache['size'])]),
+        ('resolve_cache_requests_total', 'Çözümleme önbelleği istekleri', 'counter',
+         [(('result',), ('hit',), cache['hits']), (('result',), ('miss',), cache['misses'])]),
+        ('spotify_listing_requests_total', 'Spotify liste önbelleği istekleri', 'counter',
+         [(('result',), ('hit',), listings['hits']), (('result',), ('miss',), listings['misses'])]),
+        ('spotify_listing_bytes_saved_total', 'Önbellekten verilen listelerin atlanan cevap boyutu', 'counter',
+         [((), (), listings['bytes_saved'])]),
+        ('playback_events_total', 'Çözümleme/çalma olayları', 'counter',
+         [(('event',), (event,), count) for event, count in sorted(playback_metrics.items())]),
+    ]
+
+def render_metrics():
+    """Tüm metrikleri Prometheus metin biçiminde döndür"""
+    lines = []
+    for name, description, kind, samples in collect_gauges():
+        name = f'{METRIC_PREFIX}_{name}'
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labelnames, labels, value in samples:
+            lines.append(f'{name}{format_labels(labelnames, labels)} {value}')
+    for histogram in (extraction_seconds, source_load_seconds, track_gap_seconds,
+                      spotify_page_seconds, command_seconds, search_seconds, loop_lag_seconds):
+        lines.extend(histogram.render())
+    return '\n'.join(lines) + '\n'
+
+# Çalan şarkı sürerken kaç sıradaki şarkının önceden çözümleneceği (0: kapalı)
+PREFETCH_DEPTH = int(os.getenv('PREFETCH_DEPTH', '2'))
+
+# Çözümleme önbelleği ayarları
+RESOLVE_CACHE_SIZE = int(os.getenv('RESOLVE_CACHE_SIZE', '2048'))
+RESOLVE_CACHE_TTL = int(os.getenv('RESOLVE_CACHE_TTL', '3600'))  # saniye
+STREAM_URL_MARGIN = 600  # googlevideo URL'si dolmadan bu kadar saniye önce kaydı düşür
+
+def stream_url_expiry(url):
+    """Stream URL'sindeki expire zamanını (unix) döndür, yoksa None"""
+    if not url:
+        return None
+    expire = parse_qs(urlparse(url).query).get('expire')
+    if not expire:
+        match = re.search(r'/expire/(\d+)', url)
+        expire = [match.group(1)] if match else None
+    try:
+        return int(expire[0]) if expire else None
+    except ValueError:
+        return None
+
+class ResolveCache:
+    """Arama terimi ve video id'si ile anahtarlanan, TTL ve LRU tahliyeli yt-dlp sonuç önbelleği"""
+
+    def __init__(self, maxsize=RESOLVE_CACHE_SIZE, ttl=RESOLVE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # birincil anahtar -> (son geçerlilik, data)
+        self.aliases = {}  # arama terimi / URL / id -> birincil anahtar
+        self.alias_sets = {}  # birincil anahtar -> takma adları
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def normalize(query):
+        """Arama terimini anahtar olarak kullanılacak hale getir"""
+        query = ' '.join(str(query).split())
+        # URL, id: anahtarı ve id'ye benzeyen sorgular büyük/küçük harfe duyarlı, serbest aramalar değil
+        if query.startswith(('id:', 'http://', 'https://')) or VIDEO_ID_RE.match(query):
+            return query
+        return query.lower()
+
+    def _drop(self, primary):
+        self.entries.pop(primary, None)
+        for alias in self.alias_sets.pop(primary, ()):
+            if self.aliases.get(alias) == primary:
+                del self.aliases[alias]
+
+    def get(self, query):
+        """Önbellekteki geçerli sonucu döndür, yoksa None"""
+        primary = self.aliases.get(self.normalize(query))
+        entry = self.entries.get(primary) if primary else None
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, data = entry
+        if expires_at <= time.time():
+            self._drop(primary)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.entries.move_to_end(primary)
+        self.hits += 1
+        return data
+
+    def get_by_id(self, video_id):
+        """Video id'si ile önbellek araması"""
+        return self.get(f"id:{video_id}")
+
+    def put(self, query, data):
+        """Çözümlenmiş sonucu arama terimi, video id'si ve sayfa URL'si altında sakla"""
+        now = time.time()
+        expires_at = now + self.ttl
+        url_expiry = stream_url_expiry(data.get('url'))
+        if url_expiry:
+            expires_at = min(expires_at, url_expiry - STREAM_URL_MARGIN)
+        if expires_at <= now:
+            return
+
+        primary = f"id:{data['id']}" if data.get('id') else self.normalize(query)
+        if primary in self.entries:
+            self._drop(primary)
+        self.entries[primary] = (expires_at, data)
+        alias_set = self.alias_sets[primary] = set()
+        for alias in (primary, query, data.get('webpage_url'), data.get('original_url')):
+            if alias:
+                alias = self.normalize(alias)
+                self.aliases[alias] = primary
+                alias_set.add(alias)
+
+        while len(self.entries) > self.maxsize:
+            oldest = next(iter(self.entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def stats(self):
+        """Sayaçları döndür"""
+        total = self.hits + self.misses
         return {
-            'before_options': base_options,
-            'options': '-f wav'
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': self.hits / total if total else 0.0,
         }
 
-ytdl = youtube_dl.YoutubeDL(ytdl_format_options)
+resolve_cache = ResolveCache()
+
+# Guild bazlı durum
+HISTORY_SIZE = 20  # geçmişte tutulan son şarkı
+GUILD_STATE_IDLE_TTL = int(os.getenv('GUILD_STATE_IDLE_TTL', '3600'))  # bu kadar kullanılmayan durum bellekten atılır
+GUILD_STATE_SWEEP_INTERVAL = 300  # saniye
+
+class GuildMusicState:
+    """Bir guild'in tüm müzik durumu: sıra, geçmiş, çalan şarkı ve ayarlar
 
-# Guild bazlı ayarlar
-music_queues = {}
-current_songs = {}
-repeat_modes = {}  # 0: kapalı, 1: şarkı tekrarı, 2: sıra tekrarı
-music_history = {}  # Müzik geçmişi
-sound_effects = {}  # Aktif ses efektleri
+    Yalnızca durumu değiştiren bir işlemde oluşturulur (salt okuyan komutlar
+    find_guild_state kullanır); uzun süre kullanılmayınca evict_idle_guilds
+    tarafından kaydedilip bellekten atılır. Ön çözümleyici ve çalma durum
+    makinesi ilk gerektiğinde oluşturulur.
+    """
+    __slots__ = ('guild_id', 'queue', 'history', 'current', 'repeat_mode', 'effect',
+                 '_prefetcher', '_playback', 'last_active')
 
-def get_queue(guild_id):
-    """Guild için queue al, yoksa oluştur"""
-    if guild_id not in music_queues:
-        music_queues[guild_id] = deque()
-    return music_queues[guild_id]
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+        self.queue = TrackQueue()
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self.current = None  # çalan YTDLSource
+        self.repeat_mode = 0  # 0: kapalı, 1: şarkı tekrarı, 2: sıra tekrarı
+        self.effect = 'normal'  # aktif ses efekti
+        self._prefetcher = None
+        self._playback = None
+        self.last_active = time.monotonic()
 
-def get_history(guild_id):
-    """Guild için geçmiş al, yoksa oluştur"""
-    if guild_id not in music_history:
-        music_history[guild_id] = deque(maxlen=20)  # Son 20 şarkı
-    return music_history[guild_id]
+    @property
+    def prefetcher(self):
+        if self._prefetcher is None:
+            self._prefetcher = TrackPrefetcher(self.guild_id)
+        return self._prefetcher
+
+    @property
+    def playback(self):
+        if self._playback is None:
+            self._playback = PlaybackState()
+        return self._playback
+
+    @property
+    def busy(self):
+        """Çözümlenen ya da ön çözümlenen bir şey var mı (çalma, ses bağlantısından anlaşılır)"""
+        return ((self._playback is not None and self._playback.state != PlaybackState.IDLE)
+                or (self._prefetcher is not None and bool(self._prefetcher.tasks)))
+
+    def release(self):
+        """Arka plan görevlerini durdur (durum bellekten atılırken)"""
+        if self._prefetcher is not None:
+            self._prefetcher.cancel()
+        if self._playback is not None:
+            self._playback.cancel_watch()
+
+    def memory_size(self):
+        """Durumun yaklaşık bellek kullanımı (bayt): şarkı nesneleri ve metinleri dahil"""
+        seen = set()
+
+        def size(obj):
+            if obj is None or id(obj) in seen:
+                return 0
+            seen.add(id(obj))
+            return sys.getsizeof(obj)
+
+        total = size(self) + size(self.queue) + size(self.queue._items) + size(self.history)
+        for track in itertools.chain(self.queue, self.history):
+            total += size(track) + sum(size(getattr(track, name)) for name in Track.__slots__)
+        if self.current is not None:
+            total += size(self.current) + size(self.current.data)
+        if self._prefetcher is not None:
+            total += size(self._prefetcher) + size(self._prefetcher.tasks)
+        if self._playback is not None:
+            total += size(self._playback) + size(self._playback.dead_tracks)
+        return total
+
+guild_states = {}  # guild_id -> GuildMusicState
+
+def find_guild_state(guild_id):
+    """Guild durumu varsa döndür, yoksa None (oluşturmaz)"""
+    return guild_states.get(guild_id)
+
+def get_guild_state(guild_id):
+    """Guild durumunu al, yoksa oluştur; kullanım zamanını günceller"""
+    state = guild_states.get(guild_id)
+    if state is None:
+        state = guild_states[guild_id] = GuildMusicState(guild_id)
+    state.last_active = time.monotonic()
+    return state
+
+def get_queue(guild_id, *, create=True):
+    """Guild için queue al, yoksa oluştur (create=False: boş ve bağımsız bir sıra döner)"""
+    state = get_guild_state(guild_id) if create else find_guild_state(guild_id)
+    return state.queue if state else TrackQueue()
+
+def get_history(guild_id, *, create=True):
+    """Guild için geçmiş al, yoksa oluştur (create=False: boş bir geçmiş döner)"""
+    state = get_guild_state(guild_id) if create else find_guild_state(guild_id)
+    return state.history if state else deque(maxlen=HISTORY_SIZE)
+
+def get_current_song(guild_id):
+    """Guild'de çalan YTDLSource, yoksa None"""
+    state = guild_states.get(guild_id)
+    return state.current if state else None
+
+def forgive_dead_track(guild_id, track):
+    """Açıkça yeniden eklenen şarkının kara liste kaydını sil (durum oluşturmaz)"""
+    state = guild_states.get(guild_id)
+    if state is not None and state._playback is not None:
+        state._playback.forgive(track)
 
 def get_repeat_mode(guild_id):
     """Guild için tekrar modunu al"""
-    return repeat_modes.get(guild_id, 0)
+    state = guild_states.get(guild_id)
+    return state.repeat_mode if state else 0
 
 def get_sound_effect(guild_id):
     """Guild için aktif ses efektini al"""
-    return sound_effects.get(guild_id, 'normal')
+    state = guild_states.get(guild_id)
+    return state.effect if state else 'normal'
+
+def get_playback_state(guild_id):
+    """Guild için çalma durumunu al, yoksa oluştur"""
+    return get_guild_state(guild_id).playback
+
+def get_prefetcher(guild_id):
+    """Guild için ön çözümleyici al, yoksa oluştur"""
+    return get_guild_state(guild_id).prefetcher
 
 async def cleanup_guild_data(guild_id):
     """Kullanılmayan guild verilerini temizle"""
-    if guild_id in music_queues:
-        music_queues[guild_id].clear()
-    if guild_id in current_songs:
-        del current_songs[guild_id]
-    if guild_id in repeat_modes:
-        del repeat_modes[guild_id]
-    if guild_id in sound_effects:
-        del sound_effects[guild_id]
-    if guild_id in music_history:
-        del music_history[guild_id]
+    state = guild_states.pop(guild_id, None)
+    if state is not None:
+        # Sırayı tutan süren işlemler (ör. playlist alımı) boş sırayla devam etsin
+        state.queue.clear()
+        state.release()
+    extractor_pool.cancel_guild(guild_id)
+    idle_scheduler.cancel(guild_id)
+    state_store.mark_dirty(guild_id)
     logger.info(f"Guild {guild_id} verileri temizlendi")
 
-class YTDLSource(discord.PCMVolumeTransformer):
-    def __init__(self, source, *, data, volume=0.5):
-        super().__init__(source, volume)
+class Track:
+    """Sıradaki tek bir şarkı; bir kez çözümlenir, sonra sayfa URL'si ile çalınır"""
+    # Büyük Spotify içe aktarmalarında binlerce nesne oluşur, __dict__ taşımasınlar
+    __slots__ = ('query', 'id', 'title', 'duration', 'webpage_url', 'spotify')
+
+    def __init__(self, query, *, id=None, title=None, duration=None, webpage_url=None, spotify=None):
+        self.query = query
+        self.id = id
+        self.title = title
+        self.duration = duration
+        self.webpage_url = webpage_url
+        self.spotify = spotify  # Spotify'dan geldiyse eşleştirme bilgileri (spotify_track_info)
+
+    @classmethod
+    def from_data(cls, query, data):
+        """yt-dlp sonucundan çözümlenmiş şarkı oluştur"""
+        track = cls(query)
+        track.update(data)
+        return track
+
+    def to_dict(self):
+        """Kalıcı saklama için kısa anahtarlı sözlük"""
+        item = {'q': self.query, 'i': self.id, 't': self.title, 'd': self.duration, 'u': self.webpage_url}
+        if self.spotify and not self.webpage_url:
+            item['s'] = self.spotify  # eşleşmemiş Spotify şarkısı yeniden başlatmada da eşleştirilebilsin
+        return item
+
+    @classmethod
+    def from_dict(cls, item):
+        return cls(item['q'], id=item.get('i'), title=item.get('t'), duration=item.get('d'),
+                   webpage_url=item.get('u'), spotify=item.get('s'))
+
+    def update(self, data):
+        """yt-dlp sonucundaki bilgileri şarkıya işle"""
+        self.id = data.get('id') or self.id
+        self.title = data.get('title') or self.title
+        self.duration = data.get('duration') or self.duration
+        self.webpage_url = data.get('webpage_url') or self.webpage_url
+
+    @property
+    def resolved(self):
+        return self.webpage_url is not None
+
+    @property
+    def source(self):
+        """Çözümlemede kullanılacak URL veya arama terimi"""
+        return self.webpage_url or self.query
+
+    @property
+    def display_name(self):
+        return self.title or self.query
+
+    def __repr__(self):
+        return f"<Track {self.id or self.query!r}>"
+
+class TrackQueue:
+    """Guild'in şarkı sırası: indeksle erişim O(1), sayfa alma O(sayfa), baştan çıkarma O(1)
+
+    Liste ve baş ofseti ile tutulur. Çalınan şarkılar listenin başında boşluk
+    bırakır; boşluk listenin yarısını geçince tek seferde sıkıştırılır. Her
+    değişiklik version'ı artırır, sayfa önbellekleri buna bakar.
+    """
+    __slots__ = ('_items', '_head', 'version')
+    COMPACT_MIN = 64  # bu kadar boşluk birikmeden sıkıştırma yapma
+
+    def __init__(self, tracks=()):
+        self._items = list(tracks)
+        self._head = 0
+        self.version = 0
+
+    def __len__(self):
+        return len(self._items) - self._head
+
+    def __iter__(self):
+        return itertools.islice(self._items, self._head, None)
+
+    def _position(self, index):
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError('sıra indeksi aralık dışında')
+        return self._head + index
+
+    def _bounds(self, index):
+        start, stop, step = index.indices(len(self))
+        if step != 1:
+            raise ValueError('sıra dilimlerinde adım desteklenmiyor')
+        return self._head + start, self._head + max(start, stop)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop = self._bounds(index)
+            return self._items[start:stop]
+        return self._items[self._position(index)]
+
+    def __delitem__(self, index):
+        self.version += 1
+        if isinstance(index, slice):
+            start, stop = self._bounds(index)
+            del self._items[start:stop]
+        else:
+            del self._items[self._position(index)]
+
+    def append(self, track):
+        self.version += 1
+        self._items.append(track)
+
+    def extend(self, tracks):
+        self.version += 1
+        self._items.extend(tracks)
+
+    def appendleft(self, track):
+        self.version += 1
+        if self._head:
+            self._head -= 1
+            self._items[self._head] = track
+        else:
+            self._items.insert(0, track)
+
+    def popleft(self):
+        if not len(self):
+            raise IndexError('boş sıradan çıkarma')
+        self.version += 1
+        track = self._items[self._head]
+        self._items[self._head] = None
+        self._head += 1
+        if self._head >= self.COMPACT_MIN and self._head * 2 >= len(self._items):
+            self._compact()
+        return track
+
+    def pop(self):
+        if not len(self):
+            raise IndexError('boş sıradan çıkarma')
+        self.version += 1
+        return self._items.pop()
+
+    def clear(self):
+        self.version += 1
+        self._items.clear()
+        self._head = 0
+
+    def _compact(self):
+        del self._items[:self._head]
+        self._head = 0
+
+    def shuffle(self, rng=random):
+        """Sırayı kopyalamadan yerinde karıştır"""
+        self.version += 1
+        self._compact()
+        rng.shuffle(self._items)
+
+    def remove_range(self, start, stop):
+        """[start, stop) aralığını çıkar ve çıkarılan şarkıları döndür"""
+        removed = self[start:stop]
+        del self[start:stop]
+        return removed
+
+    def move(self, start, stop, target):
+        """[start, stop) aralığını, kalan sırada target indeksinden başlayacak şekilde taşı"""
+        block = self.remove_range(start, stop)
+        target = self._head + min(max(target, 0), len(self))
+        self.version += 1
+        self._items[target:target] = block
+
+    def dedupe(self, key, start=0, stop=None):
+        """Aralıktaki tekrarlanan şarkıları (ilki kalır) çıkar, çıkarılan sayısını döndür"""
+        start, stop = self._bounds(slice(start, stop))
+        seen = set()
+        kept = []
+        for track in self._items[start:stop]:
+            track_id = key(track)
+            if track_id not in seen:
+                seen.add(track_id)
+                kept.append(track)
+        self.version += 1
+        self._items[start:stop] = kept
+        return (stop - start) - len(kept)
+
+    def __repr__(self):
+        return f"<TrackQueue {len(self)} şarkı>"
+
+class YTDLSource(discord.AudioSource):
+    """Çalan şarkı; FFmpeg sürecini sarar, gerektiğinde aynı stream'den yeniden başlatır
+
+    'opus' modunda FFmpeg doğrudan Opus paketleri üretir (kaynak zaten Opus ise
+    yeniden kodlamadan kopyalar), ses seviyesi FFmpeg içinde uygulanır. 'pcm'
+    modunda eski davranış: PCM + Python tarafında ses seviyesi + libopus.
+    """
+
+    def __init__(self, *, data, volume=DEFAULT_VOLUME, effect='normal', mode=PLAYBACK_MODE, local_path=None,
+                 guild_id=None):
         self.data = data
+        self.guild_id = guild_id
         self.title = data.get('title')
         self.url = data.get('url')
+        self.local_path = local_path  # yerel ses önbelleğindeki Opus dosyası (varsa)
         self.duration = data.get('duration')
         self.webpage_url = data.get('webpage_url')
+        self.effect = effect
+        self.mode = mode
+        self._volume = volume
+        self._lock = threading.Lock()
+        self.frames = 0  # mevcut FFmpeg sürecinden okunan 20 ms'lik kare sayısı
+        self.start_offset = 0.0  # mevcut FFmpeg sürecinin başladığı saniye
+        self._source = None
+        self.closed = False
+        self.recoveries = 0  # stream koptuğunda yapılan yeniden başlatma sayısı
+        self.paused_at = None
+        self._source = self._spawn(0.0)
 
     @classmethod
-@classmethod
-async def from_url(cls, url, *, loop=None, stream=False, effect='normal'):  # Bu satır class içinde olmalı
-    loop = loop or asyncio.get_event_loop()  # 4 boşluk girinti
-    try:  # 4 boşluk girinti
+    def from_data(cls, data, *, effect='normal', guild_id=None):
+        """Çözümlenmiş yt-dlp verisinden FFmpeg kaynağı oluştur"""
+        local_path = None
+        if audio_cache is not None:
+            local_path = audio_cache.lookup(data.get('id'))
+            audio_cache.record_play(data)
+        return cls(data=data, effect=effect, local_path=local_path, guild_id=guild_id)
+
+    @property
+    def passthrough(self):
+        """Kaynak Opus ve işlenecek bir şey yoksa FFmpeg paketleri yeniden kodlamadan kopyalar"""
+        return ((self.local_path is not None or self.data.get('acodec') == 'opus')
+                and build_audio_filter(self.effect, self._volume) is None)
+
+    def _spawn(self, offset):
+        # Efekt aynı FFmpeg sürecinde uygulanır; opus modunda ses seviyesi de
+        volume = self._volume if self.mode == 'opus' else None
+        ffmpeg_options = get_ffmpeg_options(self.effect, volume)
+        # Yerel dosyada ağ yeniden bağlanma seçeneklerine gerek yok
+        before_options = '' if self.local_path else ffmpeg_options['before_options']
+        if offset:
+            before_options += f' -ss {offset:.2f}'
+        url = self.local_path or self.url
+
+        if self.mode == 'opus':
+            # Codec bilgisi yt-dlp'den gelir, ayrıca ffprobe süreci başlatmaya gerek yok
+            codec = 'opus' if self.passthrough else None
+            return discord.FFmpegOpusAudio(url, codec=codec, before_options=before_options,
+                                           options=ffmpeg_options['options'])
+
+        source = discord.FFmpegPCMAudio(url, before_options=before_options, options=ffmpeg_options['options'])
+        return discord.PCMVolumeTransformer(source, self._volume)
+
+    @property
+    def position(self):
+        """Şarkıdaki mevcut konum (saniye, kaynak zamanında)"""
+        # Hızlandıran/yavaşlatan efektlerde 20 ms'lik çıkış karesi kaynakta tempo kadar ilerler
+        tempo = AUDIO_EFFECTS.get(self.effect, AUDIO_EFFECTS['normal'])['tempo']
+        return self.start_offset + self.frames * discord.opus.Encoder.FRAME_LENGTH / 1000 * tempo
+
+    def respawn(self, offset=None):
+        """FFmpeg'i aynı stream URL'si üzerinde verilen konumdan yeniden başlat"""
+        if self.closed:
+            # Oynatıcı kaynağı bırakmış, sahipsiz FFmpeg süreci başlatma
+            return
+        offset = self.position if offset is None else offset
+        new_source = self._spawn(offset)
+        with self._lock:
+            old_source, self._source = self._source, new_source
+            self.start_offset = offset
+            self.frames = 0
+        old_source.cleanup()
+
+    def set_effect(self, effect):
+        """Efekti değiştir; yalnızca FFmpeg yeniden başlar, şarkı kaldığı yerden devam eder"""
+        if effect == self.effect:
+            return
+        # Konum eski efektin temposuyla hesaplanmalı
+        offset = self.position
+        self.effect = effect
+        self.respawn(offset)
+
+    @property
+    def volume(self):
+        return self._volume
+
+    @volume.setter
+    def volume(self, value):
+        self._volume = max(value, 0.0)
+        if self.mode == 'opus':
+            # Ses seviyesi FFmpeg filtresinde, süreci bulunduğu yerden yeniden başlat
+            self.respawn()
+        else:
+            self._source.volume = self._volume
+
+    @property
+    def expires_at(self):
+        """Stream URL'sinin geçerliliğini yitireceği zaman (unix), bilinmiyorsa None"""
+        return None if self.local_path else stream_url_expiry(self.url)
+
+    def url_expiring(self, margin=STREAM_REFRESH_MARGIN):
+        expires_at = self.expires_at
+        return expires_at is not None and expires_at - margin <= time.time()
+
+    async def refresh_url(self):
+        """Stream URL'sini sayfa URL'si üzerinden aramasız yenile"""
+        if self.local_path or not self.webpage_url:
+            return False
+        url = direct_video_url(self.webpage_url) or self.webpage_url
+        data = await extractor_pool.extract(url, guild_id=self.guild_id)
+        if data and 'entries' in data:
+            data = data['entries'][0] if data['entries'] else None
+        if not data or not data.get('url'):
+            return False
+        self.url = data['url']
+        self.data = data
+        resolve_cache.put(self.webpage_url, data)
+        logger.info(f"Stream URL'si yenilendi: {self.title}")
+        return True
+
+    def _stream_died(self):
+        """FFmpeg şarkı bitmeden çıktı mı (URL süresi dolması, bağlantı kopması)"""
+        if self.closed or self.local_path or not self.duration:
+            return False
+        return self.position < self.duration - STREAM_END_TOLERANCE
+
+    def _recover(self):
+        """Kopan stream'i kalınan yerden yeniden başlat (ses thread'inde çalışır)"""
+        if self.recoveries >= STREAM_MAX_RECOVERIES:
+            return False
+        self.recoveries += 1
+        # Yeni süreç hiç kare üretmediyse ya da URL dolmuşsa önce URL'yi yenile
+        if self.frames == 0 or self.url_expiring(margin=60):
+            try:
+                future = asyncio.run_coroutine_threadsafe(self.refresh_url(), bot.loop)
+                if not future.result(timeout=STREAM_RECOVERY_TIMEOUT):
+                    return False
+            except Exception as e:
+                logger.error(f"Stream URL'si yenilenemedi ({self.title}): {e}")
+                return False
+        logger.warning(f"Stream {self.position:.0f}. saniyede koptu, yeniden başlatılıyor: {self.title}")
+        self.respawn()
+        return not self.closed
+
+    def read(self):
+        with self._lock:
+            data = self._source.read()
+            if data:
+                self.frames += 1
+                return data
+        # Şarkı bitmeden boş okuma: sonraki şarkıya geçmek yerine kaldığı yerden devam et
+        while self._stream_died() and self._recover():
+            with self._lock:
+                data = self._source.read()
+                if data:
+                    self.frames += 1
+                    return data
+        return b''
+
+    def is_opus(self):
+        return self.mode == 'opus'
+
+    def cleanup(self):
+        self.closed = True
+        if self._source is not None:
+            self._source.cleanup()
+
+    @classmethod
+    async def from_url(cls, url, *, loop=None, stream=False, effect='normal', guild_id=None):
+        started = time.perf_counter()
+        try:
+            data = await resolve_track(url, loop=loop, guild_id=guild_id)
+            player = cls.from_data(data, effect=effect, guild_id=guild_id)
+            source_load_seconds.observe(time.perf_counter() - started, 'ok')
+            return player
+        except ExtractionCancelled:
+            # !stop/!leave: yeniden denenmesin, çağıran iptali görsün
+            source_load_seconds.observe(time.perf_counter() - started, 'cancelled')
+            raise
+        except Exception as e:
+            source_load_seconds.observe(time.perf_counter() - started, 'error')
+            logger.error(f"YTDL Hatası: {e}")
+            raise Exception(f"Şarkı yüklenemedi: {str(e)[:100]}")
+
+# Doğrudan video bağlantıları ve çıplak video id'leri (arama yapmadan çözümlenir)
+YOUTUBE_URL_RE = re.compile(
+    r'^(?:https?://)?(?:(?:www|m|music)\.)?'
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)'
+    r'([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])'
+)
+VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+def direct_video_url(query):
+    """Sorgu doğrudan bir video ise aramasız çözümlenecek URL'yi döndür, değilse None"""
+    query = query.strip()
+    match = YOUTUBE_URL_RE.match(query)
+    if match:
+        return f"https://www.youtube.com/watch?v={match.group(1)}"
+    if query.startswith(('http://', 'https://')):
+        # YouTube dışı bağlantılar (SoundCloud vb.) yt-dlp'ye olduğu gibi verilir
+        return query
+    # 11 karakterlik tek kelimeli aramalarla karışmasın: id'lerde kelime ortasında büyük harf
+    # ya da büyük harfle birlikte rakam/-/_ olur. Yanlış tahmin edilirse aramaya düşülür.
+    if VIDEO_ID_RE.match(query) and (re.search(r'[A-Z]', query[1:])
+                                     or (re.search(r'[0-9_-]', query) and re.search(r'[A-Z]', query))):
+        return f"https://www.youtube.com/watch?v={query}"
+    return None
+
+# YouTube playlist ve mix bağlantıları (list= parametresi taşıyanlar)
+YOUTUBE_PLAYLIST_RE = re.compile(
+    r'^(?:https?://)?(?:(?:www|m|music)\.)?'
+    r'(?:youtube\.com/(?:playlist|watch)|youtu\.be/[A-Za-z0-9_-]{11})\?(?:.*&)?list=([A-Za-z0-9_-]+)'
+)
+PLAYLIST_UNAVAILABLE_TITLES = frozenset({'[Private video]', '[Deleted video]'})
+
+def playlist_url(query):
+    """Sorgu bir YouTube playlist'i ya da mix'i ise düz okunacak URL'yi döndür, değilse None"""
+    query = query.strip()
+    match = YOUTUBE_PLAYLIST_RE.match(query)
+    if not match:
+        return None
+    video = YOUTUBE_URL_RE.match(query)
+    if video:
+        # Mix'ler (RD...) başlangıç videosu olmadan açılamaz
+        return f"https://www.youtube.com/watch?v={video.group(1)}&list={match.group(1)}"
+    return f"https://www.youtube.com/playlist?list={match.group(1)}"
+
+def playlist_track(entry):
+    """Düz playlist girdisinden sıra girdisi; çalınmasına yaklaşınca ön çözümleyici tam çözümler"""
+    if not entry or not entry.get('id') or entry.get('title') in PLAYLIST_UNAVAILABLE_TITLES:
+        return None
+    url = f"https://www.youtube.com/watch?v={entry['id']}"
+    duration = entry.get('duration')
+    return Track(url, id=entry['id'], title=entry.get('title'),
+                 duration=int(duration) if duration else None, webpage_url=url)
+
+async def resolve_track(url, *, loop=None, guild_id=None):
+    """Arama terimini veya bağlantıyı yt-dlp ile çözümle (stream URL, başlık, süre)"""
+    direct = direct_video_url(url)
+    # Aynı videonun farklı bağlantı biçimleri kanonik URL altında tek kayıttır
+    cached = resolve_cache.get(direct or url)
+    if cached is not None:
+        return cached
+
+    loop = loop or asyncio.get_event_loop()
+    data = None
+    if direct:
+        # Bağlantı/id için arama yerine doğrudan video sayfasını çözümle
+        data = await extractor_pool.extract(direct, guild_id=guild_id, loop=loop)
+        if data and 'entries' in data:
+            data = data['entries'][0] if data['entries'] else None
+        # Yalnızca id'ye benzeyen aramalar başarısız olursa normal aramaya düş
+        if not data and not VIDEO_ID_RE.match(url.strip()):
+            raise Exception("Video bulunamadı")
+
+    if not data:
         # Basit arama terimi olarak işle
-        search_query = f"ytsearch:{url}"  # 8 boşluk girinti
-        data = await loop.run_in_executor(None, lambda: ytdl.extract_info(search_query, download=False))
-        
-        if 'entries' in data and len(data['entries']) > 0:
+        search_query = f"ytsearch:{url}"
+        data = await extractor_pool.extract(search_query, guild_id=guild_id, loop=loop)
+
+        if data and 'entries' in data and len(data['entries']) > 0:
             data = data['entries'][0]
         else:
             raise Exception("Video bulunamadı")
-        
-        if not data.get('url'):
-            raise Exception("Video URL'si alınamadı")
-        
-        ffmpeg_options = {
-            'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
-            'options': '-vn'
-        }
-        
-        return cls(discord.FFmpegPCMAudio(data['url'], **ffmpeg_options), data=data)
-        
-    except Exception as e:
-        logger.error(f"YTDL Hatası: {e}")
-        raise Exception(f"Şarkı yüklenemedi: {str(e)[:100]}")
+
+    if not data or not data.get('url'):
+        raise Exception("Video URL'si alınamadı")
+    resolve_cache.put(url, data)
+    return data
+
+async def resolve_entry(track, *, loop=None, guild_id=None):
+    """Sıradaki şarkıyı çözümle ve bilgilerini şarkıya işle"""
+    await spotify_matcher.match(track, guild_id=guild_id)
+    data = await resolve_track(track.source, loop=loop, guild_id=guild_id)
+    track.update(data)
+    return data
+
+class PlaybackState:
+    """Guild'in çalma durum makinesi: boşta -> çözümleniyor -> çalıyor"""
+    IDLE = 'idle'
+    RESOLVING = 'resolving'
+    PLAYING = 'playing'
+
+    def __init__(self):
+        self.state = self.IDLE
+        self.lock = asyncio.Lock()
+        self.dead_tracks = OrderedDict()  # çalınamayan şarkı anahtarı -> kara listeye alındığı zaman (sınırlı)
+        self.refresh_task = None  # çalan şarkının URL yenileme görevi
+        self.ended_at = None  # önceki şarkının bittiği an, şarkı arası süre metriği için
+
+    def watch_stream(self, player):
+        """Çalan şarkının stream URL'sini süresi dolmadan arka planda yenile"""
+        self.cancel_watch()
+        if player.expires_at is not None:
+            self.refresh_task = asyncio.get_event_loop().create_task(self._refresh_before_expiry(player))
+
+    def cancel_watch(self):
+        if self.refresh_task is not None:
+            self.refresh_task.cancel()
+            self.refresh_task = None
+
+    @staticmethod
+    async def _refresh_before_expiry(player):
+        while not player.closed and player.expires_at is not None:
+            await asyncio.sleep(max(player.expires_at - STREAM_REFRESH_MARGIN - time.time(), 0))
+            if player.closed:
+                return
+            try:
+                # Çalan süreç mevcut bağlantıyla devam eder; yeni URL sonraki
+                # yeniden başlatmalarda (efekt, ses, kopma, devam) kullanılır
+                if not await player.refresh_url():
+                    return
+            except Exception as e:
+                logger.warning(f"Stream URL'si arka planda yenilenemedi ({player.title}): {e}")
+                return
+
+    def mark_dead(self, track):
+        """Şarkıyı bu guild'de DEAD_TRACK_TTL boyunca denenmeyecek şekilde kara listeye al"""
+        key = track_key(track)
+        self.dead_tracks.pop(key, None)
+        self.dead_tracks[key] = time.time()
+        while len(self.dead_tracks) > DEAD_TRACKS_PER_GUILD:
+            self.dead_tracks.popitem(last=False)
+
+    def is_dead(self, track):
+        """Şarkı kara listede mi; süresi dolan kayıt silinir ve şarkı yeniden denenir"""
+        key = track_key(track)
+        marked_at = self.dead_tracks.get(key)
+        if marked_at is None:
+            return False
+        if time.time() - marked_at > DEAD_TRACK_TTL:
+            del self.dead_tracks[key]
+            return False
+        return True
+
+    def forgive(self, track):
+        """Kullanıcı şarkıyı açıkça yeniden eklediyse kara listeden çıkar"""
+        self.dead_tracks.pop(track_key(track), None)
+        self.dead_tracks.pop(ResolveCache.normalize(track.query), None)
+
+    @staticmethod
+    def drop_from_queue(queue, track):
+        """Sıra tekrarında sona geri eklenen çalınamayan şarkıyı çıkar"""
+        if queue and queue[-1] is track:
+            queue.pop()
+
+class TrackPrefetcher:
+    """Sıradaki N şarkıyı çalan şarkı bitmeden arka planda çözümler"""
+
+    def __init__(self, guild_id, depth=PREFETCH_DEPTH):
+        self.guild_id = guild_id
+        self.depth = depth
+        self.tasks = {}  # Track -> asyncio.Task
+
+    def refresh(self, queue, *, loop=None):
+        """Sıranın ilk N girdisi için çözümleme başlat, artık gerekmeyenleri iptal et"""
+        loop = loop or asyncio.get_event_loop()
+        wanted = list(itertools.islice(queue, self.depth))
+        for entry in list(self.tasks):
+            if entry not in wanted:
+                self.tasks.pop(entry).cancel()
+        for entry in wanted:
+            if entry not in self.tasks:
+                task = loop.create_task(resolve_entry(entry, loop=loop, guild_id=self.guild_id))
+                # Hata take() içinde ele alınır, burada "never retrieved" uyarısını sustur
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                self.tasks[entry] = task
+
+    async def take(self, entry, *, loop=None, effect='normal'):
+        """Girdi için hazır bir YTDLSource döndür, önceden çözümlenmediyse şimdi çözümle"""
+        task = self.tasks.pop(entry, None)
+        if task is not None:
+            try:
+                data = await task
+                return YTDLSource.from_data(data, effect=effect, guild_id=self.guild_id)
+            except asyncio.CancelledError:
+                # cancel() ile iptal edilen ön çözümleme, bekleyen görevin iptali değildir
+                if task.cancelled() and not asyncio.current_task().cancelling():
+                    raise ExtractionCancelled("Ön çözümleme iptal edildi")
+                raise
+            except ExtractionCancelled:
+                raise
+            except Exception as e:
+                logger.warning(f"Ön çözümleme başarısız, yeniden deneniyor: {e}")
+        await spotify_matcher.match(entry, guild_id=self.guild_id)
+        player = await YTDLSource.from_url(entry.source, loop=loop, stream=True, effect=effect,
+                                           guild_id=self.guild_id)
+        entry.update(player.data)
+        return player
+
+    def cancel(self):
+        """Bekleyen tüm ön çözümlemeleri iptal et"""
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
 
 def extract_spotify_id(url):
     """Spotify URL'den playlist/track ID'sini çıkar"""
@@ -205,100 +1770,670 @@ def extract_spotify_id(url):
         return url.split('/')[-1].split('?')[0], 'album'
     return None, None
 
-async def get_spotify_tracks(url):
-    """Spotify playlist/album/track'ten şarkı listesi al"""
+def spotify_search_term(track):
+    """Spotify şarkı nesnesinden YouTube arama terimi oluştur"""
+    artists = track.get('artists') or []
+    artist = artists[0]['name'] if artists else ''
+    return f"{artist} {track['name']}".strip()
+
+def spotify_track_info(track):
+    """Spotify şarkı nesnesinden eşleştirmede kullanılan alanlar (yerel dosyalarda None)"""
+    if not track.get('id'):
+        return None
+    return {
+        'id': track['id'],
+        'name': track['name'],
+        'artists': [artist['name'] for artist in track.get('artists') or ()],
+        'duration': round(track['duration_ms'] / 1000) if track.get('duration_ms') else None,
+        'isrc': (track.get('external_ids') or {}).get('isrc'),
+    }
+
+def spotify_track(track):
+    """Spotify şarkı nesnesinden sıra girdisi"""
+    return Track(spotify_search_term(track), spotify=spotify_track_info(track))
+
+# Spotify -> YouTube eşleştirme ayarları
+SPOTIFY_MATCH_CANDIDATES = 5  # sorgu başına puanlanan arama sonucu
+SPOTIFY_MATCH_CONCURRENCY = int(os.getenv('SPOTIFY_MATCH_CONCURRENCY', '4'))
+SPOTIFY_MATCH_AHEAD = int(os.getenv('SPOTIFY_MATCH_AHEAD', '20'))  # içe aktarmada önden eşleştirilecek şarkı
+SPOTIFY_MATCH_MIN_SCORE = 0.55  # altındaki en iyi aday eşleşme sayılmaz, eski aramaya düşülür
+SPOTIFY_MATCH_STRONG_SCORE = 0.85  # ISRC aramasında bu puana ulaşılırsa metin araması yapılmaz
+SPOTIFY_MATCH_MAX_DURATION_DIFF = 20  # saniye; daha uzak süreler başka bir sürümdür
+SPOTIFY_MATCH_RETRY_AFTER = 7 * 24 * 3600  # eşleşme bulunamayan şarkı bu kadar sonra yeniden aranır
+SPOTIFY_MATCH_MEMORY = 20000  # bellekte tutulan eşleşme
+SPOTIFY_MATCH_LANE = 'spotify-match'  # ortak aramaların çözümleme havuzundaki sırası; hiçbir guild iptal edemez
+# Adayın başlığında olup Spotify adında olmayan bu kelimeler başka bir sürüme işaret eder
+SPOTIFY_MATCH_VARIANT_WORDS = frozenset({
+    'live', 'canli', 'cover', 'karaoke', 'remix', 'sped', 'slowed', 'nightcore', '8d', 'instrumental',
+    'reverb', 'acoustic', 'akustik', 'bassboosted', 'mashup', 'reaction', 'tutorial', 'lesson', 'concert',
+})
+
+def match_tokens(text):
+    """Küçük harfli, aksanları atılmış kelime kümesi"""
+    text = unicodedata.normalize('NFKD', text.lower().replace('ı', 'i'))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return set(re.findall(r'\w+', text))
+
+def score_match(info, candidate, *, isrc_hit=False):
+    """Spotify şarkısı ile YouTube arama sonucu arasındaki 0-1 eşleşme puanı
+
+    Süre farkı SPOTIFY_MATCH_MAX_DURATION_DIFF'i aşan aday elenir. Kalanlar süre
+    yakınlığı, şarkı adı ve sanatçı örtüşmesi, resmi "Sanatçı - Topic" kanalı ve
+    ISRC aramasından gelme ile puanlanır; cover/live gibi sürüm kelimeleri puan düşürür.
+    """
+    title = candidate.get('title') or ''
+    channel = candidate.get('channel') or candidate.get('uploader') or ''
+    duration = candidate.get('duration')
+    if info.get('duration') and duration:
+        difference = abs(info['duration'] - duration)
+        if difference > SPOTIFY_MATCH_MAX_DURATION_DIFF:
+            return 0.0
+        duration_score = 1 - difference / SPOTIFY_MATCH_MAX_DURATION_DIFF
+    else:
+        duration_score = 0.5
+
+    title_tokens = match_tokens(title)
+    channel_tokens = match_tokens(channel)
+    full_name_tokens = match_tokens(info['name'])
+    # "Şarkı - Remastered 2011", "Şarkı (feat. X)" gibi ekler ad eşleşmesinde aranmaz
+    name_tokens = match_tokens(re.split(r' - |\(|\[', info['name'])[0]) or full_name_tokens
+    name_score = len(name_tokens & title_tokens) / len(name_tokens) if name_tokens else 0.0
+
+    artist_score = 0.0
+    for artist in info.get('artists') or ():
+        artist_tokens = match_tokens(artist)
+        if artist_tokens and (artist_tokens <= title_tokens or artist_tokens <= channel_tokens):
+            artist_score = 1.0
+            break
+    topic_score = 1.0 if artist_score and channel.endswith(' - Topic') else 0.0
+    variants = (title_tokens - full_name_tokens) & SPOTIFY_MATCH_VARIANT_WORDS
+
+    score = 0.35 * duration_score + 0.35 * name_score + 0.2 * artist_score + 0.1 * topic_score
+    if isrc_hit:
+        score += 0.15
+    score -= 0.3 * len(variants)
+    return max(0.0, min(1.0, score))
+
+class SpotifyMatcher:
+    """Spotify şarkı id'lerini YouTube video id'lerine eşleştirir, eşleşmeleri SQLite'ta saklar
+
+    Kayıtlı eşleşmesi olan şarkı hiçbir guild'de bir daha aranmaz. Aramalar
+    çözümleme havuzunda düz sonuçlarla yapılır ve score_match ile puanlanır; aynı
+    şarkı için aynı anda tek arama yapılır, eşzamanlı arama sayısı sınırlıdır.
+    Ortak arama hiçbir guild'e bağlı değildir; bir guild'in !stop/!leave'i
+    yalnızca o guild'in bekleyenlerini durdurur.
+    """
+
+    def __init__(self, path, *, concurrency=SPOTIFY_MATCH_CONCURRENCY):
+        self.path = path  # None: yalnızca bellekte tut
+        self.conn = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='spotify-match')
+        self.memory = OrderedDict()  # spotify_id -> (video_id veya None, eşleştirme zamanı)
+        self.inflight = {}  # spotify_id -> arama görevi
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.counters = Counter()
+
+    def _connect(self):
+        if self.conn is None:
+            # Yalnızca eşleştiricinin tek işçi thread'inden kullanılır
+            self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS spotify_matches ('
+                'spotify_id TEXT PRIMARY KEY, video_id TEXT, score REAL NOT NULL, matched_at REAL NOT NULL)'
+            )
+        return self.conn
+
+    def _load(self, spotify_ids):
+        conn = self._connect()
+        rows = []
+        for i in range(0, len(spotify_ids), 500):  # SQLite parametre sınırı
+            chunk = spotify_ids[i:i + 500]
+            rows.extend(conn.execute(
+                f'SELECT spotify_id, video_id, matched_at FROM spotify_matches '
+                f'WHERE spotify_id IN ({",".join("?" * len(chunk))})', chunk).fetchall())
+        return rows
+
+    def _store(self, rows):
+        try:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    'INSERT INTO spotify_matches (spotify_id, video_id, score, matched_at) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT(spotify_id) DO UPDATE SET video_id = excluded.video_id, '
+                    'score = excluded.score, matched_at = excluded.matched_at',
+                    rows,
+                )
+        except Exception as e:
+            logger.error(f"Spotify eşleşmeleri kaydedilemedi: {e}")
+
+    def _remember(self, spotify_id, video_id, matched_at):
+        self.memory[spotify_id] = (video_id, matched_at)
+        self.memory.move_to_end(spotify_id)
+        while len(self.memory) > SPOTIFY_MATCH_MEMORY:
+            self.memory.popitem(last=False)
+
+    def _known(self, spotify_id):
+        """(bilinen mi, video id) — süresi geçmiş 'bulunamadı' kaydı bilinmiyor sayılır"""
+        entry = self.memory.get(spotify_id)
+        if entry is None:
+            return False, None
+        video_id, matched_at = entry
+        if video_id is None and time.time() - matched_at > SPOTIFY_MATCH_RETRY_AFTER:
+            return False, None
+        return True, video_id
+
+    @staticmethod
+    def _link(track, video_id):
+        track.id = video_id
+        track.webpage_url = f'https://www.youtube.com/watch?v={video_id}'
+
+    async def apply(self, tracks):
+        """Kayıtlı eşleşmeleri şarkılara toplu uygula, eşleşmesi bilinmeyenleri döndür"""
+        pending = [track for track in tracks if track.spotify and not track.webpage_url]
+        missing = list({track.spotify['id'] for track in pending if track.spotify['id'] not in self.memory})
+        if missing and self.path:
+            try:
+                rows = await asyncio.get_running_loop().run_in_executor(self.executor, self._load, missing)
+            except Exception as e:
+                logger.error(f"Spotify eşleşmeleri okunamadı: {e}")
+                rows = ()
+            for spotify_id, video_id, matched_at in rows:
+                self._remember(spotify_id, video_id, matched_at)
+
+        unknown = []
+        for track in pending:
+            known, video_id = self._known(track.spotify['id'])
+            if video_id:
+                self._link(track, video_id)
+                self.counters['stored'] += 1
+            elif not known:
+                unknown.append(track)
+        return unknown
+
+    async def match(self, track, *, guild_id=None):
+        """Şarkıyı gerekirse arayarak eşleştir; bulunan video id'sini döndür"""
+        if not track.spotify or track.webpage_url:
+            return track.id
+        if not await self.apply([track]):
+            return track.id  # kayıtlı eşleşme uygulandı ya da daha önce bulunamadı
+
+        spotify_id = track.spotify['id']
+        epoch = extractor_pool.epochs[guild_id]
+        while True:
+            task = self.inflight.get(spotify_id)
+            if task is None:
+                task = self.inflight[spotify_id] = asyncio.ensure_future(self._search(track.spotify))
+                task.add_done_callback(lambda t: self.inflight.get(spotify_id) is t and self.inflight.pop(spotify_id))
+            try:
+                # Bekleyen iptal edilse de arama başka guild'ler için sürsün
+                video_id = await asyncio.shield(task)
+            except ExtractionCancelled:
+                if extractor_pool.epochs[guild_id] != epoch:
+                    raise
+                # Ortak arama başka bir yerden iptal edildi; bu guild için yeniden ara
+                continue
+            except Exception as e:
+                logger.warning(f"Spotify eşleştirmesi başarısız ({track.query}): {e}")
+                return None
+            break
+        # Yalnızca bu guild'in !stop/!leave'i bekleyeni durdurur
+        if extractor_pool.epochs[guild_id] != epoch:
+            raise ExtractionCancelled("Çözümleme iptal edildi")
+        if video_id and not track.webpage_url:
+            self._link(track, video_id)
+        return video_id
+
+    async def _search(self, info):
+        async with self.semaphore:
+            queries = []
+            if info.get('isrc'):
+                queries.append((f'ytsearch{SPOTIFY_MATCH_CANDIDATES}:"{info["isrc"]}"', True))
+            term = ' '.join(filter(None, [(info.get('artists') or [''])[0], info['name']]))
+            queries.append((f'ytsearch{SPOTIFY_MATCH_CANDIDATES}:{term}', False))
+
+            best_id, best_score = None, 0.0
+            for query, isrc_hit in queries:
+                self.counters['searches'] += 1
+                result = await extractor_pool.extract(query, guild_id=SPOTIFY_MATCH_LANE, process=False)
+                for candidate in (result or {}).get('entries') or ():
+                    if not candidate or not candidate.get('id'):
+                        continue
+                    score = score_match(info, candidate, isrc_hit=isrc_hit)
+                    if score > best_score:
+                        best_id, best_score = candidate['id'], score
+                if best_score >= SPOTIFY_MATCH_STRONG_SCORE:
+                    break
+
+        if best_score < SPOTIFY_MATCH_MIN_SCORE:
+            best_id = None
+        self.counters['matched' if best_id else 'unmatched'] += 1
+        matched_at = time.time()
+        self._remember(info['id'], best_id, matched_at)
+        if self.path:
+            self.executor.submit(self._store, [(info['id'], best_id, best_score, matched_at)])
+        return best_id
+
+    def prematch(self, tracks, *, guild_id=None, loop=None):
+        """Eşleşmemiş şarkıları arka planda eşleştirmeye başla"""
+        loop = loop or asyncio.get_event_loop()
+        for track in tracks:
+            if track.spotify and not track.webpage_url:
+                task = loop.create_task(self.match(track, guild_id=guild_id))
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    def stats(self):
+        return dict(self.counters, memory=len(self.memory))
+
+    def close(self):
+        """Bekleyen kayıtları diske yaz"""
+        self.executor.shutdown(wait=True)
+
+spotify_matcher = SpotifyMatcher(STATE_DB_PATH if STATE_BACKEND == 'sqlite' else None)
+
+# Spotify liste önbelleği ayarları
+SPOTIFY_LISTING_MEMORY = 16  # bellekte tutulan liste sayısı
+SPOTIFY_LISTING_TTL = 30 * 24 * 3600  # bu kadar süre kullanılmayan liste silinir; albümler bu süre boyunca geçerli
+
+class SpotifyListingCache:
+    """Playlist ve albüm şarkı listelerini SQLite'ta saklar
+
+    Playlist'ler snapshot_id ile doğrulanır: değişmemiş bir playlist için tek bir
+    küçük metadata isteği yapılır, sayfalar yeniden çekilmez. Albümler değişmediği
+    için SPOTIFY_LISTING_TTL boyunca doğrudan önbellekten verilir.
+    """
+
+    def __init__(self, path):
+        self.path = path  # None: yalnızca bellekte tut
+        self.conn = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='spotify-listing')
+        self.memory = OrderedDict()  # (tür, id) -> (snapshot_id, [(sorgu, bilgi)], bayt, kaydedilme zamanı)
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.bytes_saved = 0
+
+    def _connect(self):
+        if self.conn is None:
+            # Yalnızca önbelleğin tek işçi thread'inden kullanılır
+            self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS spotify_listings ('
+                'key TEXT PRIMARY KEY, snapshot_id TEXT, data TEXT NOT NULL, bytes INTEGER NOT NULL, '
+                'fetched_at REAL NOT NULL, used_at REAL NOT NULL)'
+            )
+        return self.conn
+
+    def _load(self, key):
+        conn = self._connect()
+        row = conn.execute('SELECT snapshot_id, data, bytes, fetched_at FROM spotify_listings WHERE key = ?',
+                           (key,)).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute('UPDATE spotify_listings SET used_at = ? WHERE key = ?', (time.time(), key))
+        snapshot_id, data, size, fetched_at = row
+        return snapshot_id, [tuple(item) for item in json.loads(data)], size, fetched_at
+
+    def _save(self, key, snapshot_id, tracks, size, fetched_at):
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    'INSERT INTO spotify_listings (key, snapshot_id, data, bytes, fetched_at, used_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET snapshot_id = excluded.snapshot_id, '
+                    'data = excluded.data, bytes = excluded.bytes, fetched_at = excluded.fetched_at, '
+                    'used_at = excluded.used_at',
+                    (key, snapshot_id, json.dumps(tracks, separators=(',', ':')), size, fetched_at, fetched_at),
+                )
+                conn.execute('DELETE FROM spotify_listings WHERE used_at < ?', (time.time() - SPOTIFY_LISTING_TTL,))
+        except Exception as e:
+            logger.error(f"Spotify listesi kaydedilemedi: {e}")
+
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > SPOTIFY_LISTING_MEMORY:
+            self.memory.popitem(last=False)
+
+    async def get(self, content_type, spotify_id, snapshot_id=None, *, revalidation_bytes=0):
+        """Geçerli kayıtlı listeyi [(sorgu, bilgi)] olarak döndür, yoksa None
+
+        Playlist'ler için snapshot_id eşleşmelidir; albümler (snapshot_id None) için
+        kaydın SPOTIFY_LISTING_TTL'den yeni olması yeterlidir.
+        """
+        key = f'{content_type}:{spotify_id}'
+        entry = self.memory.get(key)
+        if entry is None and self.path:
+            try:
+                entry = await asyncio.get_running_loop().run_in_executor(self.executor, self._load, key)
+            except Exception as e:
+                logger.error(f"Spotify listesi okunamadı: {e}")
+                entry = None
+            if entry is not None:
+                self._remember(key, entry)
+        if snapshot_id is not None:
+            self.revalidations += 1
+
+        if entry is not None:
+            cached_snapshot, tracks, size, fetched_at = entry
+            if snapshot_id is not None:
+                valid = cached_snapshot == snapshot_id
+            else:
+                valid = time.time() - fetched_at < SPOTIFY_LISTING_TTL
+            if valid:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                self.bytes_saved += max(0, size - revalidation_bytes)
+                return tracks
+        self.misses += 1
+        return None
+
+    def put(self, content_type, spotify_id, snapshot_id, tracks, size):
+        """Eksiksiz çekilen listeyi kaydet (yazma arka planda)"""
+        key = f'{content_type}:{spotify_id}'
+        entry = (snapshot_id, tracks, size, time.time())
+        self._remember(key, entry)
+        if self.path:
+            self.executor.submit(self._save, key, *entry)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidations': self.revalidations,
+            'bytes_saved': self.bytes_saved,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        """Bekleyen kayıtları diske yaz"""
+        self.executor.shutdown(wait=True)
+
+spotify_listings = SpotifyListingCache(STATE_DB_PATH if STATE_BACKEND == 'sqlite' else None)
+
+async def get_spotify_tracks(url, *, loop=None):
+    """Spotify playlist/album/track'ten şarkıları sayfa sayfa, sırasıyla üret
+
+    İlk sayfa gelir gelmez üretilir; kalan sayfalar event loop'u bloklamadan
+    paralel çekilir. Böylece büyük listelerde çalma ilk sayfadan sonra başlar.
+    """
     if not spotify:
-        return []
-    
-    try:
-        spotify_id, content_type = extract_spotify_id(url)
-        if not spotify_id:
-            return []
-        
-        tracks = []
-        
-        if content_type == 'playlist':
-            results = spotify.playlist_tracks(spotify_id)
-            for item in results['items']:
-                if item['track']:
-                    track = item['track']
-                    artist = track['artists'][0]['name']
-                    name = track['name']
-                    search_term = f"{artist} {name}"
-                    tracks.append(search_term)
-                    
-        elif content_type == 'album':
-            results = spotify.album_tracks(spotify_id)
-            album = spotify.album(spotify_id)
-            artist = album['artists'][0]['name']
-            for track in results['items']:
-                search_term = f"{artist} {track['name']}"
-                tracks.append(search_term)
-                
-        elif content_type == 'track':
-            track = spotify.track(spotify_id)
-            artist = track['artists'][0]['name']
-            name = track['name']
-            search_term = f"{artist} {name}"
-            tracks.append(search_term)
-            
+        return
+
+    loop = loop or asyncio.get_event_loop()
+    spotify_id, content_type = extract_spotify_id(url)
+    if not spotify_id:
+        return
+
+    def call(func, *args, **kwargs):
+        # spotipy senkron HTTP yapar, event loop dışında çalıştır
+        return loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    async def matched(tracks):
+        # Daha önce eşleşmiş şarkılar aramasız YouTube videosuna bağlanır
+        await spotify_matcher.apply(tracks)
+        return tracks
+
+    async def timed(fetch, **kwargs):
+        started = time.perf_counter()
+        result = await fetch(**kwargs)
+        spotify_page_seconds.observe(time.perf_counter() - started, content_type)
+        return result
+
+    if content_type == 'track':
+        try:
+            track = await timed(functools.partial(call, spotify.track, spotify_id))
+        except Exception as e:
+            logger.error(f"Spotify error: {e}")
+            return
+        yield await matched([spotify_track(track)])
+        return
+
+    snapshot_id = None
+    revalidation_bytes = 0
+    if content_type == 'playlist':
+        page_size = SPOTIFY_PLAYLIST_PAGE_SIZE
+        fetch = functools.partial(call, spotify.playlist_items, spotify_id,
+                                  fields=SPOTIFY_PLAYLIST_FIELDS, limit=page_size,
+                                  additional_types=('track',))
+        parse = lambda page: [spotify_track(item['track']) for item in page['items'] if item.get('track')]
+        # Değişmemiş playlist'i tek küçük istekle doğrula
+        try:
+            meta = await timed(functools.partial(call, spotify.playlist, spotify_id, fields='snapshot_id'))
+        except Exception as e:
+            logger.error(f"Spotify error: {e}")
+            return
+        snapshot_id = meta.get('snapshot_id')
+        revalidation_bytes = len(json.dumps(meta))
+    elif content_type == 'album':
+        page_size = SPOTIFY_ALBUM_PAGE_SIZE
+        fetch = functools.partial(call, spotify.album_tracks, spotify_id, limit=page_size)
+        parse = lambda page: [spotify_track(track) for track in page['items']]
+    else:
+        return
+
+    if content_type == 'album' or snapshot_id:
+        cached = await spotify_listings.get(content_type, spotify_id, snapshot_id,
+                                            revalidation_bytes=revalidation_bytes)
+        if cached is not None:
+            for start in range(0, len(cached), page_size):
+                yield await matched([Track(query, spotify=info) for query, info in cached[start:start + page_size]])
+            return
+
+    # Eksiksiz çekilirse önbelleğe yazılacak liste ve cevap boyutu
+    listing = []
+    listing_bytes = 0
+    complete = True
+
+    def collect(page):
+        nonlocal listing_bytes
+        tracks = parse(page)
+        listing.extend((track.query, track.spotify) for track in tracks)
+        listing_bytes += len(json.dumps(page))
         return tracks
+
+    try:
+        first_page = await timed(fetch, offset=0)
     except Exception as e:
         logger.error(f"Spotify error: {e}")
-        return []
-
-async def play_next(ctx):
-    """Sıradaki şarkıyı çal (tekrar modunu destekler)"""
-    guild_id = ctx.guild.id
-    queue = get_queue(guild_id)
-    history = get_history(guild_id)
-    repeat_mode = get_repeat_mode(guild_id)
-    effect = get_sound_effect(guild_id)
-    
-    if not ctx.voice_client:
         return
-    
-    # Tekrar modlarını kontrol et
-    if repeat_mode == 1 and guild_id in current_songs:
-        # Şarkı tekrarı - aynı şarkıyı tekrar çal
-        current_song_data = current_songs[guild_id]
+    yield await matched(collect(first_page))
+
+    semaphore = asyncio.Semaphore(SPOTIFY_PAGE_CONCURRENCY)
+
+    async def fetch_page(offset):
+        async with semaphore:
+            return await timed(fetch, offset=offset)
+
+    tasks = [loop.create_task(fetch_page(offset))
+             for offset in range(page_size, first_page.get('total') or 0, page_size)]
+    try:
+        for task in tasks:
+            try:
+                page = await task
+            except Exception as e:
+                # Eksik bir sayfa listenin geri kalanını engellemesin
+                logger.error(f"Spotify sayfa hatası: {e}")
+                complete = False
+                continue
+            yield await matched(collect(page))
+        if complete and (content_type == 'album' or snapshot_id):
+            spotify_listings.put(content_type, spotify_id, snapshot_id, listing, listing_bytes)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def track_key(track):
+    """Kara liste için şarkı anahtarı"""
+    return f"id:{track.id}" if track.id else ResolveCache.normalize(track.query)
+
+async def resolve_player(track, *, guild_id, effect, prefetcher):
+    """Şarkıyı sınırlı sayıda, üstel bekleme ile deneyerek çalınabilir kaynağa çevir"""
+    for attempt in range(RESOLVE_MAX_RETRIES):
+        playback_metrics['resolve_attempts'] += 1
         try:
-            player = await YTDLSource.from_url(current_song_data.webpage_url or current_song_data.data.get('webpage_url', ''), 
-                                             loop=bot.loop, stream=True, effect=effect)
-            current_songs[guild_id] = player
-            ctx.voice_client.play(player, after=lambda e: asyncio.run_coroutine_threadsafe(play_next(ctx), bot.loop))
-            await ctx.send(f'🔂 Tekrarlanıyor: **{player.title}**')
+            if attempt == 0:
+                # İlk deneme ön çözümlemeyi kullanır (hazırsa bekleme yok)
+                return await prefetcher.take(track, loop=bot.loop, effect=effect)
+            await spotify_matcher.match(track, guild_id=guild_id)
+            player = await YTDLSource.from_url(track.source, loop=bot.loop, stream=True, effect=effect,
+                                               guild_id=guild_id)
+            track.update(player.data)
+            return player
+        except ExtractionCancelled:
+            raise
         except Exception as e:
-            logger.error(f'Tekrarlama hatası: {e}')
-            await ctx.send(f'❌ Tekrarlama hatası: {e}')
+            if attempt + 1 >= RESOLVE_MAX_RETRIES:
+                raise
+            delay = RESOLVE_RETRY_BASE_DELAY * (2 ** attempt)
+            playback_metrics['resolve_retries'] += 1
+            logger.warning(f"Çözümleme denemesi {attempt + 1} başarısız ({e}), {delay:.0f} sn sonra tekrar denenecek")
+            await asyncio.sleep(delay)
+
+async def play_next(ctx, *, ended_at=None):
+    """Sıradaki şarkıyı çal (tekrar modunu destekler)"""
+    state = find_guild_state(ctx.guild.id)
+    if state is None:
+        # Guild temizlendi (!leave, boşta ayrılma); disconnect'in after callback'i durumu yeniden oluşturmasın
         return
+    playback = state.playback
+    if ended_at is not None:
+        playback.ended_at = ended_at
+    # after callback'i ile komutlar aynı anda ilerletmesin
+    async with playback.lock:
+        try:
+            await advance_playback(ctx, state)
+        finally:
+            # Hata ya da iptalde durum "çözümleniyor"da kalmasın
+            if playback.state == PlaybackState.RESOLVING:
+                playback.state = PlaybackState.IDLE
+        # Sıra bittiyse sonraki !p'ye kadar geçen süre şarkı arası sayılmasın
+        playback.ended_at = None
+
+def start_playback(ctx, playback, player):
+    """Kaynağı ses bağlantısında başlat: bitince play_next, URL yenileme gözcüsü, şarkı arası metriği
+
+    Çalma yalnızca buradan başlar; böylece her şarkı stream URL'si dolmadan
+    arka planda yenilenir. voice_client.play hatası (ClientException) çağırana geçer.
+    """
+    ctx.voice_client.play(player, after=lambda e: asyncio.run_coroutine_threadsafe(
+        play_next(ctx, ended_at=time.perf_counter()), bot.loop))
+    if playback.ended_at is not None:
+        track_gap_seconds.observe(time.perf_counter() - playback.ended_at)
+        playback.ended_at = None
+    playback.state = PlaybackState.PLAYING
+    playback.watch_stream(player)
+
+def playback_idle(ctx):
+    """Hiçbir şey çalmıyor, çözümlenmiyor ve sıra boş mu (eklenen şarkı hemen çalınacak mı)"""
+    state = find_guild_state(ctx.guild.id)
+    if state is not None and (state.queue or (state._playback is not None
+                                              and state._playback.state != PlaybackState.IDLE)):
+        return False
+    return not (ctx.voice_client.is_playing() or ctx.voice_client.is_paused())
+
+async def ensure_playing(ctx):
+    """Sırada şarkı varken hiçbir şey çalmıyorsa (ör. yeniden başlatma sonrası) çalmayı başlat"""
+    if ctx.voice_client and not ctx.voice_client.is_playing() and not ctx.voice_client.is_paused():
+        await play_next(ctx)
+
+async def advance_playback(ctx, state):
+    """Çalınabilir bir şarkı bulunana ya da sıra bitene kadar sırayı döngüyle ilerlet"""
+    guild_id = ctx.guild.id
+    playback = state.playback
+    queue = state.queue
+    history = state.history
+    prefetcher = state.prefetcher
+    failures = 0
     
-    # Sırada şarkı var mı kontrol et
-    if queue:
-        next_song = queue.popleft()
+    while ctx.voice_client and not ctx.voice_client.is_playing() and not ctx.voice_client.is_paused():
+        repeat_mode = state.repeat_mode
+        effect = state.effect
+        repeating = False
         
-        # Sıra tekrarı aktifse şarkıyı sıranın sonuna ekle
-        if repeat_mode == 2:
-            queue.append(next_song)
+        # Tekrar modlarını kontrol et
+        if repeat_mode == 1 and state.current is not None:
+            # Şarkı tekrarı - aynı şarkıyı tekrar çal
+            current_song_data = state.current
+            next_song = Track.from_data(current_song_data.webpage_url or '', current_song_data.data)
+            repeating = True
+        # Sırada şarkı var mı kontrol et
+        elif queue:
+            next_song = queue.popleft()
             
-    elif repeat_mode == 2 and history:
-        # Sıra boş ama sıra tekrarı aktif - geçmişten yeniden başla
-        next_song = list(history)[0]
-        # Geçmişten sıraya şarkıları ekle (ilk şarkı hariç)
-        for song in list(history)[1:]:
-            queue.append(song)
-        queue.append(next_song)  # İlk şarkıyı da sıranın sonuna ekle
-    else:
-        return  # Çalacak şarkı yok
-    
-    try:
-        player = await YTDLSource.from_url(next_song, loop=bot.loop, stream=True, effect=effect)
-        current_songs[guild_id] = player
+            # Sıra tekrarı aktifse şarkıyı sıranın sonuna ekle
+            if repeat_mode == 2:
+                queue.append(next_song)
+                
+        elif repeat_mode == 2 and history:
+            # Sıra boş ama sıra tekrarı aktif - geçmişten yeniden başla (çalınamayanlar hariç)
+            songs = [song for song in history if not playback.is_dead(song)]
+            if not songs:
+                break
+            next_song = songs[0]
+            # Geçmişten sıraya şarkıları ekle (ilk şarkı hariç)
+            queue.extend(songs[1:])
+            queue.append(next_song)  # İlk şarkıyı da sıranın sonuna ekle
+        else:
+            break  # Çalacak şarkı yok
         
-        # Geçmişe ekle
-        history.append(next_song)
+        if playback.is_dead(next_song):
+            # Yakın zamanda çalınamadı, tekrar denemeden atla
+            playback_metrics['dead_tracks_skipped'] += 1
+            playback.drop_from_queue(queue, next_song)
+            await ctx.send(f'❌ Kısa süre önce çalınamadı, atlanıyor: **{next_song.display_name}**')
+            continue
         
-        ctx.voice_client.play(player, after=lambda e: asyncio.run_coroutine_threadsafe(play_next(ctx), bot.loop))
+        playback.state = PlaybackState.RESOLVING
+        try:
+            player = await resolve_player(next_song, guild_id=guild_id, effect=effect, prefetcher=prefetcher)
+        except ExtractionCancelled:
+            break
+        except Exception as e:
+            failures += 1
+            playback_metrics['resolve_failures'] += 1
+            playback.mark_dead(next_song)
+            playback.drop_from_queue(queue, next_song)
+            if repeating:
+                # Tekrarlanan şarkı artık çalınamıyor, sıradan devam et
+                state.current = None
+            logger.error(f'Play next hatası ({next_song.display_name}): {e}')
+            await ctx.send(f'❌ Çalınamadı, atlanıyor: **{next_song.display_name}**')
+            if failures >= MAX_CONSECUTIVE_FAILURES:
+                await ctx.send('⚠️ Arka arkaya çok fazla şarkı çalınamadı, çalma durduruldu.')
+                break
+            continue
+        
+        if not ctx.voice_client:
+            player.cleanup()
+            break
+        
+        try:
+            start_playback(ctx, playback, player)
+        except discord.ClientException as e:
+            # Bağlantı koptu ya da başka bir kaynak çalıyor: FFmpeg'i kapat, şarkıyı sıraya geri koy
+            player.cleanup()
+            if not repeating:
+                playback.drop_from_queue(queue, next_song)
+                queue.appendleft(next_song)
+            logger.warning(f"{ctx.guild.name} - Çalma başlatılamadı ({next_song.display_name}): {e}")
+            break
+        
+        state.current = player
+        if not repeating:
+            # Geçmişe ekle
+            history.append(next_song)
+        state_store.mark_dirty(guild_id)
+        
+        # Bu şarkı çalarken sıradakileri hazırla
+        prefetcher.refresh(queue, loop=bot.loop)
+        
+        if repeating:
+            await ctx.send(f'🔂 Tekrarlanıyor: **{player.title}**')
+            return
         
         # Tekrar modu gösterimi
         repeat_emoji = ""
@@ -312,11 +2447,319 @@ async def play_next(ctx):
             effect_emoji = f"🎛️[{effect}] "
             
         await ctx.send(f'🎵 {repeat_emoji}{effect_emoji}Şu an çalıyor: **{player.title}**')
-        
-    except Exception as e:
-        logger.error(f'Play next hatası: {e}')
-        await ctx.send(f'❌ Hata oluştu: {e}')
-        await play_next(ctx)
+        return
+    
+    playback.state = PlaybackState.IDLE
+
+class StateBackend:
+    """Guild durumunu saklayan arka uç; hiçbir şey saklamaz (STATE_BACKEND=none)
+
+    Metotlar senkrondur ve StateStore'un tek thread'lik havuzunda çağrılır.
+    """
+    persistent = False  # kayıtlı durum yeniden yüklenebilir mi (boşta guild'ler atılırken bakılır)
+
+    def load(self, guild_id):
+        """Guild'in kayıtlı durumunu döndür, yoksa None"""
+        return None
+
+    def save_many(self, states):
+        """{guild_id: durum veya None (sil)} yaz"""
+
+    def close(self):
+        pass
+
+class SQLiteStateBackend(StateBackend):
+    """Guild durumlarını tek bir SQLite dosyasında JSON olarak saklar"""
+    persistent = True
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+
+    def _connect(self):
+        if self.conn is None:
+            # Yalnızca StateStore'un tek işçi thread'inden kullanılır
+            # Shard işçileri aynı dosyayı paylaşabilir, kilit için bekle
+            self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS guild_state ('
+                'guild_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)'
+            )
+        return self.conn
+
+    def load(self, guild_id):
+        row = self._connect().execute('SELECT data FROM guild_state WHERE guild_id = ?', (guild_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_many(self, states):
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.executemany(
+                'INSERT INTO guild_state (guild_id, data, updated_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(guild_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at',
+                [(guild_id, json.dumps(state, ensure_ascii=False, separators=(',', ':')), now)
+                 for guild_id, state in states.items() if state is not None]
+            )
+            conn.executemany('DELETE FROM guild_state WHERE guild_id = ?',
+                             [(guild_id,) for guild_id, state in states.items() if state is None])
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+def snapshot_guild_state(guild_id):
+    """Guild'in kalıcı durumunu JSON'a uygun bir sözlük olarak al (saklanacak bir şey yoksa None)"""
+    guild_state = find_guild_state(guild_id)
+    if guild_state is None:
+        return None
+    current = guild_state.current
+    state = {
+        'queue': [track.to_dict() for track in guild_state.queue],
+        'history': [track.to_dict() for track in guild_state.history],
+        'repeat': guild_state.repeat_mode,
+        'effect': guild_state.effect,
+        'current': Track.from_data(current.webpage_url or '', current.data).to_dict() if current else None,
+    }
+    if not (state['queue'] or state['history'] or state['current'] or state['repeat'] or state['effect'] != 'normal'):
+        return None
+    return state
+
+def check_state_persistence():
+    """Durum veritabanı Railway'de yeniden dağıtımda silinecek bir yerdeyse yüksek sesle uyar"""
+    if STATE_BACKEND != 'sqlite' or not os.getenv('RAILWAY_ENVIRONMENT'):
+        return
+    path = os.path.abspath(STATE_DB_PATH)
+    volume = os.path.abspath(STATE_VOLUME_DIR) if STATE_VOLUME_DIR else None
+    if volume is None or os.path.commonpath([path, volume]) != volume:
+        logger.error(f"⚠️ Durum veritabanı ({path}) kalıcı bir volume'da değil: sıra ve geçmiş her "
+                     f"yeniden dağıtımda kaybolur! Bir volume bağlayın ya da STATE_DB_PATH'i volume içine verin.")
+
+def restore_guild_state(guild_id, state):
+    """Kayıtlı durumu guild ayarlarına geri yükle"""
+    guild_state = get_guild_state(guild_id)
+    queue = guild_state.queue
+    queue.extend(Track.from_dict(item) for item in state.get('queue', ()))
+    # Yeniden başlatma anında çalan şarkı, yükleme bitmeden eklenenlerin de önüne, sıranın başına döner
+    if state.get('current'):
+        queue.appendleft(Track.from_dict(state['current']))
+    guild_state.history.extend(Track.from_dict(item) for item in state.get('history', ()))
+    guild_state.repeat_mode = state.get('repeat', 0)
+    guild_state.effect = state.get('effect', 'normal')
+
+class StateStore:
+    """Guild durumunu ilk kullanımda tembel yükler, değişiklikleri arkadan toplu yazar
+
+    Çalma yolu diske hiç beklemez: değişen guild'ler işaretlenir ve
+    STATE_FLUSH_INTERVAL saniyede bir tek transaction ile yazılır.
+    """
+
+    def __init__(self, backend, *, interval=STATE_FLUSH_INTERVAL):
+        self.backend = backend
+        self.interval = interval
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='state')
+        self.loaded = set()
+        self.loading = {}  # guild_id -> yükleme görevi
+        self.dirty = set()
+        self.task = None
+
+    async def ensure_loaded(self, guild_id):
+        """Guild'in kayıtlı durumunu ilk kez gerekiyorsa yükle"""
+        if guild_id in self.loaded:
+            return
+        loop = asyncio.get_running_loop()
+        if guild_id not in self.loading:
+            self.loading[guild_id] = loop.run_in_executor(self.executor, self.backend.load, guild_id)
+        try:
+            state = await asyncio.shield(self.loading[guild_id])
+        except Exception as e:
+            logger.error(f"Guild {guild_id} durumu yüklenemedi: {e}")
+            state = None
+        finally:
+            self.loading.pop(guild_id, None)
+        if guild_id not in self.loaded:
+            self.loaded.add(guild_id)
+            if state:
+                restore_guild_state(guild_id, state)
+                logger.info(f"Guild {guild_id} durumu geri yüklendi ({len(state.get('queue', ()))} şarkı)")
+
+    def mark_dirty(self, guild_id):
+        """Guild durumunun bir sonraki toplu yazımda kaydedilmesini iste"""
+        if guild_id not in self.loaded:
+            # Yüklenmemiş guild'in boş durumu kayıtlı olanın üzerine yazılmasın
+            return
+        self.dirty.add(guild_id)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_event_loop().create_task(self._run())
+
+    async def _run(self):
+        while self.dirty:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        """İşaretli guild'leri tek seferde yaz"""
+        if not self.dirty:
+            return
+        states = {guild_id: snapshot_guild_state(guild_id) for guild_id in self.dirty}
+        self.dirty.clear()
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.backend.save_many, states)
+        except Exception as e:
+            logger.error(f"Durum yazılamadı: {e}")
+            # Bir sonraki turda tekrar dene (arada değişmedilerse)
+            self.dirty.update(states)
+
+    async def close(self):
+        """Bekleyen yazımları tamamla ve arka ucu kapat"""
+        if self.task is not None:
+            self.task.cancel()
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.backend.close)
+
+def create_state_backend(name):
+    """STATE_BACKEND ayarına göre arka uç oluştur"""
+    if name == 'sqlite':
+        return SQLiteStateBackend(STATE_DB_PATH)
+    if name == 'none':
+        return StateBackend()
+    raise ValueError(f"Bilinmeyen STATE_BACKEND: {name}")
+
+state_store = StateStore(create_state_backend(STATE_BACKEND))
+
+@bot.before_invoke
+async def load_guild_state(ctx):
+    """Guild durumu ilk komutta, komut çalışmadan önce yüklenir"""
+    ctx.started_at = time.perf_counter()
+    if ctx.guild:
+        await state_store.ensure_loaded(ctx.guild.id)
+
+@bot.after_invoke
+async def save_guild_state(ctx):
+    # after_invoke komut hata verse de çalışır
+    command_seconds.observe(time.perf_counter() - ctx.started_at, ctx.command.qualified_name,
+                            'error' if ctx.command_failed else 'ok')
+    if ctx.guild:
+        state_store.mark_dirty(ctx.guild.id)
+
+def evictable(guild_id, state, now):
+    """Guild durumu bellekten atılabilir mi: uzun süredir kullanılmıyor, seste değil, iş yok"""
+    if now - state.last_active < GUILD_STATE_IDLE_TTL or state.busy or guild_id in state_store.loading:
+        return False
+    guild = bot.get_guild(guild_id)
+    if guild is not None and guild.voice_client is not None:
+        return False
+    # Kalıcı arka uç yoksa sıra/geçmiş/ayar taşıyan durum atılırsa kaybolur
+    return state_store.backend.persistent or snapshot_guild_state(guild_id) is None
+
+async def evict_idle_guilds(now=None):
+    """Boşta kalan guild durumlarını kaydedip bellekten at, atılan guild sayısını döndür"""
+    now = time.monotonic() if now is None else now
+    candidates = [guild_id for guild_id, state in list(guild_states.items()) if evictable(guild_id, state, now)]
+    if any(guild_id in state_store.dirty for guild_id in candidates):
+        await state_store.flush()
+
+    evicted = 0
+    for guild_id in candidates:
+        state = guild_states.get(guild_id)
+        # Yazım sırasında yeniden kullanılmış ya da yazılamamış olabilir
+        if state is None or not evictable(guild_id, state, now) or guild_id in state_store.dirty:
+            continue
+        del guild_states[guild_id]
+        state.release()
+        # Bir sonraki komutta kayıttan yeniden yüklenir
+        state_store.loaded.discard(guild_id)
+        evicted += 1
+
+    # Durumu olmayan guild'lerin (yalnızca !q/!history kullanan ya da temizlenen) kayıtları da birikmesin
+    stale = [guild_id for guild_id in state_store.loaded
+             if guild_id not in guild_states and guild_id not in state_store.dirty]
+    state_store.loaded.difference_update(stale)
+    for guild_id in [guild_id for guild_id in extractor_pool.epochs if guild_id not in guild_states
+                     and guild_id not in extractor_pool.pending and guild_id not in extractor_pool.inflight]:
+        del extractor_pool.epochs[guild_id]
+    if evicted:
+        logger.info(f"{evicted} boştaki guild durumu bellekten atıldı ({len(guild_states)} kaldı)")
+    return evicted
+
+async def sweep_guild_states():
+    """Boşta kalan guild durumlarını düzenli aralıklarla temizle"""
+    while True:
+        await asyncio.sleep(GUILD_STATE_SWEEP_INTERVAL)
+        try:
+            await evict_idle_guilds()
+        except Exception as e:
+            logger.error(f"Guild durumu temizleme hatası: {e}")
+
+class IdleScheduler:
+    """Guild başına tek son tarih tutan, tek görevle çalışan zamanlayıcı
+
+    Her ses olayı için ayrı uyuyan coroutine yerine son tarihler bir heap'te
+    tutulur; bellek ve uyanma sayısı olay sayısıyla değil guild sayısıyla büyür.
+    """
+
+    def __init__(self, delay, callback):
+        self.delay = delay
+        self.callback = callback  # async def callback(guild_id)
+        self.deadlines = {}  # guild_id -> son tarih (monotonic)
+        self.heap = []  # (son tarih, guild_id); iptal edilenler tembel silinir
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def arm(self, guild_id):
+        """Guild için son tarih kur (zaten kuruluysa dokunma)"""
+        if guild_id in self.deadlines:
+            return
+        deadline = time.monotonic() + self.delay
+        self.deadlines[guild_id] = deadline
+        heapq.heappush(self.heap, (deadline, guild_id))
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_event_loop().create_task(self._run())
+        elif self.heap[0][1] == guild_id:
+            self.wakeup.set()
+
+    def cancel(self, guild_id):
+        """Guild'in son tarihini iptal et"""
+        if self.deadlines.pop(guild_id, None) is not None:
+            # İptal edilen kayıtlar birikirse heap'i sıkıştır
+            if len(self.heap) > 2 * len(self.deadlines) + 64:
+                self.heap = [(d, g) for d, g in self.heap if self.deadlines.get(g) == d]
+                heapq.heapify(self.heap)
+
+    async def _run(self):
+        while self.heap:
+            deadline, guild_id = self.heap[0]
+            if self.deadlines.get(guild_id) != deadline:
+                heapq.heappop(self.heap)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self.heap)
+            del self.deadlines[guild_id]
+            try:
+                await self.callback(guild_id)
+            except Exception as e:
+                logger.error(f"Boşta kalma zamanlayıcısı hatası: {e}")
+
+async def disconnect_if_idle(guild_id):
+    """Son tarih dolduğunda bot hâlâ yalnızsa kanaldan çık"""
+    guild = bot.get_guild(guild_id)
+    voice_client = guild.voice_client if guild else None
+    if voice_client and voice_client.is_connected() and len(voice_client.channel.members) == 1:
+        await voice_client.disconnect()
+        await cleanup_guild_data(guild_id)
+        logger.info(f"Bot {guild.name} sunucusunda yalnız kaldığı için ayrıldı.")
+
+idle_scheduler = IdleScheduler(IDLE_DISCONNECT_DELAY, disconnect_if_idle)
 
 # Event handlers
 @bot.event
@@ -324,6 +2767,8 @@ async def on_ready():
     logger.info(f'{bot.user} çevrimiçi!')
     logger.info('Komutlar: !mhelp ile tüm komutları görebilirsiniz')
     logger.info(f'Bot {len(bot.guilds)} sunucuda aktif')
+    if SHARDED:
+        logger.info(f'Shard: {sorted(bot.shards)} / {bot.shard_count}')
     
     # Bot durumunu ayarla
     try:
@@ -343,6 +2788,8 @@ async def on_command_error(ctx, error):
         await ctx.send('❌ Komut bulunamadı! `!mhelp` ile komutları görebilirsin.')
     elif isinstance(error, commands.MissingRequiredArgument):
         await ctx.send('❌ Eksik parametre! Komutu doğru kullandığından emin ol.')
+    elif isinstance(error, commands.NotOwner):
+        await ctx.send('❌ Bu komut yalnızca bot sahibine açık!')
     else:
         logger.error(f'Command Error: {error}')
         await ctx.send('❌ Bir hata oluştu!')
@@ -359,11 +2806,10 @@ async def on_voice_state_update(member, before, after):
         
     voice_client = member.guild.voice_client
     if voice_client and len(voice_client.channel.members) == 1:
-        await asyncio.sleep(300)  # 5 dakika bekle
-        if voice_client.is_connected() and len(voice_client.channel.members) == 1:
-            await voice_client.disconnect()
-            await cleanup_guild_data(member.guild.id)
-            logger.info(f"Bot {member.guild.name} sunucusunda yalnız kaldığı için ayrıldı.")
+        # Guild başına tek son tarih; tekrar eden olaylar yeni bekleme başlatmaz
+        idle_scheduler.arm(member.guild.id)
+    else:
+        idle_scheduler.cancel(member.guild.id)
 
 # Komutlar (kısaltılmış - tüm komutları ekleyebilirsiniz)
 @bot.command()
@@ -416,8 +2862,6 @@ async def p(ctx, *, search):
 
         guild_id = ctx.guild.id
         queue = get_queue(guild_id)
-        history = get_history(guild_id)
-        effect = get_sound_effect(guild_id)
         
         async with ctx.typing():
             # Spotify URL kontrolü
@@ -427,62 +2871,194 @@ async def p(ctx, *, search):
                     return
                     
                 await ctx.send('🎵 Spotify içeriği tespit edildi! İşleniyor...')
-                tracks = await get_spotify_tracks(search)
+                added = 0
+                match_ahead = SPOTIFY_MATCH_AHEAD
                 
-                if not tracks:
+                # Sayfalar geldikçe sıraya ekle, ilk sayfadan sonra çalmaya başla
+                epoch = extractor_pool.epochs[guild_id]
+                pages = get_spotify_tracks(search, loop=bot.loop)
+                try:
+                    async for tracks in pages:
+                        # !stop/!leave sırayı temizlediyse kalan sayfalar eklenmesin
+                        if not ctx.voice_client or extractor_pool.epochs[guild_id] != epoch:
+                            logger.info(f"{ctx.guild.name} - Spotify içe aktarması durduruldu ({added} şarkı eklenmişti)")
+                            return
+                        if not tracks:
+                            continue
+                        
+                        queue.extend(tracks)
+                        added += len(tracks)
+                        # Yakında çalınacak şarkıları paralel eşleştir, kalanlar çalınırken eşleşir
+                        if match_ahead > 0:
+                            unmatched = [track for track in tracks if track.spotify and not track.webpage_url]
+                            spotify_matcher.prematch(unmatched[:match_ahead], guild_id=guild_id, loop=bot.loop)
+                            match_ahead -= len(unmatched)
+                        get_prefetcher(guild_id).refresh(queue, loop=bot.loop)
+                        # İlk sayfa gelir gelmez çalmaya başla (çalma tek yoldan, play_next ile başlar)
+                        await ensure_playing(ctx)
+                finally:
+                    # Bekleyen sayfa istekleri iptal edilsin
+                    await pages.aclose()
+                
+                if not added:
                     await ctx.send('❌ Spotify içeriği alınamadı!')
                     return
                 
-                if ctx.voice_client.is_playing() or queue:
-                    for track in tracks:
-                        queue.append(track)
-                    await ctx.send(f'✅ Spotify\'dan {len(tracks)} şarkı sıraya eklendi!')
-                    logger.info(f"{ctx.guild.name} - Spotify'dan {len(tracks)} şarkı eklendi")
-                else:
-                    first_track = tracks[0]
-                    remaining_tracks = tracks[1:]
-                    
-                    player = await YTDLSource.from_url(first_track, loop=bot.loop, stream=True, effect=effect)
-                    current_songs[guild_id] = player
-                    history.append(first_track)
-                    
-                    ctx.voice_client.play(player, after=lambda e: asyncio.run_coroutine_threadsafe(play_next(ctx), bot.loop))
-                    
-                    for track in remaining_tracks:
-                        queue.append(track)
+                await ctx.send(f'✅ Spotify\'dan {added} şarkı sıraya eklendi!')
+                logger.info(f"{ctx.guild.name} - Spotify'dan {added} şarkı eklendi")
+                return
+            
+            list_url = playlist_url(search)
+            if list_url:
+                await ctx.send('📃 Playlist tespit edildi! İşleniyor...')
+                added = 0
+                
+                # Girdiler düz okunur ve parça parça eklenir; her şarkı çalınmasına yaklaşınca çözümlenir
+                async for entries in extractor_pool.iter_playlist(list_url, guild_id=guild_id,
+                                                                  limit=PLAYLIST_MAX_TRACKS, loop=bot.loop):
+                    if not ctx.voice_client:
+                        break
+                    tracks = [track for track in map(playlist_track, entries) if track]
+                    if not tracks:
+                        continue
                     
-                    effect_emoji = f"🎛️[{effect}] " if effect != 'normal' else ""
-                    await ctx.send(f'🎵 {effect_emoji}Çalıyor: **{player.title}**\n📝 {len(remaining_tracks)} şarkı daha sıraya eklendi!')
-                    logger.info(f"{ctx.guild.name} - Spotify şarkı çalıyor: {player.title}")
+                    queue.extend(tracks)
+                    added += len(tracks)
+                    get_prefetcher(guild_id).refresh(queue, loop=bot.loop)
+                    # İlk parça gelir gelmez çalmaya başla, kalanlar çalarken okunur
+                    await ensure_playing(ctx)
+                
+                if not added:
+                    await ctx.send('❌ Playlist içeriği alınamadı!')
+                    return
+                
+                await ctx.send(f'✅ Playlist\'ten {added} şarkı sıraya eklendi!')
+                logger.info(f"{ctx.guild.name} - Playlist'ten {added} şarkı eklendi")
                 return
             
-            if ctx.voice_client.is_playing() or queue:
-                queue.append(search)
+            if not playback_idle(ctx):
+                # Bir kez çözümle; play_next aynı şarkıyı sayfa URL'si ile tekrar aramadan çalar
                 try:
-                    data = await bot.loop.run_in_executor(None, lambda: ytdl.extract_info(search, download=False))
-                    if 'entries' in data:
-                        data = data['entries'][0]
-                    title = data.get('title', search)
-                    await ctx.send(f'📝 Sıraya eklendi: **{title}** (Sıra: {len(queue)})')
-                    logger.info(f"{ctx.guild.name} - Sıraya eklendi: {title}")
-                except:
-                    await ctx.send(f'📝 Sıraya eklendi: **{search}** (Sıra: {len(queue)})')
-                    logger.info(f"{ctx.guild.name} - Sıraya eklendi: {search}")
+                    track = Track.from_data(search, await resolve_track(search, loop=bot.loop, guild_id=guild_id))
+                except Exception as e:
+                    logger.warning(f"Sıraya eklenirken çözümlenemedi, çalarken denenecek: {e}")
+                    track = Track(search)
+                # Kullanıcı açıkça yeniden istedi: kara listedeyse yeniden denensin
+                forgive_dead_track(guild_id, track)
+                queue.append(track)
+                get_prefetcher(guild_id).refresh(queue, loop=bot.loop)
+                await ctx.send(f'📝 Sıraya eklendi: **{track.display_name}** (Sıra: {len(queue)})')
+                logger.info(f"{ctx.guild.name} - Sıraya eklendi: {track.display_name}")
+                await ensure_playing(ctx)
             else:
-                player = await YTDLSource.from_url(search, loop=bot.loop, stream=True, effect=effect)
-                current_songs[guild_id] = player
-                history.append(search)
-                
-                ctx.voice_client.play(player, after=lambda e: asyncio.run_coroutine_threadsafe(play_next(ctx), bot.loop))
-                
-                effect_emoji = f"🎛️[{effect}] " if effect != 'normal' else ""
-                await ctx.send(f'🎵 {effect_emoji}Şu an çalıyor: **{player.title}**')
-                logger.info(f"{ctx.guild.name} - Çalıyor: {player.title}")
+                # Boştayken de sıra üzerinden çal: çalma yalnızca play_next'te, kilit altında başlar
+                track = Track(search)
+                forgive_dead_track(guild_id, track)
+                queue.append(track)
+                await play_next(ctx)
                 
     except Exception as e:
         logger.error(f'Play komutu hatası: {e}')
         await ctx.send(f'❌ Bir hata oluştu: {e}')
 
+# Düz arama ve seçici
+SEARCH_RESULTS = 5
+SEARCH_VIEW_TIMEOUT = 60  # saniye
+SEARCH_LATENCY_TARGET = float(os.getenv('SEARCH_LATENCY_TARGET', '1.5'))  # sonuçları gösterme hedefi (saniye)
+
+def format_duration(seconds):
+    """Saniyeyi 3:05 / 1:02:03 biçimine çevir"""
+    if not seconds:
+        return '?'
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02d}:{seconds:02d}' if hours else f'{minutes}:{seconds:02d}'
+
+async def flat_search(query, *, guild_id=None, limit=SEARCH_RESULTS):
+    """Format çözümlemesi yapmadan ilk sonuçları (id, başlık, kanal, süre) ve süreyi döndür"""
+    started = time.perf_counter()
+    result = await extractor_pool.extract(f'ytsearch{limit}:{query}', guild_id=guild_id, process=False)
+    elapsed = time.perf_counter() - started
+    search_seconds.observe(elapsed)
+    if elapsed > SEARCH_LATENCY_TARGET:
+        logger.warning(f"Arama hedef süreyi aştı: {elapsed:.2f} sn > {SEARCH_LATENCY_TARGET:.2f} sn ({query})")
+    entries = [entry for entry in (result or {}).get('entries') or () if entry and entry.get('id')]
+    return entries[:limit], elapsed
+
+class SearchView(discord.ui.View):
+    """Arama sonuçlarından birini düğmeyle seçtirir; yalnızca seçilen şarkı tam çözümlenir"""
+
+    def __init__(self, ctx, entries, *, timeout=SEARCH_VIEW_TIMEOUT):
+        super().__init__(timeout=timeout)
+        self.ctx = ctx
+        self.entries = entries
+        self.message = None
+        for index in range(len(entries)):
+            button = discord.ui.Button(label=str(index + 1), style=discord.ButtonStyle.primary)
+            button.callback = functools.partial(self.pick, index)
+            self.add_item(button)
+        cancel = discord.ui.Button(emoji='✖️', style=discord.ButtonStyle.secondary)
+        cancel.callback = self.cancel
+        self.add_item(cancel)
+
+    def build_embed(self, query, elapsed):
+        embed = discord.Embed(title=f"🔎 Arama: {query[:200]}", color=0xff0000)
+        lines = []
+        for index, entry in enumerate(self.entries, 1):
+            title = entry.get('title') or entry['id']
+            if len(title) > 60:
+                title = title[:57] + "..."
+            channel = entry.get('channel') or entry.get('uploader') or ''
+            details = ' • '.join(filter(None, (channel, format_duration(entry.get('duration')))))
+            lines.append(f"**{index}.** {title}\n└ {details}")
+        embed.description = "\n".join(lines)
+        embed.set_footer(text=f"Çalmak için numarayı seç • ⏱️ {elapsed:.2f} sn")
+        return embed
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.ctx.author.id:
+            await interaction.response.send_message('❌ Bu aramada yalnızca komutu kullanan seçim yapabilir.',
+                                                    ephemeral=True)
+            return False
+        return True
+
+    async def pick(self, index, interaction):
+        entry = self.entries[index]
+        self.stop()
+        await interaction.response.edit_message(content=f"🔎 Seçildi: **{entry.get('title') or entry['id']}**",
+                                                embed=None, view=None)
+        # Seçilen video doğrudan URL ile çözümlenir (arama tekrarlanmaz)
+        await self.ctx.invoke(bot.get_command('p'), search=f"https://www.youtube.com/watch?v={entry['id']}")
+        state_store.mark_dirty(self.ctx.guild.id)
+
+    async def cancel(self, interaction):
+        self.stop()
+        await interaction.response.edit_message(content='🔎 Arama iptal edildi.', embed=None, view=None)
+
+    async def on_timeout(self):
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
+@bot.command(aliases=['ara'])
+async def search(ctx, *, query):
+    """YouTube'da ara, sonuçlardan birini seçerek çal"""
+    try:
+        # typing() bir REST isteği daha bekletir; hedef süre için kullanılmıyor
+        entries, elapsed = await flat_search(query, guild_id=ctx.guild.id)
+        if not entries:
+            await ctx.send('❌ Sonuç bulunamadı!')
+            return
+        
+        view = SearchView(ctx, entries)
+        view.message = await ctx.send(embed=view.build_embed(query, elapsed), view=view)
+        logger.info(f"{ctx.guild.name} - Arama: {query} ({len(entries)} sonuç, {elapsed:.2f} sn)")
+    except Exception as e:
+        logger.error(f'Search komutu hatası: {e}')
+        await ctx.send('❌ Arama sırasında hata oluştu!')
+
 @bot.command()
 async def skip(ctx):
     """Sıradaki şarkıya geç"""
@@ -503,12 +3079,13 @@ async def stop(ctx):
     try:
         if ctx.voice_client:
             guild_id = ctx.guild.id
-            queue = get_queue(guild_id)
-            queue.clear()
-            repeat_modes[guild_id] = 0
+            state = get_guild_state(guild_id)
+            state.queue.clear()
+            state.prefetcher.cancel()
+            extractor_pool.cancel_guild(guild_id)
+            state.repeat_mode = 0
             ctx.voice_client.stop()
-            if guild_id in current_songs:
-                del current_songs[guild_id]
+            state.current = None
             await ctx.send('⏹️ Müzik durduruldu ve sıra temizlendi!')
             logger.info(f"{ctx.guild.name} - Müzik durduruldu")
     except Exception as e:
@@ -521,6 +3098,9 @@ async def pause(ctx):
     try:
         if ctx.voice_client and ctx.voice_client.is_playing():
             ctx.voice_client.pause()
+            player = get_current_song(ctx.guild.id)
+            if player is not None:
+                player.paused_at = time.monotonic()
             await ctx.send('⏸️ Müzik duraklatıldı!')
             logger.info(f"{ctx.guild.name} - Müzik duraklatıldı")
         else:
@@ -534,6 +3114,15 @@ async def resume(ctx):
     """Müziği devam ettir"""
     try:
         if ctx.voice_client and ctx.voice_client.is_paused():
+            player = get_current_song(ctx.guild.id)
+            if player is not None and player.paused_at is not None:
+                # Uzun duraklatmada bağlantı kopmuş ya da URL dolmuş olabilir:
+                # aramasız yenile ve kalınan saniyeden yeniden başlat
+                if time.monotonic() - player.paused_at > PAUSE_RESPAWN_AFTER or player.url_expiring():
+                    if player.url_expiring():
+                        await player.refresh_url()
+                    player.respawn()
+                player.paused_at = None
             ctx.voice_client.resume()
             await ctx.send('▶️ Müzik devam ediyor!')
             logger.info(f"{ctx.guild.name} - Müzik devam ettirildi")
@@ -551,18 +3140,18 @@ async def volume(ctx, vol: int = None):
             await ctx.send('❌ Ses kanalında değilim!')
             return
         
-        guild_id = ctx.guild.id
-        if guild_id not in current_songs:
+        player = get_current_song(ctx.guild.id)
+        if player is None:
             await ctx.send('❌ Şu an çalan şarkı yok!')
             return
         
         if vol is None:
-            current_vol = int(current_songs[guild_id].volume * 100)
+            current_vol = int(player.volume * 100)
             await ctx.send(f'🔊 Mevcut ses seviyesi: {current_vol}%')
             return
         
         if 0 <= vol <= 100:
-            current_songs[guild_id].volume = vol / 100.0
+            player.volume = vol / 100.0
             await ctx.send(f'🔊 Ses seviyesi {vol}% olarak ayarlandı!')
             logger.info(f"{ctx.guild.name} - Ses seviyesi {vol}% olarak ayarlandı")
         else:
@@ -576,8 +3165,8 @@ async def np(ctx):
     """Şu an çalan şarkıyı göster"""
     try:
         guild_id = ctx.guild.id
-        if guild_id in current_songs and ctx.voice_client and ctx.voice_client.is_playing():
-            song = current_songs[guild_id]
+        song = get_current_song(guild_id)
+        if song is not None and ctx.voice_client and ctx.voice_client.is_playing():
             repeat_mode = get_repeat_mode(guild_id)
             effect = get_sound_effect(guild_id)
             
@@ -586,7 +3175,8 @@ async def np(ctx):
             
             if song.duration:
                 mins, secs = divmod(song.duration, 60)
-                embed.add_field(name="Süre", value=f"{int(mins):02d}:{int(secs):02d}", inline=True)
+                pos_mins, pos_secs = divmod(min(song.position, song.duration), 60)
+                embed.add_field(name="Süre", value=f"{int(pos_mins):02d}:{int(pos_secs):02d} / {int(mins):02d}:{int(secs):02d}", inline=True)
             
             embed.add_field(name="Ses Seviyesi", value=f"{int(song.volume * 100)}%", inline=True)
             
@@ -612,31 +3202,126 @@ async def np(ctx):
         logger.error(f'NP komutu hatası: {e}')
         await ctx.send('❌ Şarkı bilgileri alınırken hata oluştu!')
 
+# Sayfalı sıra/geçmiş görünümü
+TRACK_PAGE_SIZE = 10
+TRACK_VIEW_TIMEOUT = 180  # saniye; sonra düğmeler kaldırılır
+
+class TrackListView(discord.ui.View):
+    """Düğmelerle sayfalanan şarkı listesi; tek mesajı yerinde düzenler
+
+    Bir sayfanın embed'i ancak gösterileceği zaman oluşturulur ve liste
+    değişene (get_version farklı bir değer döndürene) kadar önbellekte kalır.
+    """
+
+    def __init__(self, *, author_id, title, color, count, fetch, get_version, timeout=TRACK_VIEW_TIMEOUT):
+        super().__init__(timeout=timeout)
+        self.author_id = author_id
+        self.title = title
+        self.color = color
+        self.count = count  # () -> şarkı sayısı
+        self.fetch = fetch  # (başlangıç, bitiş) -> şarkılar
+        self.get_version = get_version
+        self.version = None
+        self.pages = {}  # sayfa -> Embed
+        self.page = 0
+        self.message = None
+
+    @property
+    def page_count(self):
+        return max(1, -(-self.count() // TRACK_PAGE_SIZE))
+
+    def render(self):
+        """Geçerli sayfanın embed'ini (gerekirse oluşturarak) döndür ve düğmeleri güncelle"""
+        version = self.get_version()
+        if version != self.version:
+            self.pages.clear()
+            self.version = version
+        page_count = self.page_count
+        self.page = min(self.page, page_count - 1)
+
+        embed = self.pages.get(self.page)
+        if embed is None:
+            embed = self.pages[self.page] = self.build_page(self.page, page_count)
+        self.first.disabled = self.previous.disabled = self.page == 0
+        self.next.disabled = self.last.disabled = self.page >= page_count - 1
+        return embed
+
+    def build_page(self, page, page_count):
+        embed = discord.Embed(title=self.title, color=self.color)
+        start = page * TRACK_PAGE_SIZE
+        for i, song in enumerate(self.fetch(start, start + TRACK_PAGE_SIZE), start + 1):
+            name = song.display_name
+            if len(name) > 50:
+                song_name = name[:47] + "..."
+            else:
+                song_name = name
+            embed.add_field(name=f"{i}.", value=song_name, inline=False)
+        embed.set_footer(text=f"Sayfa {page + 1}/{page_count} • Toplam: {self.count()} şarkı")
+        return embed
+
+    async def send(self, ctx):
+        embed = self.render()
+        if self.page_count == 1:
+            # Tek sayfada düğmeye gerek yok
+            self.stop()
+            await ctx.send(embed=embed)
+            return
+        self.message = await ctx.send(embed=embed, view=self)
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message('❌ Bu listeyi yalnızca komutu kullanan sayfalayabilir.',
+                                                    ephemeral=True)
+            return False
+        return True
+
+    async def show(self, interaction, page):
+        self.page = page
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.button(emoji='⏮️', style=discord.ButtonStyle.secondary)
+    async def first(self, interaction, button):
+        await self.show(interaction, 0)
+
+    @discord.ui.button(emoji='◀️', style=discord.ButtonStyle.primary)
+    async def previous(self, interaction, button):
+        await self.show(interaction, max(0, self.page - 1))
+
+    @discord.ui.button(emoji='▶️', style=discord.ButtonStyle.primary)
+    async def next(self, interaction, button):
+        await self.show(interaction, self.page + 1)
+
+    @discord.ui.button(emoji='⏭️', style=discord.ButtonStyle.secondary)
+    async def last(self, interaction, button):
+        await self.show(interaction, self.page_count - 1)
+
+    async def on_timeout(self):
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
 @bot.command(aliases=['queue'])
 async def q(ctx):
     """Şarkı sırasını göster"""
     try:
         guild_id = ctx.guild.id
-        queue = get_queue(guild_id)
+        queue = get_queue(guild_id, create=False)
         
         if not queue:
             await ctx.send('📝 Sıra boş!')
             return
         
-        embed = discord.Embed(title="📝 Müzik Sırası", color=0x0099ff)
-        
-        for i, song in enumerate(list(queue)[:10], 1):
-            if len(song) > 50:
-                song_name = song[:47] + "..."
-            else:
-                song_name = song
-            embed.add_field(name=f"{i}.", value=song_name, inline=False)
-        
-        if len(queue) > 10:
-            embed.add_field(name="...", value=f"ve {len(queue) - 10} şarkı daha", inline=False)
-        
-        embed.set_footer(text=f"Toplam: {len(queue)} şarkı")
-        await ctx.send(embed=embed)
+        view = TrackListView(
+            author_id=ctx.author.id,
+            title="📝 Müzik Sırası",
+            color=0x0099ff,
+            count=lambda: len(get_queue(guild_id, create=False)),
+            fetch=lambda start, stop: get_queue(guild_id, create=False)[start:stop],
+            get_version=lambda: (id(get_queue(guild_id, create=False)), get_queue(guild_id, create=False).version),
+        )
+        await view.send(ctx)
     except Exception as e:
         logger.error(f'Queue komutu hatası: {e}')
         await ctx.send('❌ Sıra gösterilirken hata oluştu!')
@@ -645,9 +3330,10 @@ async def q(ctx):
 async def clear(ctx):
     """Şarkı sırasını temizle"""
     try:
-        guild_id = ctx.guild.id
-        queue = get_queue(guild_id)
-        queue.clear()
+        state = find_guild_state(ctx.guild.id)
+        if state is not None:
+            state.queue.clear()
+            state.prefetcher.cancel()
         await ctx.send('🗑️ Sıra temizlendi!')
         logger.info(f"{ctx.guild.name} - Sıra temizlendi")
     except Exception as e:
@@ -665,16 +3351,109 @@ async def shuffle(ctx):
             await ctx.send('❌ Karıştırılacak yeterli şarkı yok!')
             return
         
-        queue_list = list(queue)
-        random.shuffle(queue_list)
-        queue.clear()
-        queue.extend(queue_list)
+        queue.shuffle()
+        get_prefetcher(guild_id).refresh(queue, loop=bot.loop)
         await ctx.send('🔀 Sıra karıştırıldı!')
         logger.info(f"{ctx.guild.name} - Sıra karıştırıldı")
     except Exception as e:
         logger.error(f'Shuffle komutu hatası: {e}')
         await ctx.send('❌ Sıra karıştırılırken hata oluştu!')
 
+def parse_queue_range(text, length):
+    """'3' veya '3-10' biçimindeki 1 tabanlı, uçları dahil aralığı [başlangıç, bitiş) indekslerine çevir"""
+    start, _, stop = text.partition('-')
+    start = int(start)
+    stop = int(stop) if stop else start
+    if not 1 <= start <= stop <= length:
+        raise ValueError(f"aralık 1-{length} dışında")
+    return start - 1, stop
+
+@bot.command(aliases=['remove', 'çıkar'])
+async def sil(ctx, positions: str):
+    """Sıradan bir şarkıyı veya aralığı çıkar (ör. !sil 3, !sil 3-10)"""
+    try:
+        guild_id = ctx.guild.id
+        queue = get_queue(guild_id)
+        
+        if not queue:
+            await ctx.send('📝 Sıra boş!')
+            return
+        
+        try:
+            start, stop = parse_queue_range(positions, len(queue))
+        except ValueError:
+            await ctx.send(f'❌ Geçersiz aralık! 1-{len(queue)} arası bir sayı veya `3-10` gibi bir aralık girin.')
+            return
+        
+        removed = queue.remove_range(start, stop)
+        get_prefetcher(guild_id).refresh(queue, loop=bot.loop)
+        if len(removed) == 1:
+            await ctx.send(f'🗑️ Sıradan çıkarıldı: **{removed[0].display_name}**')
+        else:
+            await ctx.send(f'🗑️ {len(removed)} şarkı sıradan çıkarıldı ({start + 1}-{stop})')
+        logger.info(f"{ctx.guild.name} - Sıradan {len(removed)} şarkı çıkarıldı")
+    except Exception as e:
+        logger.error(f'Sil komutu hatası: {e}')
+        await ctx.send('❌ Şarkılar sıradan çıkarılırken hata oluştu!')
+
+@bot.command(aliases=['taşı', 'move'])
+async def tasi(ctx, positions: str, target: int):
+    """Sıradaki bir şarkıyı veya aralığı başka bir sıraya taşı (ör. !taşı 5 1, !taşı 5-8 1)"""
+    try:
+        guild_id = ctx.guild.id
+        queue = get_queue(guild_id)
+        
+        if len(queue) < 2:
+            await ctx.send('❌ Taşınacak yeterli şarkı yok!')
+            return
+        
+        try:
+            start, stop = parse_queue_range(positions, len(queue))
+        except ValueError:
+            await ctx.send(f'❌ Geçersiz aralık! 1-{len(queue)} arası bir sayı veya `5-8` gibi bir aralık girin.')
+            return
+        if not 1 <= target <= len(queue):
+            await ctx.send(f'❌ Geçersiz hedef! 1-{len(queue)} arası bir sayı girin.')
+            return
+        
+        queue.move(start, stop, target - 1)
+        get_prefetcher(guild_id).refresh(queue, loop=bot.loop)
+        count = stop - start
+        moved = queue[target - 1].display_name if count == 1 else f'{count} şarkı'
+        await ctx.send(f'↕️ **{moved}** {target}. sıraya taşındı!')
+        logger.info(f"{ctx.guild.name} - {count} şarkı {target}. sıraya taşındı")
+    except Exception as e:
+        logger.error(f'Taşı komutu hatası: {e}')
+        await ctx.send('❌ Şarkılar taşınırken hata oluştu!')
+
+@bot.command(aliases=['dedupe'])
+async def tekil(ctx, positions: str = None):
+    """Sıradaki (veya aralıktaki) tekrarlanan şarkıları çıkar"""
+    try:
+        guild_id = ctx.guild.id
+        queue = get_queue(guild_id)
+        
+        if len(queue) < 2:
+            await ctx.send('❌ Tekrarlanan şarkı yok!')
+            return
+        
+        try:
+            start, stop = parse_queue_range(positions, len(queue)) if positions else (0, len(queue))
+        except ValueError:
+            await ctx.send(f'❌ Geçersiz aralık! `1-{len(queue)}` gibi bir aralık girin.')
+            return
+        
+        removed = queue.dedupe(track_key, start, stop)
+        if not removed:
+            await ctx.send('✅ Tekrarlanan şarkı yok!')
+            return
+        get_prefetcher(guild_id).refresh(queue, loop=bot.loop)
+        await ctx.send(f'🧹 {removed} tekrarlanan şarkı çıkarıldı! (Sıra: {len(queue)})')
+        logger.info(f"{ctx.guild.name} - {removed} tekrarlanan şarkı çıkarıldı")
+    except Exception as e:
+        logger.error(f'Tekil komutu hatası: {e}')
+        await ctx.send('❌ Tekrarlanan şarkılar çıkarılırken hata oluştu!')
+
 # TEKRAR MODU KOMUTLARI
 @bot.command(aliases=['repeat', 'loop'])
 async def r(ctx, mode=None):
@@ -690,13 +3469,13 @@ async def r(ctx, mode=None):
         
         mode = mode.lower()
         if mode in ['off', 'kapalı', '0']:
-            repeat_modes[guild_id] = 0
+            get_guild_state(guild_id).repeat_mode = 0
             await ctx.send('🔁 Tekrar modu **kapatıldı**!')
         elif mode in ['song', 'şarkı', '1']:
-            repeat_modes[guild_id] = 1
+            get_guild_state(guild_id).repeat_mode = 1
             await ctx.send('🔂 **Şarkı tekrarı** aktif!')
         elif mode in ['queue', 'sıra', '2']:
-            repeat_modes[guild_id] = 2
+            get_guild_state(guild_id).repeat_mode = 2
             await ctx.send('🔁 **Sıra tekrarı** aktif!')
         else:
             await ctx.send('❌ Geçersiz mod! Kullanım: `!r [off/song/queue]`')
@@ -711,16 +3490,7 @@ async def efekt(ctx, effect=None):
     try:
         guild_id = ctx.guild.id
         
-        available_effects = {
-            'normal': 'Normal (efekt yok)',
-            'bassboost': 'Bass Boost',
-            'nightcore': 'Nightcore (hızlı + yüksek ses)',
-            'slowed': 'Slowed (yavaş)',
-            'vaporwave': 'Vaporwave',
-            '8d': '8D Audio',
-            'echo': 'Echo/Reverb',
-            'treble': 'Treble Boost'
-        }
+        available_effects = {name: spec['label'] for name, spec in AUDIO_EFFECTS.items()}
         
         if effect is None:
             current_effect = get_sound_effect(guild_id)
@@ -736,13 +3506,17 @@ async def efekt(ctx, effect=None):
         
         effect = effect.lower()
         if effect in available_effects:
-            sound_effects[guild_id] = effect
+            get_guild_state(guild_id).effect = effect
             await ctx.send(f'🎛️ Ses efekti **{available_effects[effect]}** olarak ayarlandı!')
             logger.info(f"{ctx.guild.name} - Ses efekti değişti: {effect}")
             
-            if ctx.voice_client and ctx.voice_client.is_playing() and guild_id in current_songs:
-                await ctx.send('🔄 Efekt uygulanıyor, şarkı yeniden başlatılıyor...')
-                ctx.voice_client.stop()
+            player = get_current_song(guild_id)
+            if ctx.voice_client and (ctx.voice_client.is_playing() or ctx.voice_client.is_paused()) and player is not None:
+                # Yeni arama yok: aynı stream URL'sinde FFmpeg kaldığı saniyeden yeniden başlar
+                started = time.perf_counter()
+                player.set_effect(effect)
+                logger.info(f"{ctx.guild.name} - Efekt {(time.perf_counter() - started) * 1000:.0f} ms içinde uygulandı")
+                await ctx.send('🔄 Efekt şarkı kaldığı yerden uygulandı!')
         else:
             await ctx.send(f'❌ Geçersiz efekt! Kullanılabilir efektler: {", ".join(available_effects.keys())}')
     except Exception as e:
@@ -755,29 +3529,22 @@ async def history(ctx):
     """Müzik geçmişini göster"""
     try:
         guild_id = ctx.guild.id
-        history = get_history(guild_id)
+        history = get_history(guild_id, create=False)
         
         if not history:
             await ctx.send('📜 Müzik geçmişi boş!')
             return
         
-        embed = discord.Embed(title="📜 Müzik Geçmişi", color=0x9b59b6)
-        
-        recent_songs = list(history)[-10:]
-        recent_songs.reverse()
-        
-        for i, song in enumerate(recent_songs, 1):
-            if len(song) > 50:
-                song_name = song[:47] + "..."
-            else:
-                song_name = song
-            embed.add_field(name=f"{i}.", value=song_name, inline=False)
-        
-        if len(history) > 10:
-            embed.add_field(name="...", value=f"ve {len(history) - 10} şarkı daha", inline=False)
-        
-        embed.set_footer(text=f"Toplam: {len(history)} şarkı")
-        await ctx.send(embed=embed)
+        # Geçmiş en fazla 20 şarkıdır; sürüm olarak içerik kimlikleri yeterli
+        view = TrackListView(
+            author_id=ctx.author.id,
+            title="📜 Müzik Geçmişi",
+            color=0x9b59b6,
+            count=lambda: len(get_history(guild_id, create=False)),
+            fetch=lambda start, stop: list(reversed(get_history(guild_id, create=False)))[start:stop],
+            get_version=lambda: tuple(map(id, get_history(guild_id, create=False))),
+        )
+        await view.send(ctx)
     except Exception as e:
         logger.error(f'History komutu hatası: {e}')
         await ctx.send('❌ Geçmiş gösterilirken hata oluştu!')
@@ -789,7 +3556,6 @@ async def geriekle(ctx, index: int = 1):
         guild_id = ctx.guild.id
         history = get_history(guild_id)
         queue = get_queue(guild_id)
-        effect = get_sound_effect(guild_id)
         
         if not ctx.voice_client:
             if ctx.author.voice:
@@ -803,31 +3569,23 @@ async def geriekle(ctx, index: int = 1):
             return
         
         if 1 <= index <= len(history):
-            song = list(history)[-(index)]
+            song = history[-index]
+            title = song.display_name
+            # Kullanıcı açıkça yeniden istedi: kara listedeyse yeniden denensin
+            forgive_dead_track(guild_id, song)
             
-            try:
-                data = await bot.loop.run_in_executor(None, lambda: ytdl.extract_info(song, download=False))
-                if 'entries' in data:
-                    data = data['entries'][0]
-                title = data.get('title', song)
-            except:
-                title = song
-            
-            if not ctx.voice_client.is_playing() and not queue:
+            if playback_idle(ctx):
+                await ctx.send(f'📜▶️ Geçmişten çalınıyor: **{title}**')
+                logger.info(f"{ctx.guild.name} - Geçmişten çalıyor: {title}")
+                queue.append(song)
                 async with ctx.typing():
-                    player = await YTDLSource.from_url(song, loop=bot.loop, stream=True, effect=effect)
-                    current_songs[guild_id] = player
-                    history.append(song)
-                    
-                    ctx.voice_client.play(player, after=lambda e: asyncio.run_coroutine_threadsafe(play_next(ctx), bot.loop))
-                    
-                    effect_emoji = f"🎛️[{effect}] " if effect != 'normal' else ""
-                    await ctx.send(f'📜▶️ Geçmişten çalıyor: {effect_emoji}**{title}**')
-                    logger.info(f"{ctx.guild.name} - Geçmişten çalıyor: {title}")
+                    await play_next(ctx)
             else:
                 queue.append(song)
+                get_prefetcher(guild_id).refresh(queue, loop=bot.loop)
                 await ctx.send(f'📜➕ Geçmişten sıraya eklendi: **{title}** (Sıra: {len(queue)})')
                 logger.info(f"{ctx.guild.name} - Geçmişten sıraya eklendi: {title}")
+                await ensure_playing(ctx)
                 
         else:
             await ctx.send(f'❌ Geçersiz index! 1-{len(history)} arası bir sayı girin.')
@@ -848,6 +3606,131 @@ async def sp(ctx, *, url):
         logger.error(f'Spotify komutu hatası: {e}')
         await ctx.send('❌ Spotify URL\'si işlenirken hata oluştu!')
 
+@bot.command(aliases=['önbellek'])
+@commands.is_owner()
+async def cache(ctx):
+    """Çözümleme önbelleği istatistiklerini göster (sadece bot sahibi)"""
+    try:
+        stats = resolve_cache.stats()
+        embed = discord.Embed(title="🗃️ Çözümleme Önbelleği", color=0x1abc9c)
+        embed.add_field(name="Kayıt", value=f"{stats['size']}/{resolve_cache.maxsize}", inline=True)
+        embed.add_field(name="İsabet", value=str(stats['hits']), inline=True)
+        embed.add_field(name="Iskalama", value=str(stats['misses']), inline=True)
+        embed.add_field(name="Tahliye", value=str(stats['evictions']), inline=True)
+        embed.add_field(name="Süresi Dolan", value=str(stats['expirations']), inline=True)
+        embed.add_field(name="İsabet Oranı", value=f"{stats['hit_rate'] * 100:.1f}%", inline=True)
+        embed.add_field(name="Çözümleme Hatası",
+                        value=f"{playback_metrics['resolve_failures']} "
+                              f"(yeniden deneme: {playback_metrics['resolve_retries']}, "
+                              f"atlanan: {playback_metrics['dead_tracks_skipped']})",
+                        inline=False)
+        listing_stats = spotify_listings.stats()
+        embed.add_field(name="Spotify Liste Önbelleği",
+                        value=f"isabet oranı {listing_stats['hit_rate'] * 100:.1f}% "
+                              f"({listing_stats['hits']}/{listing_stats['hits'] + listing_stats['misses']}), "
+                              f"tasarruf {listing_stats['bytes_saved'] / 1024:.0f} KB",
+                        inline=False)
+        match_stats = spotify_matcher.stats()
+        embed.add_field(name="Spotify Eşleştirme",
+                        value=f"kayıttan {match_stats.get('stored', 0)}, "
+                              f"arama {match_stats.get('searches', 0)}, "
+                              f"eşleşen {match_stats.get('matched', 0)}, "
+                              f"bulunamayan {match_stats.get('unmatched', 0)}",
+                        inline=False)
+        if audio_cache is not None:
+            audio_stats = audio_cache.stats()
+            embed.add_field(name="Ses Önbelleği",
+                            value=f"{audio_stats['files']} dosya, "
+                                  f"{audio_stats['bytes'] / 1024 / 1024:.0f}/{audio_cache.max_bytes / 1024 / 1024:.0f} MB, "
+                                  f"isabet oranı {audio_stats['hit_rate'] * 100:.1f}% "
+                                  f"({audio_stats['hits']}/{audio_stats['hits'] + audio_stats['misses']})",
+                            inline=False)
+        await ctx.send(embed=embed)
+    except Exception as e:
+        logger.error(f'Cache komutu hatası: {e}')
+        await ctx.send('❌ Önbellek bilgileri alınırken hata oluştu!')
+
+def process_memory():
+    """Sürecin anlık bellek kullanımı (RSS, bayt); /proc yoksa None"""
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+@bot.command(aliases=['memory', 'mem'])
+@commands.is_owner()
+async def bellek(ctx):
+    """Guild başına bellek kullanımı (sadece bot sahibi)"""
+    try:
+        now = time.monotonic()
+        sizes = sorted(((state.memory_size(), guild_id, state) for guild_id, state in list(guild_states.items())),
+                       key=lambda item: item[0], reverse=True)
+        total = sum(size for size, _, _ in sizes)
+        rss = process_memory()
+        
+        embed = discord.Embed(title="🧠 Bellek Kullanımı", color=0x3498db)
+        embed.add_field(name="Süreç (RSS)", value=f"{rss / 1024 / 1024:.1f} MB" if rss else "?", inline=True)
+        embed.add_field(name="Guild Durumları", value=f"{len(sizes)} guild, {total / 1024:.0f} KB", inline=True)
+        embed.add_field(name="Guild Başına", value=f"{total / len(sizes) / 1024:.1f} KB" if sizes else "-", inline=True)
+        
+        lines = []
+        for size, guild_id, state in sizes[:10]:
+            guild = bot.get_guild(guild_id)
+            name = guild.name if guild else str(guild_id)
+            lines.append(f"**{name[:40]}** {size / 1024:.1f} KB — {len(state.queue)} şarkı, "
+                         f"{int(now - state.last_active) // 60} dk önce")
+        if lines:
+            embed.add_field(name="En Büyük Guild'ler", value="\n".join(lines)[:1024], inline=False)
+        embed.set_footer(text=f"{GUILD_STATE_IDLE_TTL // 60} dk kullanılmayan guild'ler bellekten atılır")
+        await ctx.send(embed=embed)
+    except Exception as e:
+        logger.error(f'Bellek komutu hatası: {e}')
+        await ctx.send('❌ Bellek bilgileri alınırken hata oluştu!')
+
+@bot.command(aliases=['profiler'])
+@commands.is_owner()
+async def profil(ctx, action: str = None):
+    """Event loop gecikmesi, takılmalar ve en sıcak komutlar (sadece bot sahibi)"""
+    try:
+        if action in ('sıfırla', 'reset'):
+            loop_profiler.reset()
+            await ctx.send('🧹 Profil verileri sıfırlandı!')
+            return
+        if not LOOP_PROFILER_ENABLED:
+            await ctx.send('❌ Loop gözcüsü kapalı (açmak için LOOP_PROFILER=1)')
+            return
+
+        busy = loop_profiler.busy_samples / max(loop_profiler.total_samples, 1)
+        embed = discord.Embed(title="🩺 Event Loop Profili", color=0xe67e22)
+        embed.add_field(name="Son Gecikme", value=f"{metric_gauges['loop_lag_seconds_last'] * 1000:.1f} ms", inline=True)
+        embed.add_field(name="Meşguliyet", value=f"{busy * 100:.1f}%", inline=True)
+        embed.add_field(name="Takılma", value=f"{len(loop_profiler.stalls)} (> {SLOW_CALLBACK_THRESHOLD * 1000:.0f} ms)",
+                        inline=True)
+
+        hottest = loop_profiler.hottest(5)
+        if hottest:
+            lines = [f"`{owner}` {hits / max(loop_profiler.busy_samples, 1) * 100:.1f}% — {where}"
+                     for owner, hits, where in hottest]
+            embed.add_field(name="En Sıcak Komutlar", value="\n".join(lines)[:1024], inline=False)
+
+        stalls = list(loop_profiler.stalls)[-3:]
+        if stalls:
+            lines = []
+            for stall in reversed(stalls):
+                where = stall['stack'].strip().splitlines()[-2].strip() if stall['stack'] else '?'
+                started = time.strftime('%H:%M:%S', time.localtime(stall['started']))
+                lines.append(f"{started} **{stall['duration']:.2f} sn** `{stall['owner']}`\n`{where[:150]}`")
+            embed.add_field(name="Son Takılmalar", value="\n".join(lines)[:1024], inline=False)
+        embed.set_footer(text=f"Ayrıntılı stack'ler: {PROFILER_LOG_PATH}")
+        await ctx.send(embed=embed)
+    except Exception as e:
+        logger.error(f'Profil komutu hatası: {e}')
+        await ctx.send('❌ Profil bilgileri alınırken hata oluştu!')
+
 @bot.command(aliases=['musikhelp'])
 async def mhelp(ctx):
     """Tüm müzik komutlarını göster"""
@@ -859,6 +3742,7 @@ async def mhelp(ctx):
 `!join` - Ses kanalına katıl
 `!leave` - Ses kanalından çık  
 `!p <şarkı>` - YouTube'dan müzik çal
+`!search <şarkı>` - Ara ve sonuçlardan seç
 `!skip` - Sıradaki şarkıya geç
 `!stop` - Müziği durdur
 `!pause` / `!resume` - Duraklat / Devam ettir
@@ -870,6 +3754,9 @@ async def mhelp(ctx):
 `!q` - Şarkı sırasını göster
 `!clear` - Sırayı temizle
 `!shuffle` - Sırayı karıştır
+`!sil <3 | 3-10>` - Sıradan şarkı/aralık çıkar
+`!taşı <5 | 5-8> <hedef>` - Şarkı/aralık taşı
+`!tekil [aralık]` - Tekrarlanan şarkıları çıkar
 `!volume <0-100>` - Ses seviyesi ayarla
 `!np` - Şu an çalan şarkıyı göster
         """
@@ -881,6 +3768,7 @@ async def mhelp(ctx):
 `!efekt` - Ses efektlerini göster
 `!history` - Geçmiş şarkıları göster
 `!sp <url>` - Spotify URL çal
+`!p <playlist url>` - YouTube playlist/mix'i sıraya ekle
         """
         embed.add_field(name="⚡ İleri Özellikler", value=advanced_text, inline=False)
         
@@ -892,8 +3780,8 @@ async def mhelp(ctx):
         help_text = """
 🎵 **Müzik Bot Komutları:**
 
-**Temel:** !join, !leave, !p <şarkı>, !skip, !stop, !pause, !resume
-**Kontrol:** !q, !clear, !shuffle, !volume, !np  
+**Temel:** !join, !leave, !p <şarkı>, !search <şarkı>, !skip, !stop, !pause, !resume
+**Kontrol:** !q, !clear, !shuffle, !sil, !taşı, !tekil, !volume, !np  
 **İleri:** !r, !efekt, !history, !sp <url>
 
 **Kullanım:** !p never gonna give you up
@@ -903,18 +3791,92 @@ async def mhelp(ctx):
 
 # Diğer tüm komutlarınızı buraya ekleyin...
 # Bot'u başlat
+# Çok süreçli sharding başlatıcısı
+def fetch_recommended_shards(token):
+    """Discord'un bot için önerdiği shard sayısını döndürür"""
+    request = urllib.request.Request(
+        'https://discord.com/api/v10/gateway/bot',
+        headers={'Authorization': f'Bot {token}', 'User-Agent': 'DiscordBot (music-bot, 1.0)'},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return int(json.load(response)['shards'])
+
+def plan_shards(shard_count, processes):
+    """Shard'ları süreçlere sırayla dağıtır: 4 shard / 2 süreç -> [[0, 2], [1, 3]]"""
+    processes = min(processes, shard_count)
+    return [list(range(i, shard_count, processes)) for i in range(processes)]
+
+def shard_worker_env(plans, index, shard_count):
+    """index numaralı işçinin ortamı: kendi shard'ları, HTTP yalnızca ilk işçide"""
+    return dict(
+        os.environ,
+        SHARD_WORKER='1',
+        SHARD_COUNT=str(shard_count),
+        SHARD_IDS=','.join(map(str, plans[index])),
+        SHARD_HTTP='1' if index == 0 else '0',
+    )
+
+def run_shard_launcher(token):
+    """Shard'ları SHARD_PROCESSES işçi sürece dağıtır ve çöken işçiyi yeniden başlatır
+
+    Her işçi bu dosyayı SHARD_WORKER=1 ve kendi SHARD_IDS değeriyle yeniden çalıştırır;
+    guild durumu shard'ın sürecinde kalır. HTTP sunucusunu yalnızca ilk işçi açar.
+    """
+    shard_count = SHARD_COUNT or max(fetch_recommended_shards(token), SHARD_PROCESSES)
+    plans = plan_shards(shard_count, SHARD_PROCESSES)
+    stopping = False
+
+    def spawn(index):
+        env = shard_worker_env(plans, index, shard_count)
+        logger.info(f"Shard işçisi {index} başlatılıyor: shard {plans[index]} / {shard_count}")
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    workers = [spawn(index) for index in range(len(plans))]
+    restart_at = {}
+    while not stopping:
+        time.sleep(1)
+        now = time.monotonic()
+        for index, process in enumerate(workers):
+            if process.poll() is None:
+                continue
+            if index not in restart_at:
+                logger.warning(f"Shard işçisi {index} kapandı (kod {process.returncode}), "
+                               f"{SHARD_RESTART_DELAY} sn sonra yeniden başlatılacak")
+                restart_at[index] = now + SHARD_RESTART_DELAY
+            elif now >= restart_at[index]:
+                del restart_at[index]
+                workers[index] = spawn(index)
+
+    # İşçiler SIGTERM ile kapanırken durumlarını diske yazar
+    for process in workers:
+        if process.poll() is None:
+            process.terminate()
+    for process in workers:
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
 if __name__ == "__main__":
     if not DISCORD_TOKEN:
         logger.error("DISCORD_TOKEN environment variable bulunamadı!")
+    elif SHARD_PROCESSES > 1 and not SHARD_WORKER:
+        try:
+            logger.info(f"Shard başlatıcısı: {SHARD_PROCESSES} işçi süreç")
+            run_shard_launcher(DISCORD_TOKEN)
+        except Exception as e:
+            logger.error(f"Shard başlatıcısı hatası: {e}")
     else:
         try:
-            logger.info("Flask server ve Discord bot başlatılıyor...")
-            # Flask sunucusunu ayrı thread'de çalıştır
-            flask_thread = threading.Thread(target=run_flask)
-            flask_thread.daemon = True
-            flask_thread.start()
-            
-            # Discord bot'u başlat
+            logger.info("Discord bot başlatılıyor...")
+            # Discord bot'u başlat (HTTP sunucusu setup_hook'ta aynı loop'ta açılır)
             bot.run(DISCORD_TOKEN)
         except Exception as e:
             logger.error(f"Bot başlatılamadı: {e}")
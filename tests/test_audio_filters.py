@@ -0,0 +1,75 @@
+"""Ses efekti filtre zinciri ve FFmpeg seçenekleri testleri"""
+import os
+import re
+import shlex
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+EFFECTS = sorted(main.AUDIO_EFFECTS)
+
+
+@pytest.mark.parametrize('effect, volume, expected', [
+    ('normal', None, None),
+    ('normal', 1.0, None),
+    ('normal', 0.5, 'volume=0.50'),
+    ('normal', 0.0, 'volume=0.00'),
+    ('bassboost', 0.5, 'bass=g=8:f=110:w=0.6,alimiter=limit=0.95,volume=0.50'),
+    ('nightcore', 1.0, 'aresample=48000,asetrate=60000,aresample=48000'),
+    ('nightcore', 0.75, 'aresample=48000,asetrate=60000,aresample=48000,volume=0.75'),
+    ('vaporwave', 0.333,
+     'aresample=48000,asetrate=38400,aresample=48000,lowpass=f=3500,aecho=0.8:0.85:40|80:0.3|0.2,volume=0.33'),
+    ('echo', 1.5, 'aecho=0.8:0.88:500:0.35,volume=1.50'),
+])
+def test_combined_chain(effect, volume, expected):
+    assert main.build_audio_filter(effect, volume) == expected
+
+
+@pytest.mark.parametrize('effect', ['yok', 'NIGHTCORE', ' nightcore', '', None])
+def test_invalid_effect_falls_back_to_normal(effect):
+    assert main.build_audio_filter(effect) is None
+    assert main.build_audio_filter(effect, 0.5) == 'volume=0.50'
+    assert main.get_ffmpeg_options(effect) == {'before_options': main.FFMPEG_BEFORE_OPTIONS, 'options': '-vn'}
+
+
+def test_effect_name_is_not_a_filter():
+    # Bilinmeyen ad filtre zincirine asla girmez (FFmpeg komutuna enjekte edilemez)
+    options = main.get_ffmpeg_options('echo" -i /etc/passwd "', 0.5)
+    assert shlex.split(options['options']) == ['-vn', '-af', 'volume=0.50']
+
+
+def test_ffmpeg_options_cached():
+    main.get_ffmpeg_options.cache_clear()
+    first = main.get_ffmpeg_options('bassboost', 0.5)
+    hits = main.get_ffmpeg_options.cache_info().hits
+    assert main.get_ffmpeg_options('bassboost', 0.5) is first
+    assert main.get_ffmpeg_options.cache_info().hits == hits + 1
+    # Farklı ses seviyesi ayrı girdi oluşturur
+    assert main.get_ffmpeg_options('bassboost', 0.6) is not first
+    assert main.get_ffmpeg_options.cache_info().misses == 2
+
+
+@pytest.mark.parametrize('effect', EFFECTS)
+@pytest.mark.parametrize('volume', [None, 1.0, 0.35])
+def test_options_survive_shlex(effect, volume):
+    options = main.get_ffmpeg_options(effect, volume)
+    chain = main.build_audio_filter(effect, volume)
+    expected = ['-vn', '-af', chain] if chain else ['-vn']
+    assert shlex.split(options['options']) == expected
+    assert options['before_options'] == main.FFMPEG_BEFORE_OPTIONS
+
+
+@pytest.mark.parametrize('effect', EFFECTS)
+def test_tempo_matches_asetrate(effect):
+    spec = main.AUDIO_EFFECTS[effect]
+    rates = re.findall(r'asetrate=(\d+)', spec['filters'] or '')
+    assert len(rates) <= 1
+    expected = int(rates[0]) / 48000 if rates else 1.0
+    assert spec['tempo'] == pytest.approx(expected)
+    if rates:
+        # Hız/perde değiştiren zincir 48 kHz'e örnekleyerek başlar, böylece oran kaynaktan bağımsızdır
+        assert spec['filters'].startswith('aresample=48000,asetrate=')
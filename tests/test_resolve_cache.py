@@ -0,0 +1,30 @@
+"""ResolveCache anahtar normalleştirme testleri"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+def video(video_id):
+    return {'id': video_id, 'url': f'https://rr1---sn-test.googlevideo.com/videoplayback?id={video_id}',
+            'webpage_url': f'https://www.youtube.com/watch?v={video_id}'}
+
+
+def test_video_ids_keep_case():
+    cache = main.ResolveCache()
+    cache.put('AbCdEfGhIjK', video('AbCdEfGhIjK'))
+    assert cache.get_by_id('AbCdEfGhIjK') is not None
+    assert cache.get('AbCdEfGhIjK') is not None
+    assert cache.get_by_id('abcdefghijk') is None
+    assert cache.get('abcdefghijk') is None
+    assert cache.get('https://www.youtube.com/watch?v=abcdefghijk') is None
+
+
+def test_free_text_search_is_case_and_space_insensitive():
+    cache = main.ResolveCache()
+    cache.put('Rick Astley  Never Gonna', video('dQw4w9WgXcQ'))
+    assert cache.get('rick astley never gonna') is not None
+    assert cache.get_by_id('dQw4w9WgXcQ') is not None
+    assert cache.get_by_id('dqw4w9wgxcq') is None